@@ -10,8 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from importlib.util import find_spec
 from pathlib import Path
 from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,7 +29,7 @@ def gettext(s):
 SECRET_KEY = config('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = config('DEBUG')
+DEBUG = config('DEBUG', cast=bool, default=False)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', cast=Csv(), default="127.0.0.1,localhost")
 
@@ -55,6 +57,8 @@ MIDDLEWARE = [
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.PrincipalMiddleware',
+    'utils.db.DatabaseMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,19 +87,115 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=postgresql - production profili, aks holda lokal SQLite.
+# Testlar uchun docker'siz lokal PostgreSQL ham yetarli:
+#   initdb -D /tmp/pg -A trust && pg_ctl -D /tmp/pg -o "-k /tmp/pg -c listen_addresses=''" start
+#   DB_ENGINE=postgresql DB_HOST=/tmp/pg DB_USER=$USER DB_NAME=postgres python manage.py test
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+# butun baza uchun statement_timeout (ms, 0 - cheklanmagan); alohida sahifalar uchun STATEMENT_TIMEOUTS
+DB_STATEMENT_TIMEOUT = config('DB_STATEMENT_TIMEOUT', cast=int, default=30000)
+# DB_POOL=True - Django'ning ichki ulanishlar puli (psycopg 3 va psycopg-pool kerak);
+# pul bilan doimiy ulanishlar (CONN_MAX_AGE) ishlatilmaydi
+DB_POOL = config('DB_POOL', cast=bool, default=False)
+
+
+# har bir SQLite ulanishida: WAL - o'quvchilar yozuvchini kutmaydi, NORMAL - WAL bilan xavfsiz va tezroq
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': config('SQLITE_MMAP_SIZE', cast=int, default=256 * 1024 * 1024),
+    # manfiy qiymat - KiB
+    'cache_size': -config('SQLITE_CACHE_SIZE_KB', cast=int, default=64 * 1024),
+    'temp_store': 'MEMORY',
+}
+
+
+def postgresql_database(host, port):
+    options = {
+        'connect_timeout': config('DB_CONNECT_TIMEOUT', cast=int, default=5),
+        'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT}',
+    }
+    if DB_POOL:
+        # requirements.txt'da faqat psycopg2; pul uchun alohida o'rnatiladi
+        if not (find_spec('psycopg') and find_spec('psycopg_pool')):
+            raise ImproperlyConfigured(
+                "DB_POOL=True requires psycopg 3 with the pool extra: pip install 'psycopg[binary,pool]'"
+            )
+        options['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', cast=int, default=2),
+            'max_size': config('DB_POOL_MAX_SIZE', cast=int, default=10),
+            'timeout': config('DB_POOL_TIMEOUT', cast=int, default=10),
+        }
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME'),
+        'USER': config('DB_USER', default=''),
+        'PASSWORD': config('DB_PASSWORD', default=''),
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', cast=int, default=60),
+        'CONN_HEALTH_CHECKS': True,
+        # pgbouncer transaction rejimi orqali ulanganda True bo'lishi kerak
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_DISABLE_SERVER_SIDE_CURSORS', cast=bool, default=False),
+        'OPTIONS': options,
+    }
+
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': postgresql_database(config('DB_HOST', default=''), config('DB_PORT', default='')),
+    }
+    # DB_REPLICA_HOST berilsa o'qish so'rovlari replikaga yuboriladi (utils.db.PrimaryReplicaRouter)
+    if config('DB_REPLICA_HOST', default=''):
+        DATABASES['replica'] = postgresql_database(
+            config('DB_REPLICA_HOST'), config('DB_REPLICA_PORT', default=config('DB_PORT', default=''))
+        )
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # qulf bo'shashini shuncha soniya kutadi ("database is locked" o'rniga)
+                'timeout': config('SQLITE_BUSY_TIMEOUT', cast=int, default=20),
+                # yozish qulfi tranzaksiya boshida olinadi: o'qishdan yozishga o'tishda qulflanib qolmaydi
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            },
+        }
+    }
+
+DATABASE_ROUTERS = ['utils.db.PrimaryReplicaRouter']
+DATABASE_WRITE_ALIAS = 'default'
+DATABASE_READ_ALIAS = 'replica' if 'replica' in DATABASES else 'default'
+
+# sahifa (url nomi) bo'yicha statement_timeout, ms; DB_STATEMENT_TIMEOUTS=admin:statistics=60000,...
+STATEMENT_TIMEOUTS = {
+    'admin:dashboard': 60000,
+    'admin:statistics': 60000,
+    'district_patient_stats': 60000,
+    'mahalla_patient_stats': 60000,
+    'compliance_trend': 60000,
+    'admin:patients_search': 10000,
+    'psychiatrist-autocomplete': 5000,
+    'inspector-autocomplete': 5000,
+    **{name: int(timeout) for name, timeout in (
+        item.rsplit('=', 1) for item in config('DB_STATEMENT_TIMEOUTS', cast=Csv(), default='')
+    )},
+}
+# fon eksportlari uchun (run_export_jobs)
+EXPORT_STATEMENT_TIMEOUT = config('DB_EXPORT_STATEMENT_TIMEOUT', cast=int, default=0)
+
+# Rol/ko'rish doirasi, sozlamalar va filtrlar keshlari versiya kaliti orqali barcha worker'larda eskiradi,
+# shuning uchun kesh jarayonlar orasida umumiy bo'lishi kerak: bitta serverda fayl keshi yetarli, bir nechta
+# serverda - django.core.cache.backends.redis.RedisCache. LocMemCache faqat DEBUG'da ruxsat (utils.E002).
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
     }
-    # 'default': {
-    #     'ENGINE': 'django.db.backends.postgresql',
-    #     'NAME': config('DB_NAME'),
-    #     'USER': config('DB_USER'),
-    #     'PASSWORD': config('DB_PASSWORD'),
-    #     'HOST': config('DB_HOST'),
-    #     'PORT': config('DB_PORT'),
-    # }
 }
 
 JAZZMIN_SETTINGS = {
@@ -159,6 +259,18 @@ LOCALE_PATHS = [
 STATIC_URL = "/static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / 'media'
+# eksportlarda shaxsiy ma'lumotlar bor: MEDIA_ROOT'dan tashqarida saqlanadi va /media/ orqali berilmaydi,
+# faqat ruxsat tekshiriladigan ExportJobAdmin.download orqali
+EXPORT_ROOT = config('EXPORT_ROOT', default=str(BASE_DIR / 'private' / 'exports'))
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'exports': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': EXPORT_ROOT, 'directory_permissions_mode': 0o700, 'file_permissions_mode': 0o600},
+    },
+}
 
 # Agar loyihada umumiy static papkangiz bo‘lsa
 STATICFILES_DIRS = [
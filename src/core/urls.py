@@ -22,7 +22,7 @@ from django.views.static import serve
 
 from psytracks.views import PsychiatristAutocomplete, InspectorAutocomplete
 from users.views import dashboard_view, statistics_view
-from utils.views import district_patient_stats, mahalla_patient_stats
+from utils.views import district_patient_stats, mahalla_patient_stats, compliance_trend
 
 def custom_permission_denied_view(request, exception=None):
     return render(request, "403.html", status=403)
@@ -47,8 +47,11 @@ admin.site.get_urls = get_admin_urls(admin.site.get_urls())
 urlpatterns = [
     path('inspector-autocomplete/', InspectorAutocomplete.as_view(), name='inspector-autocomplete'),
     path('psychiatrist-autocomplete/', PsychiatristAutocomplete.as_view(), name='psychiatrist-autocomplete'),
-    path("admin/district_patient_stats/", district_patient_stats, name="district_patient_stats"),
-    path("admin/mahalla_patient_stats/<int:district_id>/", mahalla_patient_stats, name="mahalla_patient_stats"),
+    path("admin/district_patient_stats/", admin.site.admin_view(district_patient_stats),
+         name="district_patient_stats"),
+    path("admin/mahalla_patient_stats/<int:district_id>/", admin.site.admin_view(mahalla_patient_stats),
+         name="mahalla_patient_stats"),
+    path("admin/compliance_trend/", admin.site.admin_view(compliance_trend), name="compliance_trend"),
     ]
 if settings.DEBUG:
     urlpatterns += [
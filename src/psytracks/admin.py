@@ -1,261 +1,140 @@
 import datetime
-from io import BytesIO
-
-import openpyxl
-from django.contrib import admin
-from django.contrib.admin import SimpleListFilter
-from django.db.models import ExpressionWrapper, F, DateField, DurationField, Case, When, Value, BooleanField
-from django.db.models.functions import Greatest, Concat, Cast
-from django.http import HttpResponse
+
+from django.contrib import admin, messages
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Concat
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import path
 from django.utils import timezone
 from django.utils.html import format_html
-from openpyxl.styles import Alignment
-from openpyxl.utils import get_column_letter
 
-from psytracks.models import SocialDomesticEnvironment, ReasonForSpecialConsideration, Doctor, Patient, Psychiatrist
-from psytracks.forms import PatientForm
+from psytracks.exports import export_patients_csv
+from psytracks.models import SocialDomesticEnvironment, ReasonForSpecialConsideration, Doctor, Patient, Psychiatrist, \
+    ExportProfile, ExportFormat, overdue_q, on_time_q
+from psytracks.forms import PatientForm, ExportProfileForm
 from django.utils.translation import gettext_lazy as _
 
-from utils.models import Inspector, Neighborhood, District
+from users.principal import INSPECTOR, NEIGHBORHOOD, PSYCHIATRIST, DISTRICT, REGION
+from utils.exports import CSV_CONTENT_TYPE
+from utils.filters import CachedLookupsFilter, FacetedFilterMixin, FacetedBooleanFieldListFilter, FacetedChangeList
+from utils.jobs import enqueue_export
+from utils.app_settings import get_setting
+from utils.search import SearchKeyAdminMixin, FuzzySearchMixin, FUZZY_VAR, fuzzy_rank, fuzzy_search
+from utils.pagination import KeysetPaginationMixin, EstimatedCountMixin, EstimatedCountPaginator, EXACT_COUNT_VAR
+from utils.models import Inspector, Neighborhood, District, ExportKind
+
+
+class PatientChangeList(FuzzySearchMixin, EstimatedCountMixin, KeysetPaginationMixin, FacetedChangeList):
+    keyset_fields = ("deadline", "full_name", "id")
+
 
+# psixiatrlar ro'yxatini mahalla, tuman va viloyat foydalanuvchilari uchun cheklaydi
+PSYCHIATRIST_FILTER_ROLES = (NEIGHBORHOOD, DISTRICT, REGION)
 
-class PsychiatristFilter(SimpleListFilter):
+
+class PsychiatristFilter(FacetedFilterMixin, CachedLookupsFilter):
     title = _("psychiatrist")
     parameter_name = "psychiatrist"
+    field = "psychiatrist_id"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
 
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
-
         psychiatrist_ids = qs.values_list("psychiatrist_id", flat=True).distinct()
         psychiatrists = Psychiatrist.objects.filter(id__in=psychiatrist_ids).values_list("id", "full_name")
         return [(d[0], d[1]) for d in psychiatrists if d[0]]
 
-    def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
 
-        if self.value():
-            queryset = queryset.filter(psychiatrist_id=self.value())
-        return queryset
-
-
-class InspectorFilter(SimpleListFilter):
+class InspectorFilter(FacetedFilterMixin, CachedLookupsFilter):
     title = _("inspector")
     parameter_name = "inspector"
+    field = "inspector_id"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
 
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
-
         inspector_ids = qs.values_list("inspector_id", flat=True).distinct()
         inspectors = Inspector.objects.filter(id__in=inspector_ids).values_list("id", "full_name")
         return [(d[0], d[1]) for d in inspectors if d[0]]
 
-    def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
-
-        if self.value():
-            queryset = queryset.filter(inspector_id=self.value())
-        return queryset
-
 
-class NeighborhoodFilter(SimpleListFilter):
+class NeighborhoodFilter(FacetedFilterMixin, CachedLookupsFilter):
     title = _("neighborhood")
     parameter_name = "neighborhood"
+    field = "neighborhood_id"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
 
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
-
         neighborhood_ids = qs.values_list("neighborhood_id", flat=True).distinct()
         neighborhoods = Neighborhood.objects.filter(id__in=neighborhood_ids).annotate(
             str_name=Concat(F("name"), Value(" ("), F("district__name"), Value(")")),
         ).values_list("id", "str_name")
         return [(d[0], d[1]) for d in neighborhoods if d[0]]
 
-    def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
 
-        if self.value():
-            queryset = queryset.filter(neighborhood_id=self.value())
-        return queryset
-
-
-class DistrictFilter(SimpleListFilter):
+class DistrictFilter(FacetedFilterMixin, CachedLookupsFilter):
     title = _("district")
     parameter_name = "district"
+    field = "district_id"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
 
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
-
-        district_ids = qs.values_list("neighborhood__district_id", flat=True).distinct()
+        district_ids = qs.values_list("district_id", flat=True).distinct()
         districts = District.objects.filter(id__in=district_ids).values_list("id", "name")
         return [(d[0], d[1]) for d in districts if d[0]]
 
-    def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
 
-        if self.value():
-            queryset = queryset.filter(neighborhood__district_id=self.value())
-        return queryset
-
-
-class DistrictDoctorFilter(SimpleListFilter):
+class DistrictDoctorFilter(CachedLookupsFilter):
     title = _("district")
     parameter_name = "district"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
+        qs = qs.filter(request.principal.member_q())
 
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(neighborhood__inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
-
-        district_ids = qs.values_list("neighborhood__district_id", flat=True).distinct()
+        district_ids = qs.values_list("district_id", flat=True).distinct()
         districts = District.objects.filter(id__in=district_ids).values_list("id", "name")
         return [(d[0], d[1]) for d in districts if d[0]]
 
     def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(neighborhood__inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
+        queryset = queryset.filter(request.principal.member_q())
 
         if self.value():
-            queryset = queryset.filter(neighborhood__district_id=self.value())
+            queryset = queryset.filter(district_id=self.value())
         return queryset
 
 
-class DistrictPsychiatristFilter(SimpleListFilter):
+class DistrictPsychiatristFilter(CachedLookupsFilter):
     title = _("district")
     parameter_name = "district"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
-
-        user = request.user
-        if hasattr(user, "neighborhood"):
-            qs = qs.filter(district=user.neighborhood.district)
-        elif hasattr(user, "district"):
-            qs = qs.filter(district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(district__region=user.region.region)
+        qs = qs.filter(request.principal.hierarchy_q(roles=PSYCHIATRIST_FILTER_ROLES))
 
         district_ids = qs.values_list("district_id", flat=True).distinct()
         districts = District.objects.filter(id__in=district_ids).values_list("id", "name")
         return [(d[0], d[1]) for d in districts if d[0]]
 
     def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "neighborhood"):
-            queryset = queryset.filter(district=user.neighborhood.district)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(district__region=user.region.region)
+        queryset = queryset.filter(request.principal.hierarchy_q(roles=PSYCHIATRIST_FILTER_ROLES))
 
         if self.value():
             queryset = queryset.filter(district_id=self.value())
         return queryset
 
 
-class NeighborhoodDoctorFilter(SimpleListFilter):
+class NeighborhoodDoctorFilter(CachedLookupsFilter):
     title = _("neighborhood")
     parameter_name = "neighborhood"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
-
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(neighborhood__inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
+        qs = qs.filter(request.principal.member_q())
 
         neighborhood_ids = qs.values_list("neighborhood_id", flat=True).distinct()
         neighborhoods = Neighborhood.objects.filter(id__in=neighborhood_ids).annotate(
@@ -264,22 +143,14 @@ class NeighborhoodDoctorFilter(SimpleListFilter):
         return [(d[0], d[1]) for d in neighborhoods if d[0]]
 
     def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(neighborhood__inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
+        queryset = queryset.filter(request.principal.member_q())
 
         if self.value():
             queryset = queryset.filter(neighborhood_id=self.value())
         return queryset
 
 
-class OverdueFilter(admin.SimpleListFilter):
+class OverdueFilter(FacetedFilterMixin, admin.SimpleListFilter):
     title = _("Is overdue")
     parameter_name = "is_overdue"
 
@@ -289,12 +160,15 @@ class OverdueFilter(admin.SimpleListFilter):
             ("no", _("No")),
         ]
 
-    def queryset(self, request, queryset):
-        if self.value() == "yes":
-            return queryset.filter(is_overdue=True)
-        elif self.value() == "no":
-            return queryset.filter(is_overdue=False)
-        return queryset
+    def get_q(self, value):
+        if value == "yes":
+            return overdue_q()
+        elif value == "no":
+            return on_time_q()
+        return Q()
+
+    def get_facet_expression(self):
+        return Case(When(overdue_q(), then=Value("yes")), When(on_time_q(), then=Value("no")))
 
 
 @admin.register(SocialDomesticEnvironment)
@@ -310,19 +184,23 @@ class ReasonForSpecialConsiderationAdmin(admin.ModelAdmin):
 
 
 @admin.register(Psychiatrist)
-class PsychiatristAdmin(admin.ModelAdmin):
+class PsychiatristAdmin(SearchKeyAdminMixin, admin.ModelAdmin):
     list_display = ("id", "full_name", "district", "phone", "user")
     list_display_links = ("id", "full_name")
-    search_fields = ("full_name__icontains",)
+    list_select_related = ("district", "user")
+    search_fields = ("search_key",)
     list_filter = (DistrictPsychiatristFilter,)
+    autocomplete_fields = ("district",)
 
 
 @admin.register(Doctor)
-class DoctorAdmin(admin.ModelAdmin):
+class DoctorAdmin(SearchKeyAdminMixin, admin.ModelAdmin):
     list_display = ("id", "full_name", "neighborhood", "phone", "fbirth_date", "brigade_number", "polyclinic_name")
     list_display_links = ("id", "full_name")
-    search_fields = ("full_name__icontains",)
+    list_select_related = ("neighborhood__district",)
+    search_fields = ("search_key",)
     list_filter = (NeighborhoodDoctorFilter, DistrictDoctorFilter)
+    autocomplete_fields = ("neighborhood",)
 
     def fbirth_date(self, obj):
         if obj.birth_date:
@@ -333,19 +211,13 @@ class DoctorAdmin(admin.ModelAdmin):
     fbirth_date.short_description = Doctor._meta.get_field("birth_date").verbose_name
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        user = request.user
         if db_field.name == "neighborhood":
-            if hasattr(user, "district"):
-                kwargs["queryset"] = Neighborhood.objects.filter(district_id=user.district.district_id)
-            elif hasattr(user, 'region'):
-                kwargs["queryset"] = Neighborhood.objects.filter(district__region_id=user.region.region_id)
-            else:
-                kwargs["queryset"] = Neighborhood.objects.all()
+            kwargs["queryset"] = Neighborhood.objects.filter(request.principal.district_q("district__")).select_related("district")
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(SearchKeyAdminMixin, admin.ModelAdmin):
     list_display = ("id", "full_name", "pinfl", "fbirth_date", "is_aggressive", "is_convicted", "is_abroad_long_term",
                     "neighborhood__district", "neighborhood__name", "address", "inspector", "psychiatrist",
                     "flast_psychiatric_appointment_date", "flast_home_visit_by_doctor_date", "reason",
@@ -353,36 +225,26 @@ class PatientAdmin(admin.ModelAdmin):
                     "alcohol_and_drug_use", "where_is_now", "description_where_is_now", "flast_hospitalization_from",
                     "flast_hospitalization_to", "next_psychiatric_appointment_date", "last_psychiatric_appointment_days_left"  )
     list_display_links = ("id", "full_name")
+    list_select_related = ("neighborhood__district", "inspector", "psychiatrist", "reason_for_special_consideration")
     form = PatientForm
-    autocomplete_fields = ("psychiatrist", "inspector")
-    search_fields = ["full_name__icontains"]
+    autocomplete_fields = ("neighborhood", "psychiatrist", "inspector")
+    search_fields = ["search_key"]
     change_list_template = "admin/patients_changelist.html"
-    list_filter = [DistrictFilter, NeighborhoodFilter, PsychiatristFilter, InspectorFilter, "is_aggressive",
-                   "is_convicted", "is_abroad_long_term", OverdueFilter]
+    list_filter = [DistrictFilter, NeighborhoodFilter, PsychiatristFilter, InspectorFilter,
+                   ("is_aggressive", FacetedBooleanFieldListFilter), ("is_convicted", FacetedBooleanFieldListFilter),
+                   ("is_abroad_long_term", FacetedBooleanFieldListFilter), OverdueFilter]
+    show_facets = admin.ShowFacets.ALWAYS
+    # filtrsiz umumiy son uchun alohida COUNT(*) yuborilmaydi
+    show_full_result_count = False
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        user = request.user
+        principal = request.principal
         if db_field.name == "neighborhood":
-            if hasattr(user, "district"):
-                kwargs["queryset"] = Neighborhood.objects.filter(district_id=user.district.district_id)
-            elif hasattr(user, 'region'):
-                kwargs["queryset"] = Neighborhood.objects.filter(district__region_id=user.region.region_id)
-            else:
-                kwargs["queryset"] = Neighborhood.objects.all()
+            kwargs["queryset"] = Neighborhood.objects.filter(principal.district_q("district__")).select_related("district")
         if db_field.name == "inspector":
-            if hasattr(user, "district"):
-                kwargs["queryset"] = Inspector.objects.filter(neighborhood__district_id=user.district.district_id)
-            elif hasattr(user, 'region'):
-                kwargs["queryset"] = Inspector.objects.filter(neighborhood__district__region_id=user.region.region_id)
-            else:
-                kwargs["queryset"] = Inspector.objects.all()
+            kwargs["queryset"] = Inspector.objects.filter(principal.hierarchy_q())
         if db_field.name == "psychiatrist":
-            if hasattr(user, "district"):
-                kwargs["queryset"] = Psychiatrist.objects.filter(district_id=user.district.district_id)
-            elif hasattr(user, 'region'):
-                kwargs["queryset"] = Psychiatrist.objects.filter(district__region_id=user.region.region_id)
-            else:
-                kwargs["queryset"] = Psychiatrist.objects.all()
+            kwargs["queryset"] = Psychiatrist.objects.filter(principal.hierarchy_q())
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
     def fbirth_date(self, obj):
@@ -426,21 +288,21 @@ class PatientAdmin(admin.ModelAdmin):
     flast_hospitalization_to.short_description = Patient._meta.get_field("last_hospitalization_to").verbose_name
 
     def get_readonly_fields(self, request, obj=None):
-        user = request.user
-        if hasattr(user, "inspector"):
+        role = request.principal.role
+        if role == INSPECTOR:
             return ["full_name", "pinfl", "fbirth_date", "is_aggressive", "neighborhood_display", "address", "inspector_display",
                     "psychiatrist_display", "reason_for_special_consideration_display", "description_for_special_consideration",
                     "reason", "flast_psychiatric_appointment_date", "flast_home_visit_by_doctor_date",
                      "flast_hospitalization_from", "receiving_supportive_therapy", "alcohol_and_drug_use",
                     "flast_hospitalization_to", "last_psychiatric_appointment_file", "last_home_visit_by_doctor_file",
                     "last_hospitalization_from_file", "last_hospitalization_to_file", "max_examination_interval"]
-        elif hasattr(user, "neighborhood"):
+        elif role == NEIGHBORHOOD:
             return ["full_name", "pinfl", "fbirth_date", "is_aggressive", "is_convicted", "is_abroad_long_term",
                     "neighborhood_display", "address", "inspector_display", "psychiatrist_display",
                     "reason_for_special_consideration_display", "description_for_special_consideration", "where_is_now",
                     "description_where_is_now", "social_domestic_environment_display", "last_psychiatric_appointment_file", "flast_psychiatric_appointment_date",
                     "flast_home_visit_by_doctor_date", "flast_hospitalization_from", "flast_hospitalization_to", "max_examination_interval"]
-        elif hasattr(user, "psychiatrist"):
+        elif role == PSYCHIATRIST:
             return ["full_name", "pinfl", "fbirth_date", "is_aggressive", "is_convicted", "is_abroad_long_term",
                     "neighborhood_display", "address", "inspector_display", "psychiatrist_display",
                     "reason_for_special_consideration_display", "description_for_special_consideration", "where_is_now",
@@ -452,9 +314,9 @@ class PatientAdmin(admin.ModelAdmin):
 
     def get_fields(self, request, obj=None):
         fields = list(super().get_fields(request, obj))
-        user = request.user
+        role = request.principal.role
 
-        if hasattr(user, "neighborhood"):
+        if role == NEIGHBORHOOD:
             if "neighborhood" in fields:
                 fields.remove("neighborhood")
             if "psychiatrist" in fields:
@@ -475,7 +337,7 @@ class PatientAdmin(admin.ModelAdmin):
                 fields.remove("last_hospitalization_from")
             if "last_hospitalization_to" in fields:
                 fields.remove("last_hospitalization_to")
-        elif hasattr(user, "psychiatrist"):
+        elif role == PSYCHIATRIST:
             if "neighborhood" in fields:
                 fields.remove("neighborhood")
             if "psychiatrist" in fields:
@@ -496,7 +358,7 @@ class PatientAdmin(admin.ModelAdmin):
                 fields.remove("last_hospitalization_from")
             if "last_hospitalization_to" in fields:
                 fields.remove("last_hospitalization_to")
-        elif hasattr(user, "inspector"):
+        elif role == INSPECTOR:
             if "neighborhood" in fields:
                 fields.remove("neighborhood")
             if "psychiatrist" in fields:
@@ -525,90 +387,54 @@ class PatientAdmin(admin.ModelAdmin):
                 fields.remove("last_hospitalization_to")
         return fields
 
+    def get_changelist(self, request, **kwargs):
+        return PatientChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page,
+                                       exact=EXACT_COUNT_VAR in request.GET)
+
     def get_queryset(self, request):
-        today = timezone.now().date()
         queryset = super(PatientAdmin, self).get_queryset(request)
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(inspector__user=user)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood__user=user)
-        elif hasattr(user, "psychiatrist"):
-            queryset = queryset.filter(psychiatrist__user=user)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
-        return queryset.annotate(
-            last_date=Case(
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=False,
-                    last_hospitalization_from__gt=F("last_hospitalization_to"),
-                    then=Value(today)
-                ),
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=True,
-                    then=Value(today)
-                ),
-                When(
-                    last_hospitalization_from__isnull=True,
-                    last_hospitalization_to__isnull=False,
-                    then=Greatest(
-                        "last_hospitalization_to",
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=False,
-                    last_hospitalization_from__lte=F("last_hospitalization_to"),
-                    then=Greatest(
-                        "last_hospitalization_to",
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                When(
-                    last_hospitalization_from__isnull=True,
-                    last_hospitalization_to__isnull=True,
-                    then=Greatest(
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                default=None,
-                output_field=DateField()
-            )
-        ).annotate(
-            interval=ExpressionWrapper(
-                F("max_examination_interval") * Value(datetime.timedelta(days=1)),
-                output_field=DurationField()
-            ),
-            deadline=Cast(
-                ExpressionWrapper(
-                    F("last_date") + F("interval"),
-                    output_field=DateField(),
-                ),
-                DateField()
-            ),
-            is_overdue=Case(
-                When(last_date__isnull=True, then=Value(True)),
-                When(deadline__lt=Value(today, output_field=DateField()), then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField()
-            )
-        )
+        return queryset.filter(request.principal.patient_q())
+
+    def get_search_results(self, request, queryset, search_term):
+        if FUZZY_VAR in request.GET and search_term:
+            return fuzzy_search(queryset, search_term, get_setting("fuzzy_search_limit")), False
+        return super().get_search_results(request, queryset, search_term)
 
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path("export-excel/", self.admin_site.admin_view(self.export_as_excel), name="patients_export_excel"),
+            path("search/", self.admin_site.admin_view(self.search_view), name="patients_search"),
         ]
         return custom_urls + urls
 
+    def search_view(self, request):
+        """
+        Xatolarga chidamli qidiruv (JSON): ?q=...&limit=..., natijalar yaqinlik bo'yicha.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        max_limit = get_setting("fuzzy_search_limit")
+        limit = request.GET.get("limit", "")
+        limit = min(int(limit), max_limit) if limit.isdigit() and int(limit) > 0 else max_limit
+        ranked = fuzzy_rank(self.get_queryset(request), request.GET.get("q", ""), limit)
+        patients = Patient.objects.select_related("neighborhood__district").in_bulk([pk for pk, score in ranked])
+        results = [
+            {
+                "id": pk,
+                "full_name": patients[pk].full_name,
+                "address": patients[pk].address,
+                "neighborhood": patients[pk].neighborhood.name,
+                "district": patients[pk].neighborhood.district.name,
+                "score": round(score, 3),
+            }
+            for pk, score in ranked if pk in patients
+        ]
+        return JsonResponse({"results": results})
+
     def neighborhood__district(self, obj):
         return obj.neighborhood.district.name
 
@@ -657,16 +483,18 @@ class PatientAdmin(admin.ModelAdmin):
     @admin.display(description=_("next medical examination deadline"),
                    ordering="deadline")
     def next_psychiatric_appointment_date(self, obj):
-        if obj.deadline:
-            return obj.deadline.strftime("%d.%m.%Y")
+        deadline = obj.get_deadline()
+        if deadline:
+            return deadline.strftime("%d.%m.%Y")
         return "—"
 
     @admin.display(description=_("days left until the next medical examination"),
                    ordering="deadline")
     def last_psychiatric_appointment_days_left(self, obj):
-        if obj.deadline:
-            today = timezone.now().date()
-            days = (obj.deadline - today).days
+        today = timezone.now().date()
+        deadline = obj.get_deadline(today)
+        if deadline:
+            days = (deadline - today).days
             if days < 3:
                 color = "#f8d7da"
             elif days < 7:
@@ -686,78 +514,32 @@ class PatientAdmin(admin.ModelAdmin):
         else:
             return None
 
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context["export_profiles"] = ExportProfile.objects.all()
+        return super().changelist_view(request, extra_context)
+
     def export_as_excel(self, request):
-        qs = self.get_changelist_instance(request).get_queryset(request)
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Ruhiy kasallar"
-
-        ws.append(["№", "Ф.И.Ш.", "ПИНФЛ", "Туг.йили", "Ҳудуд", "Маҳалла", "Манзили", "Махсус хисобга олиш сабаби",
-                   "Махсус хисобга олишга изоҳи",
-                   "Охирги психиатр кабулига келган куни", "Охирги шифокор ёки хамшира томонидан уйдаги курик",
-                   "Агар бир ой ичида кўрилмаган бўлса сабабини қўрсатилсин", "Кувватловчи терапия олиниши",
-                   "Ижтимоий-Маиший муҳит", "Алкоголь, наркотик моддалар истемол килиши", "Охирги госпитализация",
-                   "Бемор ҳозирги кунда каерда", "Бемор ҳозирги кунда каерда изоҳ",	"Худуд еки Туман психиатр Ф.И.Ш.",
-                   "Бириктирилган Ички ишлар ходими", "Аҳоли учун хавф туғдираяптими", "Муқаддам судланганми",
-                   "Узоқ муддатга кетганми"])
-
-        for index, obj in enumerate(qs, start=1):
-            ws.append([
-                index,
-                obj.full_name,
-                obj.pinfl,
-                obj.birth_date.strftime("%d.%m.%Y") if obj.birth_date else "",
-                obj.neighborhood.district.name if obj.neighborhood and obj.neighborhood.district else "",
-                obj.neighborhood.name if obj.neighborhood else "",
-                obj.address,
-                obj.reason_for_special_consideration.name if obj.reason_for_special_consideration else "",
-                obj.description_for_special_consideration,
-                obj.last_psychiatric_appointment_date.strftime("%d.%m.%Y") if obj.last_psychiatric_appointment_date else "",
-                obj.last_home_visit_by_doctor_date.strftime("%d.%m.%Y") if obj.last_home_visit_by_doctor_date else "",
-                obj.reason,
-                obj.get_receiving_supportive_therapy_display(),
-                obj.social_domestic_environment.name if obj.social_domestic_environment else "",
-                obj.get_alcohol_and_drug_use_display(),
-                (
-                    obj.last_hospitalization_from.strftime("%d.%m.%Y") + "-" + (
-                        "хозиргача"
-                        if (obj.last_hospitalization_from and (
-                                not obj.last_hospitalization_to or obj.last_hospitalization_from > obj.last_hospitalization_to
-                        ))
-                        else obj.last_hospitalization_to.strftime("%d.%m.%Y")
-                    )
-                    if obj and obj.last_hospitalization_from
-                    else "номаълум санадан - " + obj.last_hospitalization_to.strftime("%d.%m.%Y")
-                    if obj and obj.last_hospitalization_to
-                    else ""
-                ),
-                obj.get_where_is_now_display(),
-                obj.description_where_is_now,
-                obj.psychiatrist.full_name if obj.psychiatrist else "",
-                obj.inspector.full_name if obj.inspector else "",
-                "Ҳа" if obj.is_aggressive else "Йўқ",
-                "Ҳа" if obj.is_convicted else "Йўқ",
-                "Ҳа" if obj.is_abroad_long_term else "Йўқ",
-            ])
-
-        uniform_width = 20
-        for col in ws.columns:
-            col_letter = get_column_letter(col[0].column)
-            ws.column_dimensions[col_letter].width = uniform_width
-            for cell in col:
-                cell.alignment = Alignment(wrap_text=True)
-
-        today_str = datetime.date.today().strftime("%Y-%m-%d")
-        filename = f"patients-{today_str}.xlsx"
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        response = HttpResponse(
-            output,
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        response["Content-Disposition"] = f'attachment; filename={filename}'
-        return response
\ No newline at end of file
+        params = request.GET.copy()
+        profile_id = params.pop("profile", [""])[0]
+        profile = get_object_or_404(ExportProfile, pk=profile_id) if profile_id.isdigit() else None
+
+        if profile and profile.file_format == ExportFormat.CSV:
+            # CSV navbatsiz, qatorma-qator oqim bilan beriladi
+            request.GET = params
+            qs = self.get_changelist_instance(request).queryset
+            today_str = datetime.date.today().strftime("%Y-%m-%d")
+            response = StreamingHttpResponse(export_patients_csv(qs, profile.columns), content_type=CSV_CONTENT_TYPE)
+            response["Content-Disposition"] = f'attachment; filename=patients-{today_str}.csv'
+            return response
+
+        enqueue_export(request, ExportKind.PATIENTS, params, profile.columns if profile else None)
+        messages.success(request, _("The export has been queued. The file will be available on the \"My exports\" page."))
+        return redirect("admin:utils_exportjob_changelist")
+
+
+@admin.register(ExportProfile)
+class ExportProfileAdmin(admin.ModelAdmin):
+    form = ExportProfileForm
+    list_display = ("id", "name", "file_format")
+    list_display_links = ("id", "name")
@@ -0,0 +1,113 @@
+import datetime
+from collections import namedtuple
+
+from django.utils import timezone
+from django.utils.encoding import force_str
+
+from psytracks.models import AlcoholAndDrugUse, ReceivingSupportiveTherapyChoices, WhereIsNow
+from utils.exports import EXPORT_CHUNK_SIZE, iter_csv, write_xlsx
+
+ExportColumn = namedtuple("ExportColumn", ["header", "fields", "value"])
+
+
+def format_date(value):
+    return value.strftime("%d.%m.%Y") if value else ""
+
+
+def format_hospitalization(row):
+    date_from, date_to = row["last_hospitalization_from"], row["last_hospitalization_to"]
+    if date_from:
+        if not date_to or date_from > date_to:
+            return format_date(date_from) + "-" + "хозиргача"
+        return format_date(date_from) + "-" + format_date(date_to)
+    if date_to:
+        return "номаълум санадан - " + format_date(date_to)
+    return ""
+
+
+def format_deadline(row):
+    if row["is_hospitalized"]:
+        return format_date(timezone.now().date() + datetime.timedelta(days=row["max_examination_interval"]))
+    return format_date(row["deadline"])
+
+
+def text_column(header, field, default=None):
+    return ExportColumn(header, (field,), lambda row: row[field] if row[field] is not None else default)
+
+
+def date_column(header, field):
+    return ExportColumn(header, (field,), lambda row: format_date(row[field]))
+
+
+def choice_column(header, field, choices):
+    labels = dict(choices.choices)
+    return ExportColumn(header, (field,), lambda row: force_str(labels.get(row[field], row[field]), strings_only=True))
+
+
+def yes_no_column(header, field):
+    return ExportColumn(header, (field,), lambda row: "Ҳа" if row[field] else "Йўқ")
+
+
+# Eksport qilinadigan ustunlar: kalit -> (sarlavha, values() maydonlari, qiymat)
+PATIENT_EXPORT_COLUMNS = {
+    "number": ExportColumn("№", (), None),
+    "full_name": text_column("Ф.И.Ш.", "full_name"),
+    "pinfl": text_column("ПИНФЛ", "pinfl"),
+    "birth_date": date_column("Туг.йили", "birth_date"),
+    "district": text_column("Ҳудуд", "neighborhood__district__name", ""),
+    "neighborhood": text_column("Маҳалла", "neighborhood__name", ""),
+    "address": text_column("Манзили", "address"),
+    "reason_for_special_consideration": text_column("Махсус хисобга олиш сабаби",
+                                                    "reason_for_special_consideration__name", ""),
+    "description_for_special_consideration": text_column("Махсус хисобга олишга изоҳи",
+                                                         "description_for_special_consideration"),
+    "last_psychiatric_appointment_date": date_column("Охирги психиатр кабулига келган куни",
+                                                     "last_psychiatric_appointment_date"),
+    "last_home_visit_by_doctor_date": date_column("Охирги шифокор ёки хамшира томонидан уйдаги курик",
+                                                  "last_home_visit_by_doctor_date"),
+    "reason": text_column("Агар бир ой ичида кўрилмаган бўлса сабабини қўрсатилсин", "reason"),
+    "receiving_supportive_therapy": choice_column("Кувватловчи терапия олиниши", "receiving_supportive_therapy",
+                                                  ReceivingSupportiveTherapyChoices),
+    "social_domestic_environment": text_column("Ижтимоий-Маиший муҳит", "social_domestic_environment__name", ""),
+    "alcohol_and_drug_use": choice_column("Алкоголь, наркотик моддалар истемол килиши", "alcohol_and_drug_use",
+                                          AlcoholAndDrugUse),
+    "last_hospitalization": ExportColumn("Охирги госпитализация",
+                                         ("last_hospitalization_from", "last_hospitalization_to"),
+                                         format_hospitalization),
+    "where_is_now": choice_column("Бемор ҳозирги кунда каерда", "where_is_now", WhereIsNow),
+    "description_where_is_now": text_column("Бемор ҳозирги кунда каерда изоҳ", "description_where_is_now"),
+    "psychiatrist": text_column("Худуд еки Туман психиатр Ф.И.Ш.", "psychiatrist__full_name", ""),
+    "inspector": text_column("Бириктирилган Ички ишлар ходими", "inspector__full_name", ""),
+    "is_aggressive": yes_no_column("Аҳоли учун хавф туғдираяптими", "is_aggressive"),
+    "is_convicted": yes_no_column("Муқаддам судланганми", "is_convicted"),
+    "is_abroad_long_term": yes_no_column("Узоқ муддатга кетганми", "is_abroad_long_term"),
+    "deadline": ExportColumn("Кейинги кўрик муддати", ("is_hospitalized", "max_examination_interval", "deadline"),
+                             format_deadline),
+}
+
+DEFAULT_PATIENT_COLUMNS = [key for key in PATIENT_EXPORT_COLUMNS if key != "deadline"]
+
+
+def get_patient_columns(keys=None):
+    return [PATIENT_EXPORT_COLUMNS[key] for key in keys or DEFAULT_PATIENT_COLUMNS]
+
+
+def iter_patient_rows(queryset, columns):
+    """
+    Faqat tanlangan ustunlar uchun kerakli maydonlarni values() orqali o'qiydi.
+    """
+    fields = list(dict.fromkeys(field for column in columns for field in column.fields)) or ["pk"]
+    rows = queryset.values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for index, row in enumerate(rows, start=1):
+        yield [index if column.value is None else column.value(row) for column in columns]
+
+
+def export_patients_xlsx(queryset, file, progress=None, columns=None):
+    columns = get_patient_columns(columns)
+    write_xlsx("Ruhiy kasallar", [column.header for column in columns], iter_patient_rows(queryset, columns),
+               file, progress)
+
+
+def export_patients_csv(queryset, columns=None):
+    columns = get_patient_columns(columns)
+    return iter_csv([column.header for column in columns], iter_patient_rows(queryset, columns))
@@ -1,7 +1,10 @@
 from django import forms
+from django.utils.html import format_html
+from django.utils.translation import gettext_lazy as _
 from dal import autocomplete
 
-from .models import Patient
+from .exports import DEFAULT_PATIENT_COLUMNS, PATIENT_EXPORT_COLUMNS
+from .models import Patient, ExportProfile
 
 
 class PatientForm(forms.ModelForm):
@@ -18,3 +21,31 @@ class PatientForm(forms.ModelForm):
                 forward=['neighborhood']
             ),
         }
+
+
+class ExportProfileForm(forms.ModelForm):
+    columns = forms.CharField(
+        label=_("columns"), widget=forms.Textarea(attrs={"rows": 10}),
+        help_text=_("One column key per line, in the order they should appear in the file."),
+    )
+
+    class Meta:
+        model = ExportProfile
+        fields = ("name", "file_format", "columns")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial["columns"] = "\n".join(self.instance.columns or DEFAULT_PATIENT_COLUMNS)
+        self.fields["columns"].help_text = format_html(
+            "{}<br>{}", self.fields["columns"].help_text,
+            ", ".join(f"{key} ({column.header})" for key, column in PATIENT_EXPORT_COLUMNS.items()),
+        )
+
+    def clean_columns(self):
+        columns = [line.strip() for line in self.cleaned_data["columns"].splitlines() if line.strip()]
+        unknown = [key for key in columns if key not in PATIENT_EXPORT_COLUMNS]
+        if unknown:
+            raise forms.ValidationError(_("Unknown columns: %(columns)s") % {"columns": ", ".join(unknown)})
+        if not columns:
+            raise forms.ValidationError(_("Select at least one column."))
+        return list(dict.fromkeys(columns))
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:11
+
+import datetime
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def get_compliance_dates(patient):
+    """
+    psytracks.models.get_compliance_dates'ning shu migratsiya holatidagi nusxasi: (is_hospitalized, last_date, deadline)
+    """
+    hospitalization_from = patient.last_hospitalization_from
+    hospitalization_to = patient.last_hospitalization_to
+    if hospitalization_from and (not hospitalization_to or hospitalization_from > hospitalization_to):
+        return True, None, None
+    dates = [d for d in (hospitalization_to, patient.last_psychiatric_appointment_date,
+                         patient.last_home_visit_by_doctor_date) if d]
+    if not dates:
+        return False, None, None
+    last_date = max(dates)
+    return False, last_date, last_date + datetime.timedelta(days=patient.max_examination_interval)
+
+
+def fill_compliance_dates(apps, schema_editor):
+    """
+    Bemorlar pk bo'yicha BATCH_SIZE tadan o'qiladi va yoziladi, butun jadval xotiraga yuklanmaydi.
+    """
+    Patient = apps.get_model("psytracks", "Patient")
+    patients = Patient.objects.only(
+        "pk", "last_hospitalization_from", "last_hospitalization_to", "last_psychiatric_appointment_date",
+        "last_home_visit_by_doctor_date", "max_examination_interval",
+    ).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(patients.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        for patient in batch:
+            patient.is_hospitalized, patient.last_date, patient.deadline = get_compliance_dates(patient)
+        Patient.objects.bulk_update(batch, ["is_hospitalized", "last_date", "deadline"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('psytracks', '0014_patient_is_abroad_long_term_patient_is_convicted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='deadline',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='next medical examination deadline'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='is_hospitalized',
+            field=models.BooleanField(default=False, editable=False, verbose_name='is hospitalized'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='last_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='date of the last examination'),
+        ),
+        migrations.RunPython(fill_compliance_dates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('psytracks', '0015_patient_compliance_dates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='name')),
+                ('columns', models.JSONField(default=list, verbose_name='columns')),
+                ('file_format', models.CharField(choices=[('xlsx', 'Excel (XLSX)'), ('csv', 'CSV')], default='xlsx', max_length=10, verbose_name='file format')),
+            ],
+            options={
+                'verbose_name': 'Export profile',
+                'verbose_name_plural': 'Export profiles',
+                'ordering': ('name',),
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:52
+
+from django.db import migrations, models
+
+SCOPE_INDEX = models.Index(fields=['neighborhood', 'deadline'], name='patient_scope_deadline_idx')
+SCOPE_INCLUDE = ('is_hospitalized', 'is_aggressive', 'is_convicted', 'is_abroad_long_term')
+
+
+def get_scope_index(schema_editor):
+    """
+    Hisoblagich ustunlarini qamrab oluvchi (INCLUDE) indeks faqat PostgreSQL'da, boshqa bazalarda oddiy indeks.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        return models.Index(fields=SCOPE_INDEX.fields, name=SCOPE_INDEX.name, include=SCOPE_INCLUDE)
+    return SCOPE_INDEX
+
+
+def add_scope_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('psytracks', 'Patient'), get_scope_index(schema_editor))
+
+
+def remove_scope_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('psytracks', 'Patient'), get_scope_index(schema_editor))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('psytracks', '0018_address_key'),
+        ('utils', '0011_search_key'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='patient', index=SCOPE_INDEX)],
+            database_operations=[migrations.RunPython(add_scope_index, remove_scope_index)],
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['inspector', 'deadline'], name='psytracks_p_inspect_effde5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['psychiatrist', 'deadline'], name='psytracks_p_psychia_6785db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('is_aggressive', True)), fields=['neighborhood', 'deadline'], name='patient_aggressive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('is_convicted', True)), fields=['neighborhood'], name='patient_convicted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('is_abroad_long_term', True)), fields=['neighborhood'], name='patient_abroad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_psychiatric_appointment_date', 'id'], name='psytracks_p_last_ps_115893_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_home_visit_by_doctor_date', 'id'], name='psytracks_p_last_ho_c6a1e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_hospitalization_from', 'id'], name='psytracks_p_last_ho_9d726b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['last_hospitalization_to', 'id'], name='psytracks_p_last_ho_53e742_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['full_name', 'id'], name='psytracks_p_full_na_44d0c2_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_hierarchy_columns(apps, schema_editor):
+    """
+    Tuman va viloyat mahalladan (Psychiatrist'da viloyat tumandan) bitta UPDATE ... SET = (SELECT ...) bilan.
+    """
+    neighborhood = apps.get_model("utils", "Neighborhood").objects.filter(pk=OuterRef("neighborhood_id"))
+    for model in ("Patient", "Doctor"):
+        apps.get_model("psytracks", model).objects.update(
+            district=Subquery(neighborhood.values("district_id")),
+            region=Subquery(neighborhood.values("district__region_id")),
+        )
+    district = apps.get_model("utils", "District").objects.filter(pk=OuterRef("district_id"))
+    apps.get_model("psytracks", "Psychiatrist").objects.update(region=Subquery(district.values("region_id")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('psytracks', '0019_patient_indexes'),
+        ('utils', '0012_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='district',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='doctors', to='utils.district', verbose_name='district'),
+        ),
+        migrations.AddField(
+            model_name='doctor',
+            name='region',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='doctors', to='utils.region', verbose_name='region'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='district',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='patients', to='utils.district', verbose_name='district'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='region',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='patients', to='utils.region', verbose_name='region'),
+        ),
+        migrations.AddField(
+            model_name='psychiatrist',
+            name='region',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='psychiatrists', to='utils.region', verbose_name='region'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['district', 'deadline'], name='psytracks_p_distric_b2527d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['region', 'deadline'], name='psytracks_p_region__8407cc_idx'),
+        ),
+        migrations.RunPython(fill_hierarchy_columns, migrations.RunPython.noop),
+    ]
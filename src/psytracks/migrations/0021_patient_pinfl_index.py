@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('psytracks', '0020_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='patient',
+            name='pinfl',
+            field=models.CharField(db_index=True, max_length=14, verbose_name='pinfl'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:30
+
+import datetime
+
+from django.db import migrations
+
+# psytracks.models.HOSPITALIZED_DEADLINE'ning shu migratsiya holatidagi nusxasi
+HOSPITALIZED_DEADLINE = datetime.date.max
+
+
+def set_hospitalized_deadline(apps, schema_editor):
+    Patient = apps.get_model("psytracks", "Patient")
+    Patient.objects.filter(is_hospitalized=True).update(deadline=HOSPITALIZED_DEADLINE)
+
+
+def clear_hospitalized_deadline(apps, schema_editor):
+    Patient = apps.get_model("psytracks", "Patient")
+    Patient.objects.filter(is_hospitalized=True).update(deadline=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('psytracks', '0021_patient_pinfl_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_hospitalized_deadline, clear_hospitalized_deadline),
+    ]
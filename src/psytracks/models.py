@@ -3,8 +3,13 @@ import datetime
 
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from utils.hierarchy import get_hierarchy_map, get_neighborhood_map, set_hierarchy
+from utils.search import normalize_search, set_search_keys, invalidate_fuzzy_index, SEARCH_KEYS
+
 
 class ReceivingSupportiveTherapyChoices(models.TextChoices):
     REGULARLY_RECEIVING = ("regularly_receiving", _("Regularly receiving"))
@@ -29,11 +34,15 @@ class WhereIsNow(models.TextChoices):
 
 class Doctor(models.Model):
     full_name = models.CharField(_("full_name"), max_length=100)
+    search_key = models.CharField(_("search key"), max_length=255, default="", editable=False, db_index=True)
     phone = models.CharField(_("phone"), max_length=13, null=True, blank=True)
     brigade_number = models.CharField(_("brigade_number"), max_length=50, null=True, blank=True)
     polyclinic_name = models.CharField(_("polyclinic name"), max_length=100, null=True, blank=True)
     birth_date = models.DateField(_("birth date"), null=True, blank=True)
     neighborhood = models.ForeignKey(verbose_name=_("neighborhood"), to="utils.Neighborhood", on_delete=models.CASCADE, related_name="doctors")
+    # mahalladan nusxa (utils.hierarchy), ko'rish doirasi JOIN'siz tekshiriladi
+    district = models.ForeignKey(verbose_name=_("district"), to="utils.District", on_delete=models.SET_NULL, related_name="doctors", null=True, editable=False)
+    region = models.ForeignKey(verbose_name=_("region"), to="utils.Region", on_delete=models.SET_NULL, related_name="doctors", null=True, editable=False)
 
     class Meta:
         verbose_name = _("Doctor")
@@ -45,9 +54,12 @@ class Doctor(models.Model):
 
 class Psychiatrist(models.Model):
     full_name = models.CharField(_("full_name"), max_length=100)
+    search_key = models.CharField(_("search key"), max_length=255, default="", editable=False, db_index=True)
     phone = models.CharField(_("phone"), max_length=13, null=True, blank=True)
     user = models.OneToOneField(verbose_name=_("user"), to="users.User", on_delete=models.CASCADE, related_name="psychiatrist")
     district = models.ForeignKey(verbose_name=_("district"), to="utils.District", on_delete=models.CASCADE, related_name="psychiatrists")
+    # tumandan nusxa (utils.hierarchy)
+    region = models.ForeignKey(verbose_name=_("region"), to="utils.Region", on_delete=models.SET_NULL, related_name="psychiatrists", null=True, editable=False)
 
     class Meta:
         verbose_name = _("Psychiatrist")
@@ -120,18 +132,168 @@ def validate_file_extension(value):
 file_validators = [validate_file_size, validate_file_extension]
 
 
+COMPLIANCE_SOURCE_FIELDS = ("last_hospitalization_from", "last_hospitalization_to", "last_psychiatric_appointment_date",
+                            "last_home_visit_by_doctor_date", "max_examination_interval")
+COMPLIANCE_FIELDS = ("is_hospitalized", "last_date", "deadline")
+# shifoxonadagi bemorning muddati har kuni bugundan hisoblanadi (get_deadline), ustunda esa shu qiymat turadi:
+# muddat bo'yicha tartiblashda ular hech ko'rilmaganlar (NULL) bilan aralashmay, ro'yxat oxirida bo'ladi
+HOSPITALIZED_DEADLINE = datetime.date.max
+# update() dan keyin pk'lar shu o'lchamdagi bo'laklar bilan qayta hisoblanadi (SQLite'ning 999 parametr chegarasi)
+REFRESH_CHUNK_SIZE = 900
+# admin yon panel filtrlari shu biriktirishlardan quriladi (utils.filters)
+ASSIGNMENT_FIELDS = ("neighborhood_id", "inspector_id", "psychiatrist_id")
+
+
+def assignments_changed(fields):
+    return any(f"{field}_id" in ASSIGNMENT_FIELDS or field in ASSIGNMENT_FIELDS for field in fields)
+
+
+def invalidate_lookups():
+    from utils.filters import invalidate_lookups
+
+    invalidate_lookups()
+
+
+def get_compliance_dates(patient):
+    """
+    Bemorning oxirgi ko'rik sanasi va keyingi ko'rik muddatini hisoblaydi:
+    (is_hospitalized, last_date, deadline)
+    """
+    hospitalization_from = patient.last_hospitalization_from
+    hospitalization_to = patient.last_hospitalization_to
+    if hospitalization_from and (not hospitalization_to or hospitalization_from > hospitalization_to):
+        # hozir shifoxonada, muddat har kuni bugundan hisoblanadi
+        return True, None, HOSPITALIZED_DEADLINE
+
+    dates = [d for d in (hospitalization_to, patient.last_psychiatric_appointment_date,
+                         patient.last_home_visit_by_doctor_date) if d]
+    if not dates:
+        return False, None, None
+    last_date = max(dates)
+    return False, last_date, last_date + datetime.timedelta(days=patient.max_examination_interval)
+
+
+def overdue_q(today=None, prefix=""):
+    today = today or timezone.now().date()
+    return Q(**{f"{prefix}is_hospitalized": False}) & (
+        Q(**{f"{prefix}deadline__isnull": True}) | Q(**{f"{prefix}deadline__lt": today})
+    )
+
+
+def on_time_q(today=None, prefix=""):
+    today = today or timezone.now().date()
+    return Q(**{f"{prefix}is_hospitalized": True}) | Q(**{f"{prefix}deadline__gte": today})
+
+
+class PatientQuerySet(models.QuerySet):
+    def overdue(self, today=None):
+        return self.filter(overdue_q(today))
+
+    def on_time(self, today=None):
+        return self.filter(on_time_q(today))
+
+    def update(self, **kwargs):
+        if assignments_changed(kwargs):
+            invalidate_lookups()
+        keys = {key: normalize_search(kwargs[source]) for source, key in SEARCH_KEYS.items()
+                if source in kwargs and (kwargs[source] is None or isinstance(kwargs[source], str))}
+        if keys:
+            kwargs.update(keys)
+            invalidate_fuzzy_index()
+        neighborhood = kwargs.get("neighborhood", kwargs.get("neighborhood_id"))
+        if neighborhood is not None and not hasattr(neighborhood, "resolve_expression"):
+            neighborhood_id = getattr(neighborhood, "pk", neighborhood)
+            neighborhood_model = self.model._meta.get_field("neighborhood").related_model
+            kwargs["district_id"], kwargs["region_id"] = get_neighborhood_map(
+                neighborhood_model, [neighborhood_id]).get(neighborhood_id, (None, None))
+        if not set(COMPLIANCE_SOURCE_FIELDS) & kwargs.keys():
+            return super().update(**kwargs)
+        # update filtrga mos qatorlarni o'zgartirishi mumkin, shuning uchun pk'lar oldindan olinadi
+        pks = list(self.values_list("pk", flat=True))
+        rows = super().update(**kwargs)
+        for start in range(0, len(pks), REFRESH_CHUNK_SIZE):
+            self.model.objects.filter(pk__in=pks[start:start + REFRESH_CHUNK_SIZE]).refresh_compliance()
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_compliance_dates()
+            set_search_keys(obj)
+        set_hierarchy(objs, get_hierarchy_map(self.model, objs))
+        if objs:
+            invalidate_lookups()
+            invalidate_fuzzy_index()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if assignments_changed(fields):
+            invalidate_lookups()
+        keys = [key for source, key in SEARCH_KEYS.items() if source in fields]
+        if keys:
+            objs = list(objs)
+            for obj in objs:
+                set_search_keys(obj, fields)
+            fields += [key for key in keys if key not in fields]
+            invalidate_fuzzy_index()
+        if {"neighborhood", "neighborhood_id"} & set(fields):
+            objs = list(objs)
+            set_hierarchy(objs, get_hierarchy_map(self.model, objs))
+            fields += [field for field in ("district", "region") if field not in fields]
+        if set(COMPLIANCE_SOURCE_FIELDS) & set(fields):
+            objs = list(objs)
+            for obj in objs:
+                obj.set_compliance_dates()
+            fields += [f for f in COMPLIANCE_FIELDS if f not in fields]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def refresh_compliance(self, batch_size=1000):
+        """
+        Saqlangan last_date/deadline ustunlarini qayta hisoblaydi, faqat o'zgarganlarini yozadi.
+        """
+        qs = self.only("pk", *COMPLIANCE_SOURCE_FIELDS, *COMPLIANCE_FIELDS).order_by("pk")
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(qs.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for patient in batch:
+                values = get_compliance_dates(patient)
+                if values != tuple(getattr(patient, f) for f in COMPLIANCE_FIELDS):
+                    patient.is_hospitalized, patient.last_date, patient.deadline = values
+                    changed.append(patient)
+            if changed:
+                updated += self.model.objects.bulk_update(changed, COMPLIANCE_FIELDS)
+            if len(batch) < batch_size:
+                break
+        return updated
+
+    refresh_compliance.alters_data = True
+
+
 class Patient(models.Model):
     full_name = models.CharField(_("full_name"), max_length=100)
-    pinfl = models.CharField(_("pinfl"), max_length=14)
+    search_key = models.CharField(_("search key"), max_length=255, default="", editable=False, db_index=True)
+    pinfl = models.CharField(_("pinfl"), max_length=14, db_index=True)
     birth_date = models.DateField(_("birth_date"), null=True, blank=True)
     is_aggressive = models.BooleanField(_("is aggressive"), default=False)
     is_convicted = models.BooleanField(_("is convicted"), default=False)
     is_abroad_long_term = models.BooleanField(_("is abroad long term"), default=False)
     max_examination_interval = models.IntegerField(_("maximal examination interval (in days)"), default=30)
     neighborhood = models.ForeignKey(verbose_name=_("neighborhood"), to="utils.Neighborhood", on_delete=models.PROTECT, related_name="patients")
+    # mahalladan nusxa (utils.hierarchy), ko'rish doirasi JOIN'siz tekshiriladi
+    district = models.ForeignKey(verbose_name=_("district"), to="utils.District", on_delete=models.SET_NULL, related_name="patients", null=True, editable=False)
+    region = models.ForeignKey(verbose_name=_("region"), to="utils.Region", on_delete=models.SET_NULL, related_name="patients", null=True, editable=False)
     inspector = models.ForeignKey(verbose_name=_("inspector"), to="utils.Inspector", on_delete=models.PROTECT, related_name="patients")
     psychiatrist = models.ForeignKey(verbose_name=_("psychiatrist"), to=Psychiatrist, on_delete=models.PROTECT, related_name="patients", null=True)
     address = models.CharField(_("address"), max_length=100, null=True, blank=True)
+    address_key = models.CharField(_("address search key"), max_length=255, default="", editable=False)
     last_psychiatric_appointment_date = models.DateField(_("date of the last psychiatric appointment"), null=True, blank=True)
     last_psychiatric_appointment_file = models.FileField(_("file of the last psychiatric appointment"), upload_to=upload_to_psychiatric_appointment_file, validators=file_validators, null=True, blank=True)
     last_home_visit_by_doctor_date = models.DateField(_("date of last home visit by a doctor or nurse"), null=True, blank=True)
@@ -148,15 +310,48 @@ class Patient(models.Model):
     last_hospitalization_from_file = models.FileField(_("from date of last hospitalization file"), upload_to=upload_to_last_hospitalization_from, validators=file_validators, null=True, blank=True)
     last_hospitalization_to = models.DateField(_("to date of last hospitalization"), null=True, blank=True)
     last_hospitalization_to_file = models.FileField(_("to date of last hospitalization file"), upload_to=upload_to_last_hospitalization_to, validators=file_validators, null=True, blank=True)
+    is_hospitalized = models.BooleanField(_("is hospitalized"), default=False, editable=False)
+    last_date = models.DateField(_("date of the last examination"), null=True, blank=True, editable=False, db_index=True)
+    deadline = models.DateField(_("next medical examination deadline"), null=True, blank=True, editable=False, db_index=True)
 
+    objects = PatientQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Patient")
         verbose_name_plural = _("Patients")
+        indexes = [
+            # ko'rish doirasi (mahallalar ro'yxati) + muddat: ro'yxat, muddati o'tganlar va mahalla kesimidagi
+            # statistika; PostgreSQL'da migratsiya (0019) hisoblagich ustunlarini INCLUDE bilan qo'shadi
+            models.Index(fields=["neighborhood", "deadline"], name="patient_scope_deadline_idx"),
+            models.Index(fields=["district", "deadline"]),
+            models.Index(fields=["region", "deadline"]),
+            models.Index(fields=["inspector", "deadline"]),
+            models.Index(fields=["psychiatrist", "deadline"]),
+            # kam uchraydigan belgilar bo'yicha filtrlar uchun qisman indekslar
+            models.Index(fields=["neighborhood", "deadline"], condition=Q(is_aggressive=True),
+                         name="patient_aggressive_idx"),
+            models.Index(fields=["neighborhood"], condition=Q(is_convicted=True), name="patient_convicted_idx"),
+            models.Index(fields=["neighborhood"], condition=Q(is_abroad_long_term=True), name="patient_abroad_idx"),
+            # ro'yxatdagi sana ustunlari bo'yicha tartiblash va keyset sahifalash
+            models.Index(fields=["last_psychiatric_appointment_date", "id"]),
+            models.Index(fields=["last_home_visit_by_doctor_date", "id"]),
+            models.Index(fields=["last_hospitalization_from", "id"]),
+            models.Index(fields=["last_hospitalization_to", "id"]),
+            models.Index(fields=["full_name", "id"]),
+        ]
 
     def __str__(self):
         return self.full_name
 
+    def set_compliance_dates(self):
+        self.is_hospitalized, self.last_date, self.deadline = get_compliance_dates(self)
+
+    def get_deadline(self, today=None):
+        if self.is_hospitalized:
+            today = today or timezone.now().date()
+            return today + datetime.timedelta(days=self.max_examination_interval)
+        return self.deadline
+
     def save(self, *args, **kwargs):
         if self.pk:
             old = Patient.objects.filter(pk=self.pk).first()
@@ -181,10 +376,33 @@ class Patient(models.Model):
             if not (self.max_examination_interval and self.max_examination_interval <= 30):
                 self.max_examination_interval = 30
 
+        self.set_compliance_dates()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | set(COMPLIANCE_FIELDS)
+            kwargs["update_fields"] |= {key for source, key in SEARCH_KEYS.items() if source in update_fields}
+            if {"neighborhood", "neighborhood_id"} & set(update_fields):
+                kwargs["update_fields"] |= {"district", "region"}
+
         super().save(*args, **kwargs)
+        if old is None or any(getattr(old, field) != getattr(self, field) for field in ASSIGNMENT_FIELDS):
+            invalidate_lookups()
 
 
+class ExportFormat(models.TextChoices):
+    XLSX = ("xlsx", "Excel (XLSX)")
+    CSV = ("csv", "CSV")
 
 
+class ExportProfile(models.Model):
+    name = models.CharField(_("name"), max_length=100)
+    columns = models.JSONField(_("columns"), default=list)
+    file_format = models.CharField(_("file format"), max_length=10, choices=ExportFormat.choices, default=ExportFormat.XLSX)
 
+    class Meta:
+        verbose_name = _("Export profile")
+        verbose_name_plural = _("Export profiles")
+        ordering = ("name",)
 
+    def __str__(self):
+        return self.name
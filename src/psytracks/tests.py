@@ -1,3 +1,448 @@
+import datetime
+import io
+import re
+from importlib import import_module
+from unittest import mock, skipUnless
+
+from django.apps import apps
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from psytracks.admin import (DistrictDoctorFilter, DistrictFilter, DistrictPsychiatristFilter, InspectorFilter,
+                             NeighborhoodDoctorFilter, NeighborhoodFilter, PsychiatristFilter)
+from psytracks.models import (COMPLIANCE_FIELDS, HOSPITALIZED_DEADLINE, Patient, Doctor, Psychiatrist,
+                              get_compliance_dates, on_time_q, overdue_q)
+from utils.management.commands.explain_patient_queries import get_index_names
+from utils.search import normalize_search, TrigramIndex
+from users.principal import get_principal
+from users.tests import RoleDataMixin, INSPECTOR, PSYCHIATRIST, DISTRICT, REGION, SUPERUSER, vary_patients
+from utils.models import District, Inspector, Neighborhood
+
+
+class AdminQueryTests(RoleDataMixin, TestCase):
+    def test_patient_changelist(self):
+        url = reverse("admin:psytracks_patient_changelist")
+        self.assertQueryBudget(url, 22)
+        self.assertQueryBudget(f"{url}?is_overdue=yes&district={self.districts[0].pk}", 22)
+
+    def test_patient_change_form(self):
+        patient = Patient.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        self.assertQueryBudget(reverse("admin:psytracks_patient_add"), 16)
+        self.assertQueryBudget(reverse("admin:psytracks_patient_change", args=[patient.pk]), 19)
+
+    def test_doctor_pages(self):
+        doctor = Doctor.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        self.assertQueryBudget(reverse("admin:psytracks_doctor_changelist"), 18)
+        self.assertQueryBudget(reverse("admin:psytracks_doctor_add"), 14)
+        self.assertQueryBudget(reverse("admin:psytracks_doctor_change", args=[doctor.pk]), 15)
+
+    def test_psychiatrist_changelist(self):
+        self.assertQueryBudget(reverse("admin:psytracks_psychiatrist_changelist"), 17,
+                               roles=(PSYCHIATRIST, DISTRICT, REGION, SUPERUSER))
+
+
+class KeysetPaginationTests(RoleDataMixin, TestCase):
+    patients_per_neighborhood = 30
+
+    def walk(self, url):
+        self.client.force_login(self.users[SUPERUSER])
+        response = self.client.get(url)
+        pages = [[obj.pk for obj in response.context_data["cl"].result_list]]
+        next_url = response.context_data["cl"].keyset_next_url
+        while next_url:
+            response = self.client.get(reverse("admin:psytracks_patient_changelist") + next_url)
+            pages.append([obj.pk for obj in response.context_data["cl"].result_list])
+            next_url = response.context_data["cl"].keyset_next_url
+        prev_url = response.context_data["cl"].keyset_prev_url
+        pages_back = []
+        while prev_url:
+            response = self.client.get(reverse("admin:psytracks_patient_changelist") + prev_url)
+            pages_back.insert(0, [obj.pk for obj in response.context_data["cl"].result_list])
+            prev_url = response.context_data["cl"].keyset_prev_url
+        return pages, pages_back
+
+    def test_walk_all_pages(self):
+        url = reverse("admin:psytracks_patient_changelist")
+        Patient.objects.filter(pk__in=Patient.objects.order_by("pk").values("pk")[:50]).update(
+            last_psychiatric_appointment_date=datetime.date(2025, 1, 1))
+        for order in ("", "o=-1", "o=2", "o=24", "o=-24"):
+            pages, pages_back = self.walk(f"{url}?{order}&cursor=")
+            ids = [pk for page in pages for pk in page]
+            self.assertEqual(len(pages), 3, order)
+            self.assertEqual(sorted(ids), sorted(Patient.objects.values_list("pk", flat=True)), order)
+            self.assertEqual(pages_back, pages[:-1], order)
+
+
+class SearchKeyTests(RoleDataMixin, TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize_search("Ерматов  Жамшид Ўғли"), normalize_search("Yermatov Jamshid O‘g‘li"))
+        self.assertEqual(normalize_search("Хўжаев"), normalize_search("Hojayev"))
+
+    def test_search_key_maintained(self):
+        patient = Patient.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        patient.full_name = "Тошматов Ғайрат"
+        patient.save(update_fields=["full_name"])
+        self.assertEqual(Patient.objects.get(pk=patient.pk).search_key, "toshmatov gayrat")
+        Patient.objects.filter(pk=patient.pk).update(full_name="Эргашев Алишер")
+        self.assertEqual(Patient.objects.get(pk=patient.pk).search_key, "ergashev alisher")
+
+    def test_migration_backfill(self):
+        migrations = [import_module("psytracks.migrations.0017_search_key"),
+                      import_module("utils.migrations.0011_search_key")]
+        Patient.objects.filter(neighborhood=self.neighborhoods[0]).update(full_name="Тошматов Ғайрат")
+        models = (Patient, Doctor, Psychiatrist, Inspector)
+        for model in models:
+            model.objects.update(search_key="")
+
+        for migration in migrations:
+            with mock.patch.object(migration, "BATCH_SIZE", 5):
+                migration.fill_search_keys(apps, None)
+        for model in models:
+            for obj in model.objects.all():
+                self.assertEqual(obj.search_key, normalize_search(obj.full_name))
+        self.assertEqual(Patient.objects.filter(search_key="toshmatov gayrat").count(), self.patients_per_neighborhood)
+
+        migration = import_module("psytracks.migrations.0018_address_key")
+        Patient.objects.filter(neighborhood=self.neighborhoods[0]).update(address="Навоий кўчаси 12")
+        Patient.objects.update(address_key="")
+        with mock.patch.object(migration, "BATCH_SIZE", 5):
+            migration.fill_address_keys(apps, None)
+        for patient in Patient.objects.all():
+            self.assertEqual(patient.address_key, normalize_search(patient.address))
+        self.assertEqual(Patient.objects.filter(address_key="navoiy kochasi 12").count(), self.patients_per_neighborhood)
+
+    def test_changelist_search(self):
+        patient = Patient.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        patient.full_name = "Тошматов Ғайрат"
+        patient.save()
+        self.client.force_login(self.users[SUPERUSER])
+        response = self.client.get(reverse("admin:psytracks_patient_changelist"), {"q": "g'ayrat toshm"})
+        self.assertEqual([obj.pk for obj in response.context_data["cl"].result_list], [patient.pk])
+
+    def test_fuzzy_search(self):
+        TrigramIndex._indexes.clear()
+        patient = Patient.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        patient.full_name = "Тошматов Ғайрат"
+        patient.address = "Навоий кўчаси 12"
+        patient.save()
+        other = Patient.objects.filter(neighborhood=self.neighborhoods[-1]).first()
+        other.full_name = "Тошматова Гулнора"
+        other.save()
+        url = reverse("admin:psytracks_patient_changelist")
+
+        self.client.force_login(self.users[SUPERUSER])
+        response = self.client.get(url, {"q": "toshmatof gayrat", "fuzzy": ""})
+        self.assertEqual(response.context_data["cl"].result_list[0].pk, patient.pk)
+        response = self.client.get(reverse("admin:patients_search"), {"q": "navoiy kochasi"})
+        self.assertEqual([row["id"] for row in response.json()["results"]], [patient.pk])
+
+        # boshqa tumandagi bemor inspektorga ko'rinmaydi
+        self.client.force_login(self.users[INSPECTOR])
+        response = self.client.get(reverse("admin:patients_search"), {"q": "toshmatova gulnora"})
+        self.assertNotIn(other.pk, [row["id"] for row in response.json()["results"]])
+
+
+class AutocompleteTests(RoleDataMixin, TestCase):
+    def results(self, role, name, **params):
+        self.client.force_login(self.users[role])
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return [int(row["id"]) for row in response.json()["results"]]
+
+    def test_search_and_scope(self):
+        psychiatrist = self.psychiatrists[1]
+        psychiatrist.full_name = "Каримов Бахтиёр"
+        psychiatrist.save()
+        self.assertEqual(self.results(SUPERUSER, "psychiatrist-autocomplete", q="karimov"), [psychiatrist.pk])
+        self.assertEqual(self.results(SUPERUSER, "psychiatrist-autocomplete", q="baht"), [psychiatrist.pk])
+        self.assertEqual(self.results(DISTRICT, "psychiatrist-autocomplete", q="karimov"), [])
+
+        neighborhood = self.neighborhoods[0]
+        forward = '{"neighborhood": "%s"}' % neighborhood.pk
+        self.assertEqual(self.results(SUPERUSER, "psychiatrist-autocomplete", forward=forward), [self.psychiatrists[0].pk])
+        self.assertEqual(self.results(SUPERUSER, "inspector-autocomplete", forward=forward), [neighborhood.inspector.pk])
+        self.assertEqual(len(self.results(DISTRICT, "inspector-autocomplete", q="inspektor")), self.neighborhoods_per_district)
+
+    def test_cached(self):
+        self.results(SUPERUSER, "inspector-autocomplete", q="insp")
+        with CaptureQueriesContext(connection) as ctx:
+            self.results(SUPERUSER, "inspector-autocomplete", q="insp")
+        self.assertFalse([query for query in ctx.captured_queries if "utils_inspector" in query["sql"]])
+
+    def test_anonymous(self):
+        response = self.client.get(reverse("inspector-autocomplete"), {"q": "insp"})
+        self.assertEqual(response.status_code, 403)
+
+
+class FilterLookupsTests(RoleDataMixin, TestCase):
+    filters = (DistrictFilter, NeighborhoodFilter, PsychiatristFilter, InspectorFilter)
+
+    def sidebar(self, role, query=""):
+        self.client.force_login(self.users[role])
+        return self.get_sidebar(query)
+
+    def get_sidebar(self, query=""):
+        response = self.client.get(reverse("admin:psytracks_patient_changelist") + query)
+        self.assertEqual(response.status_code, 200)
+        return {spec.parameter_name: set(spec.lookup_choices) for spec in response.context_data["cl"].filter_specs
+                if isinstance(spec, self.filters)}
+
+    def old_lookups(self, role):
+        """
+        Eski hisob: foydalanuvchi ko'radigan bemorlarga biriktirilgan yozuvlar, keshsiz.
+        """
+        patients = Patient.objects.filter(get_principal(self.users[role]).patient_q())
+        neighborhoods = Neighborhood.objects.filter(pk__in=patients.values("neighborhood_id"))
+        return {
+            "district": set(District.objects.filter(pk__in=patients.values("district_id")).values_list("id", "name")),
+            "neighborhood": {(n.pk, f"{n.name} ({n.district.name})") for n in neighborhoods.select_related("district")},
+            "psychiatrist": set(Psychiatrist.objects.filter(pk__in=patients.values("psychiatrist_id"))
+                                .values_list("id", "full_name")),
+            "inspector": set(Inspector.objects.filter(pk__in=patients.values("inspector_id"))
+                             .values_list("id", "full_name")),
+        }
+
+    def test_lookups_match_scope(self):
+        for role in self.users:
+            with self.subTest(role):
+                self.assertEqual(self.sidebar(role), self.old_lookups(role))
+
+    def forbid_lookups(self, *filters):
+        for spec in filters:
+            patcher = mock.patch.object(spec, "get_lookups", side_effect=AssertionError(spec.__name__))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_paging_and_sorting_without_lookup_queries(self):
+        self.sidebar(DISTRICT)
+        self.forbid_lookups(*self.filters)
+        for query in ("?o=2", "?o=-3", f"?o=2&district={self.districts[0].pk}"):
+            # sessiya, foydalanuvchi, ikkita ruxsatlar so'rovi, son, sahifa qatorlari, eksport profillari, facet'lar
+            with self.subTest(query), self.assertNumQueries(8):
+                self.get_sidebar(query)
+
+    def test_doctor_and_psychiatrist_lookups_cached(self):
+        self.client.force_login(self.users[DISTRICT])
+        urls = [reverse("admin:psytracks_doctor_changelist"), reverse("admin:psytracks_psychiatrist_changelist")]
+        first = [self.client.get(url).context_data["cl"] for url in urls]
+        self.forbid_lookups(DistrictDoctorFilter, NeighborhoodDoctorFilter, DistrictPsychiatristFilter)
+        for url, cl in zip(urls, first):
+            response = self.client.get(f"{url}?o=-1")
+            self.assertEqual([spec.lookup_choices for spec in response.context_data["cl"].filter_specs],
+                             [spec.lookup_choices for spec in cl.filter_specs])
+        self.assertEqual({pk for pk, _ in first[0].filter_specs[0].lookup_choices},
+                         {n.pk for n in self.neighborhoods if n.district_id == self.districts[0].pk})
+
+    def test_invalidated_on_reassignment(self):
+        self.sidebar(DISTRICT)
+        psychiatrist = Psychiatrist.objects.create(full_name="Yangi psixiatr", district=self.districts[0],
+                                                   user=self.create_user("new-psychiatrist"))
+        patient = Patient.objects.filter(district=self.districts[0]).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.psychiatrist = psychiatrist
+            patient.save()
+        self.assertIn((psychiatrist.pk, psychiatrist.full_name), self.sidebar(DISTRICT)["psychiatrist"])
+        self.assertEqual(self.sidebar(DISTRICT), self.old_lookups(DISTRICT))
+
+
+class FacetTests(RoleDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        vary_patients(timezone.now().date())
+
+    def test_counts_respect_other_filters(self):
+        district = self.districts[0]
+        self.client.force_login(self.users[REGION])
+        url = reverse("admin:psytracks_patient_changelist")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"district": district.pk, "is_aggressive__exact": "1"})
+        self.assertEqual(len([query for query in ctx.captured_queries if 'AS "facet"' in query["sql"]]), 1)
+        self.assertEqual(len(ctx.captured_queries), 8)
+
+        cl = response.context_data["cl"]
+        facets = {getattr(spec, "parameter_name", None) or spec.field_path: cl.get_facets(spec)
+                  for spec in cl.filter_specs}
+        today = timezone.now().date()
+        aggressive = Patient.objects.filter(is_aggressive=True)
+        in_district = Patient.objects.filter(district=district)
+        # eski usul: har bir variant uchun alohida COUNT, qolgan faol filtrlar bilan
+        expected = {
+            "district": {str(d.pk): aggressive.filter(district=d).count() for d in self.districts},
+            "neighborhood": {str(n.pk): aggressive.filter(neighborhood=n).count()
+                             for n in self.neighborhoods if n.district_id == district.pk},
+            "is_aggressive": {"true": in_district.filter(is_aggressive=True).count(),
+                              "false": in_district.filter(is_aggressive=False).count()},
+            "is_convicted": {"true": in_district.filter(is_aggressive=True, is_convicted=True).count(),
+                             "false": in_district.filter(is_aggressive=True, is_convicted=False).count()},
+            "is_overdue": {"yes": in_district.filter(overdue_q(today), is_aggressive=True).count(),
+                           "no": in_district.filter(on_time_q(today), is_aggressive=True).count()},
+        }
+        for name, counts in expected.items():
+            self.assertEqual({key: value for key, value in facets[name].items() if value},
+                             {key: value for key, value in counts.items() if value}, name)
+        self.assertEqual(sum(facets["district"].values()), aggressive.count())
+
+        # qidiruv natijasi ham hisobga olinadi
+        patient = Patient.objects.filter(district=district).first()
+        cl = self.client.get(url, {"q": patient.full_name}).context_data["cl"]
+        self.assertEqual(cl.get_facets(cl.filter_specs[0]), {str(district.pk): len(cl.result_list)})
+
+
+class ComplianceDatesTests(RoleDataMixin, TestCase):
+    today = datetime.date(2026, 5, 10)
+
+    def assertDates(self, patient, is_hospitalized, last_date, deadline):
+        values = Patient.objects.filter(pk=patient.pk).values_list(*COMPLIANCE_FIELDS).get()
+        self.assertEqual(values, (is_hospitalized, last_date, deadline))
+
+    def patient(self):
+        return Patient.objects.filter(neighborhood=self.neighborhoods[0]).first()
+
+    def test_save(self):
+        patient = self.patient()
+        patient.last_psychiatric_appointment_date = self.today
+        patient.last_home_visit_by_doctor_date = self.today - datetime.timedelta(days=3)
+        patient.save()
+        self.assertDates(patient, False, self.today, self.today + datetime.timedelta(days=30))
+        patient.last_hospitalization_from = self.today
+        patient.save()
+        self.assertDates(patient, True, None, HOSPITALIZED_DEADLINE)
+
+    def test_queryset_update(self):
+        patient = self.patient()
+        Patient.objects.filter(pk=patient.pk).update(last_home_visit_by_doctor_date=self.today,
+                                                      max_examination_interval=10)
+        self.assertDates(patient, False, self.today, self.today + datetime.timedelta(days=10))
+        Patient.objects.filter(pk=patient.pk).update(last_home_visit_by_doctor_date=None)
+        self.assertDates(patient, False, None, None)
+
+    def test_update_refreshes_in_chunks(self):
+        patients = Patient.objects.exclude(neighborhood=self.neighborhoods[0])
+        expected = patients.count()
+        with mock.patch("psytracks.models.REFRESH_CHUNK_SIZE", 5), CaptureQueriesContext(connection) as ctx:
+            # filtr ustuni o'zgaradi: qayta hisoblash dastlabki pk'lar bo'yicha
+            rows = patients.filter(last_home_visit_by_doctor_date=None).update(last_home_visit_by_doctor_date=self.today)
+        self.assertEqual(rows, expected)
+        self.assertEqual(Patient.objects.filter(deadline=self.today + datetime.timedelta(days=30)).count(), expected)
+        in_lists = [len(re.search(r" IN \(([^)]*)\)", query["sql"]).group(1).split(","))
+                    for query in ctx.captured_queries if query["sql"].startswith("SELECT") and " IN (" in query["sql"]]
+        self.assertEqual(len(in_lists), -(-expected // 5))
+        self.assertLessEqual(max(in_lists), 5)
+
+    def test_deadline_ordering(self):
+        seen, hospitalized, never_seen = Patient.objects.filter(neighborhood=self.neighborhoods[0])[:3]
+        Patient.objects.filter(pk=seen.pk).update(last_psychiatric_appointment_date=self.today)
+        Patient.objects.filter(pk=hospitalized.pk).update(last_hospitalization_from=self.today)
+        Patient.objects.filter(pk=never_seen.pk).update(last_psychiatric_appointment_date=None,
+                                                         last_home_visit_by_doctor_date=None)
+        order = list(Patient.objects.filter(pk__in=[seen.pk, hospitalized.pk, never_seen.pk])
+                     .order_by(F("deadline").asc(nulls_first=True)).values_list("pk", flat=True))
+        # shifoxonadagilar muddati bor bemorlardan keyin, hech ko'rilmaganlar (NULL) bilan aralashmaydi
+        self.assertEqual(order, [never_seen.pk, seen.pk, hospitalized.pk])
+        self.assertEqual(Patient.objects.get(pk=hospitalized.pk).get_deadline(self.today),
+                         self.today + datetime.timedelta(days=30))
+
+    def test_bulk_create(self):
+        source = self.patient()
+        patient, = Patient.objects.bulk_create([Patient(
+            full_name="Yangi bemor", pinfl="99999999999999", neighborhood=source.neighborhood,
+            inspector=source.inspector, psychiatrist=source.psychiatrist,
+            last_hospitalization_from=self.today - datetime.timedelta(days=20),
+            last_hospitalization_to=self.today - datetime.timedelta(days=5),
+        )])
+        self.assertDates(patient, False, self.today - datetime.timedelta(days=5),
+                         self.today + datetime.timedelta(days=25))
+
+    def test_bulk_update(self):
+        patients = list(Patient.objects.filter(neighborhood=self.neighborhoods[0]))
+        for patient in patients:
+            patient.last_hospitalization_from = self.today
+        Patient.objects.bulk_update(patients, ["last_hospitalization_from"])
+        for patient in patients:
+            self.assertDates(patient, True, None, HOSPITALIZED_DEADLINE)
+
+    def test_overdue_and_on_time(self):
+        cases = {
+            "hospitalized": (dict(last_hospitalization_from=self.today), False),
+            "no dates": ({}, True),
+            "deadline passed": (dict(last_psychiatric_appointment_date=self.today - datetime.timedelta(days=31)), True),
+            "deadline today": (dict(last_psychiatric_appointment_date=self.today - datetime.timedelta(days=30)), False),
+        }
+        patients = Patient.objects.filter(neighborhood=self.neighborhoods[0])[:len(cases)]
+        for patient, (name, (values, overdue)) in zip(patients, cases.items()):
+            Patient.objects.filter(pk=patient.pk).update(**values)
+            with self.subTest(name):
+                self.assertEqual(Patient.objects.filter(overdue_q(self.today), pk=patient.pk).exists(), overdue)
+                self.assertEqual(Patient.objects.filter(on_time_q(self.today), pk=patient.pk).exists(), not overdue)
+
+    def test_migration_backfill(self):
+        migration = import_module("psytracks.migrations.0015_patient_compliance_dates")
+        patients = list(Patient.objects.order_by("pk"))
+        for i, patient in enumerate(patients):
+            patient.last_psychiatric_appointment_date = self.today - datetime.timedelta(days=i)
+            patient.last_hospitalization_from = self.today if i % 5 == 0 else None
+        Patient.objects.bulk_update(patients, ["last_psychiatric_appointment_date", "last_hospitalization_from"])
+        Patient.objects.update(is_hospitalized=False, last_date=None, deadline=None)
+
+        with mock.patch.object(migration, "BATCH_SIZE", 5):
+            migration.fill_compliance_dates(apps, None)
+        import_module("psytracks.migrations.0022_hospitalized_deadline").set_hospitalized_deadline(apps, None)
+        for patient in Patient.objects.all():
+            self.assertEqual(tuple(getattr(patient, field) for field in COMPLIANCE_FIELDS),
+                             get_compliance_dates(patient))
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite specific")
+class PatientIndexTests(RoleDataMixin, TestCase):
+    def index_name(self, *fields):
+        return next(index.name for index in Patient._meta.indexes if index.fields == list(fields) and not index.condition)
+
+    def assertUsesIndex(self, queryset, name):
+        self.assertRegex(queryset.explain(), rf"USING (COVERING )?INDEX {name}\b")
+
+    def test_indexes_used(self):
+        today = datetime.date.today()
+        patient = Patient.objects.first()
+        scoped = Patient.objects.filter(neighborhood__in=[n.pk for n in self.neighborhoods[:2]])
+        cases = [
+            (scoped.order_by("deadline", "pk")[:100], "patient_scope_deadline_idx"),
+            (Patient.objects.filter(overdue_q(today), neighborhood=patient.neighborhood_id), "patient_scope_deadline_idx"),
+            (scoped.filter(is_aggressive=True).order_by("deadline", "pk"), "patient_aggressive_idx"),
+            (scoped.filter(is_convicted=True), "patient_convicted_idx"),
+            (scoped.filter(is_abroad_long_term=True), "patient_abroad_idx"),
+            (Patient.objects.filter(inspector=patient.inspector_id).order_by("deadline", "pk"),
+             self.index_name("inspector", "deadline")),
+            (Patient.objects.filter(psychiatrist=patient.psychiatrist_id).order_by("deadline", "pk"),
+             self.index_name("psychiatrist", "deadline")),
+            (Patient.objects.order_by("-last_home_visit_by_doctor_date", "-pk")[:100],
+             self.index_name("last_home_visit_by_doctor_date", "id")),
+            (Patient.objects.filter(full_name__gt="M").order_by("full_name", "pk")[:100],
+             self.index_name("full_name", "id")),
+        ]
+        for queryset, name in cases:
+            with self.subTest(name):
+                self.assertUsesIndex(queryset, name)
+
+    def test_compare_drops_every_index(self):
+        with connection.cursor() as cursor:
+            names = get_index_names(cursor)
+        self.assertLessEqual({index.name for index in Patient._meta.indexes}, set(names))
+        # db_index=True va tashqi kalit ustunlari ham
+        self.assertTrue(any("pinfl" in name for name in names))
+        self.assertTrue(any("neighborhood_id" in name for name in names))
 
-# Create your tests here.
+        stdout = io.StringIO()
+        call_command("explain_patient_queries", compare=True, stdout=stdout)
+        without, with_indexes = stdout.getvalue().split("(with indexes)", 1)
+        self.assertNotRegex(without, r"USING (COVERING )?INDEX")
+        self.assertRegex(with_indexes, r"USING (COVERING )?INDEX")
+        with connection.cursor() as cursor:
+            self.assertEqual(get_index_names(cursor), names)
@@ -1,33 +1,90 @@
+import hashlib
+import json
+
 from dal import autocomplete
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.http import HttpResponse
 
-from utils.models import Inspector, Neighborhood
+from utils.filters import get_version
+from utils.models import Inspector
+from utils.search import normalize_search
 from .models import Psychiatrist
 
+AUTOCOMPLETE_CACHE_TIMEOUT = 60
+
+
+class SearchKeyAutocomplete(autocomplete.Select2QuerySetView):
+    """
+    search_key prefiksi bo'yicha autocomplete: so'rov ismning boshidan yoki istalgan so'z boshidan qidiriladi,
+    ko'rish doirasi foydalanuvchi roli bo'yicha cheklanadi.
+    Javob (doira, forward, so'rov, sahifa) bo'yicha qisqa muddat keshlanadi, kesh versiyasi
+    inspektor/psixiatr o'zgarganda yangilanadi (utils.filters).
+    """
+    model = None
+    paginate_by = 20
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated or not request.user.is_staff:
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_forwarded_id(self, name):
+        value = str(self.forwarded.get(name) or "")
+        return int(value) if value.isdigit() else None
+
+    def filter_forwarded(self, queryset):
+        return queryset
 
-class PsychiatristAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        qs = Psychiatrist.objects.all()
-        neighborhood_id = self.forwarded.get('neighborhood', None)
-        neighborhood = Neighborhood.objects.filter(id=neighborhood_id).first()
-        district_id = self.forwarded.get('district', None)
-        if neighborhood:
-            qs = qs.filter(district_id=neighborhood.district_id)
+        queryset = self.model.objects.filter(self.request.principal.hierarchy_q()).only("pk", "full_name")
+        queryset = self.filter_forwarded(queryset)
+        query = normalize_search(self.q)
+        if not query:
+            return queryset.order_by("search_key", "pk")
+        # ism boshidan mos kelganlari birinchi
+        return queryset.filter(Q(search_key__startswith=query) | Q(search_key__contains=f" {query}")).annotate(
+            prefix_match=Case(When(search_key__startswith=query, then=Value(0)), default=Value(1), output_field=IntegerField())
+        ).order_by("prefix_match", "search_key", "pk")
+
+    def get_cache_key(self):
+        payload = json.dumps([self.forwarded, normalize_search(self.q), self.request.GET.get(self.page_kwarg)],
+                             sort_keys=True, default=str)
+        return (f"autocomplete:{get_version()}:{self.model._meta.label_lower}:{self.request.principal.scope_key}:"
+                f"{hashlib.md5(payload.encode()).hexdigest()}")
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_cache_key()
+        content = cache.get(key)
+        if content is None:
+            response = super().get(request, *args, **kwargs)
+            cache.set(key, response.content, AUTOCOMPLETE_CACHE_TIMEOUT)
+            return response
+        return HttpResponse(content, content_type="application/json")
+
+
+class PsychiatristAutocomplete(SearchKeyAutocomplete):
+    model = Psychiatrist
+
+    def filter_forwarded(self, queryset):
+        neighborhood_id = self.get_forwarded_id("neighborhood")
+        district_id = self.get_forwarded_id("district")
+        if neighborhood_id:
+            queryset = queryset.filter(district__neighborhoods=neighborhood_id)
         if district_id:
-            qs = qs.filter(district_id=district_id)
-        if self.q:
-            qs = qs.filter(name__icontains=self.q)
-        return qs
+            queryset = queryset.filter(district_id=district_id)
+        return queryset
 
 
-class InspectorAutocomplete(autocomplete.Select2QuerySetView):
-    def get_queryset(self):
-        qs = Inspector.objects.all()
-        neighborhood_id = self.forwarded.get('neighborhood', None)
-        district_id = self.forwarded.get('district', None)
+class InspectorAutocomplete(SearchKeyAutocomplete):
+    model = Inspector
+
+    def filter_forwarded(self, queryset):
+        neighborhood_id = self.get_forwarded_id("neighborhood")
+        district_id = self.get_forwarded_id("district")
         if neighborhood_id:
-            qs = qs.filter(neighborhood_id=neighborhood_id)
+            queryset = queryset.filter(neighborhood_id=neighborhood_id)
         if district_id:
-            qs = qs.filter(neighborhood__district_id=district_id)
-        if self.q:
-            qs = qs.filter(name__icontains=self.q)
-        return qs
\ No newline at end of file
+            queryset = queryset.filter(district_id=district_id)
+        return queryset
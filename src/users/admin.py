@@ -44,9 +44,13 @@ class CustomGroupAdmin(admin.ModelAdmin):
 @admin.register(RegionAdmin)
 class RegionAdminAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "region")
+    list_select_related = ("user", "region")
+    autocomplete_fields = ("region",)
 
 
 @admin.register(DistrictAdmin)
 class DistrictAdminAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "district")
+    list_select_related = ("user", "district")
+    autocomplete_fields = ("district",)
 
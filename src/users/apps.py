@@ -1,4 +1,5 @@
 from django.apps import AppConfig, apps
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.utils.translation import gettext_lazy as _
 
 
@@ -12,3 +13,11 @@ class UsersConfig(AppConfig):
         from django.contrib.auth.models import Group
         Group._meta.verbose_name = _("Group")
         Group._meta.verbose_name_plural = _("Groups")
+
+        from .signals import principal_links_changed, groups_changed
+        # rol va ko'rish doirasini belgilaydigan bog'lanishlar o'zgarsa, keshdagi principal'lar eskiradi
+        for model in ("users.DistrictAdmin", "users.RegionAdmin", "utils.Inspector", "utils.Neighborhood",
+                      "utils.District", "psytracks.Psychiatrist"):
+            post_save.connect(principal_links_changed, sender=apps.get_model(model))
+            post_delete.connect(principal_links_changed, sender=apps.get_model(model))
+        m2m_changed.connect(groups_changed, sender=apps.get_model("users.User").groups.through)
@@ -0,0 +1,17 @@
+from django.utils.functional import SimpleLazyObject
+
+from users.principal import get_principal
+
+
+class PrincipalMiddleware:
+    """
+    request.principal - foydalanuvchi roli va ko'rish doirasi; birinchi murojaatda hisoblanadi.
+    AuthenticationMiddleware'dan keyin turishi kerak.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principal = SimpleLazyObject(lambda: get_principal(request.user))
+        return self.get_response(request)
@@ -0,0 +1,187 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+INSPECTOR = "inspector"
+NEIGHBORHOOD = "neighborhood"
+PSYCHIATRIST = "psychiatrist"
+DISTRICT = "district"
+REGION = "region"
+
+DASHBOARD_GROUPS = ("Админ", "Бошлиқ", "Туман админи", "Вилоят админи")
+ADMIN_ROLES = (DISTRICT, REGION)
+
+VERSION_CACHE_KEY = "principal:version"
+CACHE_TIMEOUT = 60 * 60
+
+
+class Principal:
+    """
+    Foydalanuvchining roli va ko'rish doirasi. Har bir so'rovda bir marta aniqlanadi (PrincipalMiddleware),
+    natija umumiy keshda saqlanadi.
+    """
+    def __init__(self, user_id=None, role=None, is_superuser=False, groups=(), inspector_id=None,
+                 psychiatrist_id=None, neighborhood_id=None, district_id=None, region_id=None, neighborhood_ids=None):
+        self.user_id = user_id
+        self.role = role
+        self.is_superuser = is_superuser
+        self.groups = frozenset(groups)
+        self.inspector_id = inspector_id
+        self.psychiatrist_id = psychiatrist_id
+        self.neighborhood_id = neighborhood_id
+        self.district_id = district_id
+        self.region_id = region_id
+        # None - cheklov yo'q (butun respublika)
+        self.neighborhood_ids = frozenset(neighborhood_ids) if neighborhood_ids is not None else None
+
+    def __repr__(self):
+        return f"<Principal user={self.user_id} role={self.role}>"
+
+    @property
+    def scope(self):
+        return self.role or "global"
+
+    @property
+    def scope_key(self):
+        # bir xil ko'rish doirasidagi foydalanuvchilar uchun bir xil kalit (keshlar uchun)
+        scope_id = self.inspector_id or self.psychiatrist_id or self.neighborhood_id or self.district_id or self.region_id
+        return f"{self.scope}:{scope_id or ''}"
+
+    @property
+    def can_view_dashboard(self):
+        return self.is_superuser or bool(self.groups & set(DASHBOARD_GROUPS))
+
+    def region_q(self, prefix="", roles=ADMIN_ROLES):
+        """
+        prefix - modeldan Region'gacha yo'l ("" - Region o'zi, "district__region__", ...).
+        """
+        if self.role not in roles:
+            return Q()
+        return Q(**{f"{prefix}id": self.region_id})
+
+    def district_q(self, prefix="", roles=ADMIN_ROLES):
+        """
+        prefix - modeldan District'gacha yo'l ("" - District o'zi, "neighborhood__district__", ...).
+        Faqat roles ichidagi rollar uchun cheklaydi.
+        """
+        if self.role not in roles:
+            return Q()
+        if self.role == REGION:
+            return Q(**{f"{prefix}region_id": self.region_id})
+        return Q(**{f"{prefix}id": self.district_id})
+
+    def hierarchy_q(self, prefix="", roles=ADMIN_ROLES):
+        """
+        district/region ustunlari nusxalangan modellar uchun (Patient, Doctor, Inspector, Psychiatrist) - JOIN'siz.
+        prefix - shu modelgacha yo'l.
+        """
+        if self.role not in roles:
+            return Q()
+        if self.role == REGION:
+            return Q(**{f"{prefix}region_id": self.region_id})
+        return Q(**{f"{prefix}district_id": self.district_id})
+
+    def member_q(self, prefix="", roles=(INSPECTOR, NEIGHBORHOOD) + ADMIN_ROLES):
+        """
+        area_q ning Patient, Doctor va Inspector uchun JOIN'siz varianti.
+        """
+        if self.role not in roles:
+            return Q()
+        if self.role in (INSPECTOR, NEIGHBORHOOD):
+            return Q(**{f"{prefix}neighborhood_id": self.neighborhood_id})
+        return self.hierarchy_q(prefix, roles)
+
+    def area_q(self, prefix="", roles=(INSPECTOR, NEIGHBORHOOD) + ADMIN_ROLES):
+        """
+        prefix - modeldan Neighborhood'gacha yo'l ("" - Neighborhood o'zi, "neighborhood__", ...).
+        """
+        if self.role not in roles:
+            return Q()
+        if self.role in (INSPECTOR, NEIGHBORHOOD):
+            return Q(**{f"{prefix}id": self.neighborhood_id})
+        return self.district_q(f"{prefix}district__", roles)
+
+    def patient_q(self, prefix=""):
+        if self.role == INSPECTOR:
+            return Q(**{f"{prefix}inspector_id": self.inspector_id})
+        if self.role == PSYCHIATRIST:
+            return Q(**{f"{prefix}psychiatrist_id": self.psychiatrist_id})
+        return self.member_q(prefix)
+
+
+ANONYMOUS = Principal()
+
+
+def resolve_principal(user):
+    from psytracks.models import Psychiatrist
+    from users.models import DistrictAdmin, RegionAdmin
+    from utils.models import Inspector, Neighborhood
+
+    data = {
+        "user_id": user.pk,
+        "groups": list(user.groups.values_list("name", flat=True)),
+    }
+    inspector = Inspector.objects.filter(user=user).values(
+        "id", "neighborhood_id", "neighborhood__district_id", "neighborhood__district__region_id"
+    ).first()
+    neighborhood = None if inspector else Neighborhood.objects.filter(user=user).values(
+        "id", "district_id", "district__region_id"
+    ).first()
+    psychiatrist = None if inspector or neighborhood else Psychiatrist.objects.filter(user=user).values(
+        "id", "district_id", "district__region_id"
+    ).first()
+
+    if inspector:
+        data.update(role=INSPECTOR, inspector_id=inspector["id"], neighborhood_id=inspector["neighborhood_id"],
+                    district_id=inspector["neighborhood__district_id"],
+                    region_id=inspector["neighborhood__district__region_id"],
+                    neighborhood_ids=[inspector["neighborhood_id"]])
+    elif neighborhood:
+        data.update(role=NEIGHBORHOOD, neighborhood_id=neighborhood["id"], district_id=neighborhood["district_id"],
+                    region_id=neighborhood["district__region_id"], neighborhood_ids=[neighborhood["id"]])
+    elif psychiatrist:
+        data.update(role=PSYCHIATRIST, psychiatrist_id=psychiatrist["id"], district_id=psychiatrist["district_id"],
+                    region_id=psychiatrist["district__region_id"],
+                    neighborhood_ids=Neighborhood.objects.filter(district_id=psychiatrist["district_id"])
+                    .values_list("id", flat=True))
+    else:
+        district = DistrictAdmin.objects.filter(user=user).values("district_id", "district__region_id").first()
+        region = None if district else RegionAdmin.objects.filter(user=user).values("region_id").first()
+        if district:
+            data.update(role=DISTRICT, district_id=district["district_id"], region_id=district["district__region_id"],
+                        neighborhood_ids=Neighborhood.objects.filter(district_id=district["district_id"])
+                        .values_list("id", flat=True))
+        elif region:
+            data.update(role=REGION, region_id=region["region_id"],
+                        neighborhood_ids=Neighborhood.objects.filter(district__region_id=region["region_id"])
+                        .values_list("id", flat=True))
+    if data.get("neighborhood_ids") is not None:
+        data["neighborhood_ids"] = list(data["neighborhood_ids"])
+    return data
+
+
+def get_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def invalidate_principals():
+    # bog'lanishlar kam o'zgaradi, shuning uchun barcha foydalanuvchilar keshi birdaniga eskiradi
+    transaction.on_commit(lambda: cache.set(VERSION_CACHE_KEY, time.time_ns(), None))
+
+
+def get_principal(user):
+    if not user.is_authenticated:
+        return ANONYMOUS
+    key = f"principal:{get_version()}:{user.pk}"
+    data = cache.get(key)
+    if data is None:
+        data = resolve_principal(user)
+        cache.set(key, data, CACHE_TIMEOUT)
+    # is_superuser keshlanmaydi: u so'rovdagi user obyektida allaqachon bor
+    return Principal(**data, is_superuser=user.is_superuser)
@@ -0,0 +1,10 @@
+from users.principal import invalidate_principals
+
+
+def principal_links_changed(sender, **kwargs):
+    invalidate_principals()
+
+
+def groups_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_principals()
@@ -1,3 +1,294 @@
+import datetime
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from psytracks.models import Doctor, Patient, Psychiatrist
+from users.models import User, DistrictAdmin, RegionAdmin
+from users.principal import INSPECTOR, NEIGHBORHOOD, PSYCHIATRIST, DISTRICT, REGION, get_principal
+from utils.models import Region, District, Neighborhood, Inspector
+from utils.stats import PATIENT_COUNTERS, get_district_stats, get_neighborhood_stats
+
+SUPERUSER = "superuser"
+ROLES = (INSPECTOR, NEIGHBORHOOD, PSYCHIATRIST, DISTRICT, REGION, SUPERUSER)
+
+
+def vary_patients(today):
+    """
+    Bemorlarga har xil holat beradi: shifoxonada, o'z vaqtida, muddati o'tgan, sanasiz, tajovuzkor va h.k.
+    """
+    days = datetime.timedelta
+    patterns = [
+        dict(last_hospitalization_from=today - days(3)),
+        dict(last_psychiatric_appointment_date=today - days(10)),
+        dict(last_home_visit_by_doctor_date=today - days(40)),
+        dict(),
+        dict(last_hospitalization_from=today - days(20), last_hospitalization_to=today - days(5)),
+        dict(last_psychiatric_appointment_date=today - days(31), max_examination_interval=60),
+        dict(last_psychiatric_appointment_date=today - days(30)),
+    ]
+    fields = {field for pattern in patterns for field in pattern}
+    patients = list(Patient.objects.order_by("pk"))
+    for i, patient in enumerate(patients):
+        for field in fields:
+            setattr(patient, field, 30 if field == "max_examination_interval" else None)
+        for field, value in patterns[i % len(patterns)].items():
+            setattr(patient, field, value)
+        patient.is_aggressive = i % 4 == 0
+        patient.is_convicted = i % 3 == 0
+        patient.is_abroad_long_term = i % 5 == 0
+    Patient.objects.bulk_update(patients, [*fields, "is_aggressive", "is_convicted", "is_abroad_long_term"])
+
+
+def old_patient_counts(patients, key, today):
+    """
+    Hisoblagichlarning eski usuldagi hisobi, har bir bemor Python'da alohida tekshiriladi:
+    shifoxonadagi bemorning oxirgi sanasi bugun, sanasi yo'q yoki muddati o'tgan bemor - kechikkan.
+    """
+    counts = {}
+    for patient in patients:
+        hospitalization_from, hospitalization_to = patient.last_hospitalization_from, patient.last_hospitalization_to
+        if hospitalization_from and (not hospitalization_to or hospitalization_from > hospitalization_to):
+            last_date = today
+        else:
+            dates = [d for d in (hospitalization_to, patient.last_psychiatric_appointment_date,
+                                 patient.last_home_visit_by_doctor_date) if d]
+            last_date = max(dates) if dates else None
+        late = last_date is None or last_date + datetime.timedelta(days=patient.max_examination_interval) < today
+        row = counts.setdefault(getattr(patient, key), dict.fromkeys(PATIENT_COUNTERS, 0))
+        row["total_patients"] += 1
+        row["total_aggressive_patients"] += patient.is_aggressive
+        row["total_convicted_patients"] += patient.is_convicted
+        row["total_abroad_long_term_patients"] += patient.is_abroad_long_term
+        row["late_count" if late else "on_time_count"] += 1
+        if patient.is_aggressive:
+            row["aggressive_late_count" if late else "aggressive_on_time_count"] += 1
+    return counts
+
+
+class RoleDataMixin:
+    """
+    Bir viloyat, ikki tuman, mahallalar, bemorlar va har bir rol uchun bittadan foydalanuvchi.
+    """
+    neighborhoods_per_district = 4
+    patients_per_neighborhood = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(name="Туман админи")
+        cls.group.permissions.set(Permission.objects.filter(content_type__app_label__in=("psytracks", "utils", "users")))
+        cls.region = Region.objects.create(name="Viloyat")
+        cls.districts = [District.objects.create(name=f"Tuman {i}", region=cls.region) for i in range(2)]
+        cls.neighborhoods = []
+        cls.psychiatrists = []
+        for district in cls.districts:
+            cls.psychiatrists.append(Psychiatrist.objects.create(
+                full_name=f"Psixiatr {district.pk}", district=district, user=cls.create_user(f"psychiatrist{district.pk}")
+            ))
+            for i in range(cls.neighborhoods_per_district):
+                neighborhood = Neighborhood.objects.create(name=f"Mahalla {district.pk}-{i}", district=district)
+                Inspector.objects.create(full_name=f"Inspektor {neighborhood.pk}", neighborhood=neighborhood,
+                                         user=cls.create_user(f"inspector{neighborhood.pk}"))
+                Doctor.objects.create(full_name=f"Shifokor {neighborhood.pk}", neighborhood=neighborhood)
+                cls.neighborhoods.append(neighborhood)
+        cls.add_patients(cls.patients_per_neighborhood)
+
+        district = cls.districts[0]
+        neighborhood = cls.neighborhoods[0]
+        neighborhood.user = cls.create_user("neighborhood")
+        neighborhood.save()
+        cls.users = {
+            INSPECTOR: cls.neighborhoods[0].inspector.user,
+            NEIGHBORHOOD: neighborhood.user,
+            PSYCHIATRIST: cls.psychiatrists[0].user,
+            DISTRICT: DistrictAdmin.objects.create(district=district, user=cls.create_user("district")).user,
+            REGION: RegionAdmin.objects.create(region=cls.region, user=cls.create_user("region")).user,
+            SUPERUSER: User.objects.create_superuser("admin", password="admin"),
+        }
+
+    @classmethod
+    def create_user(cls, username):
+        user = User.objects.create_user(username, password=username, is_staff=True)
+        user.groups.add(cls.group)
+        return user
+
+    @classmethod
+    def add_patients(cls, count):
+        patients = []
+        for neighborhood in Neighborhood.objects.select_related("inspector"):
+            psychiatrist = next(p for p in cls.psychiatrists if p.district_id == neighborhood.district_id)
+            start = Patient.objects.filter(neighborhood=neighborhood).count()
+            patients += [
+                Patient(full_name=f"Bemor {neighborhood.pk}-{i}", pinfl=f"{neighborhood.pk:07d}{i:07d}",
+                        neighborhood=neighborhood, inspector=neighborhood.inspector, psychiatrist=psychiatrist)
+                for i in range(start, start + count)
+            ]
+        Patient.objects.bulk_create(patients)
+
+    def setUp(self):
+        # keshlar versiyasi on_commit'da yangilanadi, test tranzaksiyasida esa u chaqirilmaydi
+        cache.clear()
+
+    def count_queries(self, role, url):
+        cache.clear()
+        self.client.force_login(self.users[role])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, f"{role} {url}")
+        return len(ctx.captured_queries)
+
+    def assertQueryBudget(self, url, budget, roles=ROLES):
+        """
+        Sahifa har bir rol uchun budget'dan ko'p so'rov yubormasligi va bemorlar ko'payganda
+        so'rovlar soni oshmasligi kerak.
+        """
+        counts = {role: self.count_queries(role, url) for role in roles}
+        for role, count in counts.items():
+            self.assertLessEqual(count, budget, f"{role} {url}: {count} queries")
+        self.add_patients(self.patients_per_neighborhood)
+        for role, count in counts.items():
+            self.assertLessEqual(self.count_queries(role, url), count, f"{role} {url}: depends on the number of rows")
+
+
+class PrincipalTests(RoleDataMixin, TestCase):
+    def test_roles(self):
+        for role, user in self.users.items():
+            principal = get_principal(user)
+            self.assertEqual(principal.scope, "global" if role == SUPERUSER else role)
+
+    def test_patient_scope(self):
+        expected = {
+            INSPECTOR: self.patients_per_neighborhood,
+            NEIGHBORHOOD: self.patients_per_neighborhood,
+            PSYCHIATRIST: self.patients_per_neighborhood * self.neighborhoods_per_district,
+            DISTRICT: self.patients_per_neighborhood * self.neighborhoods_per_district,
+            REGION: Patient.objects.count(),
+            SUPERUSER: Patient.objects.count(),
+        }
+        for role, user in self.users.items():
+            self.assertEqual(Patient.objects.filter(get_principal(user).patient_q()).count(), expected[role], role)
+
+    def test_cached_between_requests(self):
+        user = self.users[DISTRICT]
+        get_principal(user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_principal(user).district_id, self.districts[0].pk)
+
+    def test_revoked_role_invalidates_cache(self):
+        def reassign_inspector(user):
+            inspector = Inspector.objects.get(user=user)
+            inspector.user = self.create_user("new-inspector")
+            inspector.save()
+
+        revoke = {
+            DISTRICT: lambda user: DistrictAdmin.objects.filter(user=user).delete(),
+            REGION: lambda user: RegionAdmin.objects.filter(user=user).delete(),
+            INSPECTOR: reassign_inspector,
+        }
+        for role, revoke_role in revoke.items():
+            user = self.users[role]
+            self.assertEqual(get_principal(user).role, role)
+            with self.captureOnCommitCallbacks(execute=True):
+                revoke_role(user)
+            self.assertIsNone(get_principal(user).role, role)
+
+    def test_moved_inspector_invalidates_cache(self):
+        user = self.users[INSPECTOR]
+        self.assertEqual(get_principal(user).neighborhood_id, self.neighborhoods[0].pk)
+        target = Neighborhood.objects.create(name="Yangi mahalla", district=self.districts[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            inspector = Inspector.objects.get(user=user)
+            inspector.neighborhood = target
+            inspector.save()
+        principal = get_principal(user)
+        self.assertEqual((principal.neighborhood_id, principal.district_id), (target.pk, self.districts[1].pk))
+
+    def test_group_change_invalidates_cache(self):
+        user = self.users[DISTRICT]
+        self.assertIn(self.group.name, get_principal(user).groups)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.groups.remove(self.group)
+        self.assertNotIn(self.group.name, get_principal(user).groups)
+
+
+class StatsTests(RoleDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = timezone.now().date()
+        vary_patients(cls.today)
+
+    def test_district_stats(self):
+        with self.assertNumQueries(2):
+            rows, totals = get_district_stats(District.objects.all(), self.today)
+        expected = old_patient_counts(Patient.objects.all(), "district_id", self.today)
+        related = {
+            "total_neighborhood": Neighborhood.objects, "total_doctor": Doctor.objects,
+            "total_psychiatrist": Psychiatrist.objects, "total_inspector": Inspector.objects,
+        }
+        for row in rows:
+            for name, objects in related.items():
+                self.assertEqual(row[name], objects.filter(district=row["id"]).count(), name)
+            self.assertEqual({name: row[name] for name in PATIENT_COUNTERS}, expected[row["id"]])
+        for name in PATIENT_COUNTERS:
+            self.assertEqual(totals[name], sum(counts[name] for counts in expected.values()), name)
+        self.assertEqual(totals["total_doctor"], Doctor.objects.count())
+
+    def test_neighborhood_stats(self):
+        neighborhoods = Neighborhood.objects.filter(district=self.districts[0])
+        with self.assertNumQueries(2):
+            rows, totals = get_neighborhood_stats(neighborhoods, self.today)
+        expected = old_patient_counts(Patient.objects.filter(district=self.districts[0]), "neighborhood_id", self.today)
+        self.assertEqual({row["id"]: {name: row[name] for name in PATIENT_COUNTERS} for row in rows}, expected)
+        self.assertEqual(totals["total_neighborhood"], self.neighborhoods_per_district)
+        self.assertEqual(totals["total_psychiatrist"], Psychiatrist.objects.filter(district=self.districts[0]).count())
+
+        url = reverse("mahalla_patient_stats", args=[self.districts[0].pk])
+        self.client.force_login(self.users[DISTRICT])
+        self.client.get(url)
+        # sessiya, foydalanuvchi va ikkita statistika so'rovi
+        with self.assertNumQueries(4):
+            data = self.client.get(url).json()
+        self.assertEqual(data["late"], [expected[row["id"]]["late_count"] for row in rows])
+        self.assertEqual(data["total_on_time_patient"], sum(counts["on_time_count"] for counts in expected.values()))
+        self.assertEqual(data["total_psychiatrist"], totals["total_psychiatrist"])
+
+        # boshqa tuman hisoblari ko'rinmaydi
+        data = self.client.get(reverse("mahalla_patient_stats", args=[self.districts[1].pk])).json()
+        self.assertEqual((data["total_psychiatrist"], data["total_patient"], data["labels"]), (0, 0, []))
+
+    def test_dashboard(self):
+        expected = old_patient_counts(Patient.objects.filter(district=self.districts[0]), "district_id", self.today)
+        expected = expected[self.districts[0].pk]
+        self.client.force_login(self.users[DISTRICT])
+        for name in ("admin:dashboard", "admin:statistics"):
+            url = reverse(name)
+            self.client.get(url)
+            # sessiya, foydalanuvchi, ikkita statistika so'rovi va admin menyusi uchun ikkita ruxsatlar so'rovi
+            with self.assertNumQueries(6):
+                response = self.client.get(url)
+            context = response.context
+            self.assertEqual(
+                (context["total_patient"], context["total_late_patient"], context["total_on_time_patient"],
+                 context["total_aggressive_late_patient"], context["total_aggressive_on_time_patient"]),
+                (expected["total_patients"], expected["late_count"], expected["on_time_count"],
+                 expected["aggressive_late_count"], expected["aggressive_on_time_count"]),
+            )
+            self.assertEqual(context["late"], [expected["late_count"]])
+
+
+class UsersAdminQueryTests(RoleDataMixin, TestCase):
+    def test_dashboard(self):
+        # bo'sh keshda: principal va sozlamalar ham o'qiladi; keshdan keyingi aniq son StatsTests.test_dashboard'da
+        self.assertQueryBudget(reverse("admin:dashboard"), 13)
+        self.assertQueryBudget(reverse("admin:statistics"), 13)
 
-# Create your tests here.
+    def test_changelists(self):
+        self.assertQueryBudget(reverse("admin:users_districtadmin_changelist"), 9)
+        self.assertQueryBudget(reverse("admin:users_regionadmin_changelist"), 9)
+        self.assertQueryBudget(reverse("admin:users_user_changelist"), 10)
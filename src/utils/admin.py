@@ -1,117 +1,79 @@
 import datetime
-from collections import defaultdict
-from datetime import timedelta
 from io import BytesIO
 
 import openpyxl
-from django.contrib import admin
-from django.contrib.admin import SimpleListFilter
+from django.contrib import admin, messages
 from django.contrib.admin.utils import unquote
-from django.db.models import Count, Q, Case, When, Value, F, DateField, ExpressionWrapper, DurationField, BooleanField, \
-    Sum
-from django.db.models.functions import Greatest, Concat
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Value, F
+from django.db.models.functions import Concat
+from django.http import HttpResponse, FileResponse
+from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
-from django.urls import path
+from django.urls import path, reverse
 from django.utils import timezone
+from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 from openpyxl.styles import Alignment
 from openpyxl.utils import get_column_letter
 
-from psytracks.models import Patient
-from utils.models import Region, District, Neighborhood, Inspector, SettingsKey, DistrictMonitoring
+from users.principal import ADMIN_ROLES
+from utils.exports import XLSX_CONTENT_TYPE
+from utils.filters import CachedLookupsFilter
+from utils.jobs import enqueue_export
+from utils.search import SearchKeyAdminMixin
+from utils.models import (Region, District, Neighborhood, Inspector, SettingsKey, SettingsOverride, DistrictMonitoring,
+                          ExportJob, ExportKind, ExportStatus)
+from utils.stats import PATIENT_COUNTERS, annotate_monitoring, count_subquery, get_grand_totals
 
 
-class DistrictNeighborhoodFilter(SimpleListFilter):
+class DistrictNeighborhoodFilter(CachedLookupsFilter):
     title = _("district")
     parameter_name = "district"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
-
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(user=user)
-        elif hasattr(user, "district"):
-            qs = qs.filter(district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(district__region=user.region.region)
+        qs = qs.filter(request.principal.area_q())
 
         district_ids = qs.values_list("district_id", flat=True).distinct()
         districts = District.objects.filter(id__in=district_ids).values_list("id", "name")
         return [(d[0], d[1]) for d in districts if d[0]]
 
     def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(inspector=user.inspector)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(user=user)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(district__region=user.region.region)
+        queryset = queryset.filter(request.principal.area_q())
 
         if self.value():
             queryset = queryset.filter(district_id=self.value())
         return queryset
 
 
-class DistrictInspectorFilter(SimpleListFilter):
+class DistrictInspectorFilter(CachedLookupsFilter):
     title = _("district")
     parameter_name = "district"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
+        qs = qs.filter(request.principal.member_q())
 
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(user=user)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
-
-        district_ids = qs.values_list("neighborhood__district_id", flat=True).distinct()
+        district_ids = qs.values_list("district_id", flat=True).distinct()
         districts = District.objects.filter(id__in=district_ids).values_list("id", "name")
         return [(d[0], d[1]) for d in set(districts) if d[0]]
 
     def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(user=user)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
+        queryset = queryset.filter(request.principal.member_q())
 
         if self.value():
-            queryset = queryset.filter(neighborhood__district_id=self.value())
+            queryset = queryset.filter(district_id=self.value())
         return queryset
 
 
-class NeighborhoodInspectorFilter(SimpleListFilter):
+class NeighborhoodInspectorFilter(CachedLookupsFilter):
     title = _("neighborhood")
     parameter_name = "neighborhood"
 
-    def lookups(self, request, model_admin):
+    def get_lookups(self, request, model_admin):
         qs = model_admin.get_queryset(request)
-
-        user = request.user
-        if hasattr(user, "inspector"):
-            qs = qs.filter(user=user)
-        elif hasattr(user, "neighborhood"):
-            qs = qs.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            qs = qs.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            qs = qs.filter(neighborhood__district__region=user.region.region)
+        qs = qs.filter(request.principal.member_q())
 
         neighborhood_ids = qs.values_list("neighborhood_id", flat=True).distinct()
         neighborhoods = Neighborhood.objects.filter(id__in=neighborhood_ids).annotate(
@@ -120,56 +82,97 @@ class NeighborhoodInspectorFilter(SimpleListFilter):
         return [(d[0], d[1]) for d in neighborhoods if d[0]]
 
     def queryset(self, request, queryset):
-        user = request.user
-        if hasattr(user, "inspector"):
-            queryset = queryset.filter(user=user)
-        elif hasattr(user, "neighborhood"):
-            queryset = queryset.filter(neighborhood=user.neighborhood)
-        elif hasattr(user, "district"):
-            queryset = queryset.filter(neighborhood__district=user.district.district)
-        elif hasattr(user, "region"):
-            queryset = queryset.filter(neighborhood__district__region=user.region.region)
+        queryset = queryset.filter(request.principal.member_q())
 
         if self.value():
             queryset = queryset.filter(neighborhood_id=self.value())
         return queryset
 
 
+class ScopedAutocompleteMixin:
+    """
+    Boshqa formalardagi autocomplete (admin:autocomplete) natijalari foydalanuvchining ko'rish doirasi bilan
+    cheklanadi (formfield_for_foreignkey dagi kabi), o'z ro'yxati o'zgarmaydi.
+    """
+
+    def get_autocomplete_q(self, principal):
+        return Q()
+
+    def is_autocomplete(self, request):
+        return bool(request.resolver_match and request.resolver_match.url_name == "autocomplete")
+
+    def has_view_permission(self, request, obj=None):
+        # "Туман админи" va "Вилоят админи" guruhlarida hudud modellarini ko'rish ruxsati yo'q, lekin bemor,
+        # shifokor va psixiatr formalarida tanlashi kerak; natijalar baribir ularning hududi bilan cheklanadi
+        if self.is_autocomplete(request) and request.principal.role in ADMIN_ROLES:
+            return True
+        return super().has_view_permission(request, obj)
+
+    def get_search_results(self, request, queryset, search_term):
+        queryset, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if self.is_autocomplete(request):
+            queryset = queryset.filter(self.get_autocomplete_q(request.principal))
+        return queryset, may_have_duplicates
+
+
 @admin.register(Region)
-class RegionAdmin(admin.ModelAdmin):
+class RegionAdmin(ScopedAutocompleteMixin, admin.ModelAdmin):
     list_display = ('id', 'name')
     list_display_links = ('id', 'name')
     search_fields = ["name__icontains"]
     ordering = ('name',)
 
+    def get_autocomplete_q(self, principal):
+        return principal.region_q()
+
 
 @admin.register(District)
-class DistrictAdmin(admin.ModelAdmin):
+class DistrictAdmin(ScopedAutocompleteMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'region')
     list_display_links = ('id', 'name')
+    list_select_related = ('region',)
     search_fields = ["name__icontains"]
     ordering = ('name',)
     list_filter = ["region",]
+    autocomplete_fields = ["region"]
+
+    def get_autocomplete_q(self, principal):
+        return principal.district_q()
 
 
 @admin.register(Neighborhood)
-class NeighborhoodAdmin(admin.ModelAdmin):
+class NeighborhoodAdmin(ScopedAutocompleteMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'user', 'district')
     list_display_links = ('id', 'name')
+    list_select_related = ('user', 'district')
     search_fields = ["name__icontains", "district__name__icontains"]
     ordering = ('name',)
     list_filter = ["district__region", DistrictNeighborhoodFilter]
     autocomplete_fields = ["user",]
 
+    def get_queryset(self, request):
+        # __str__ tuman nomini ishlatadi (autocomplete natijalari)
+        return super().get_queryset(request).select_related("district")
+
+    def get_autocomplete_q(self, principal):
+        return principal.district_q("district__")
+
 
 @admin.register(Inspector)
-class InspectorAdmin(admin.ModelAdmin):
+class InspectorAdmin(SearchKeyAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'full_name', 'neighborhood', 'phone', 'user')
     list_display_links = ('id', 'full_name')
+    list_select_related = ('neighborhood__district', 'user')
     ordering = ('full_name',)
     autocomplete_fields = ["neighborhood", "user"]
-    search_fields = ["full_name__icontains"]
-    list_filter = ["neighborhood__district__region", DistrictInspectorFilter, NeighborhoodInspectorFilter]
+    search_fields = ["search_key"]
+    list_filter = ["region", DistrictInspectorFilter, NeighborhoodInspectorFilter]
+
+
+class SettingsOverrideInline(admin.TabularInline):
+    model = SettingsOverride
+    extra = 0
+    autocomplete_fields = ["district"]
 
 
 @admin.register(SettingsKey)
@@ -177,144 +180,37 @@ class SettingsKeyAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'key', 'value')
     list_display_links = ('id', 'name')
     search_fields = ["name__icontains"]
+    inlines = [SettingsOverrideInline]
 
 
 
 @admin.register(DistrictMonitoring)
 class DistrictMonitoringAdmin(admin.ModelAdmin):
     change_list_template = "admin/district_monitoring.html"
+    show_full_result_count = False
     list_display = ("name", "total_neighborhood", "total_patients", "total_aggressive_patients",
                     "total_convicted_patients", "total_abroad_long_term_patients", "late_count",
                 "on_time_count", "aggressive_late_count", "aggressive_on_time_count")
 
     def change_view(self, request, object_id, form_url='', extra_context=None):
         obj = self.get_object(request, unquote(object_id))
-        user = request.user
-        filter_q = Q(district_id=object_id)
-        if hasattr(user, "district"):
-            filter_q &= Q(district_id=user.district.district_id)
-        elif hasattr(user, "region"):
-            filter_q &= Q(district__region_id=user.region.region_id)
+        if obj is None:
+            return self._get_obj_does_not_exist_redirect(request, self.opts, object_id)
+        filter_q = Q(district_id=obj.pk) & request.principal.district_q("district__")
 
         today = timezone.now().date()
         ordering = request.GET.get("o", "name")
         if ordering:
             field = ordering.lstrip("-")
             if field not in self.list_display:
-                ordering = field.split("name")
-        patients = Patient.objects.annotate(
-            last_date=Case(
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=False,
-                    last_hospitalization_from__gt=F("last_hospitalization_to"),
-                    then=Value(today)
-                ),
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=True,
-                    then=Value(today)
-                ),
-                When(
-                    last_hospitalization_from__isnull=True,
-                    last_hospitalization_to__isnull=False,
-                    then=Greatest(
-                        "last_hospitalization_to",
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=False,
-                    last_hospitalization_from__lte=F("last_hospitalization_to"),
-                    then=Greatest(
-                        "last_hospitalization_to",
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                When(
-                    last_hospitalization_from__isnull=True,
-                    last_hospitalization_to__isnull=True,
-                    then=Greatest(
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                default=None,
-                output_field=DateField()
-            )
-        ).annotate(
-            interval=ExpressionWrapper(
-                F("max_examination_interval") * Value(timedelta(days=1)),
-                output_field=DurationField()
-            ),
-            deadline=ExpressionWrapper(
-                F("last_date") + F("interval"),
-                output_field=DateField()
-            ),
-            # deadline o‘tib ketganmi
-            is_overdue=Case(
-                When(last_date__isnull=True, then=Value(True)),
-                When(deadline__lt=Value(today, output_field=DateField()), then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField()
-            )
-        )
+                ordering = "name"
 
-        qs = Neighborhood.objects.filter(filter_q).annotate(
-            total_patients=Count("patients", distinct=True),
-            total_aggressive_patients=Count(
-                "patients",
-                filter=Q(patients__in=patients.filter(is_aggressive=True)),
-                distinct=True
-            ),
-            total_convicted_patients=Count(
-                "patients",
-                filter=Q(patients__in=patients.filter(is_convicted=True)),
-                distinct=True
-            ),
-            total_abroad_long_term_patients=Count(
-                "patients",
-                filter=Q(patients__in=patients.filter(is_abroad_long_term=True)),
-                distinct=True
-            ),
-            late_count=Count(
-                "patients",
-                filter=Q(patients__in=patients.filter(is_overdue=True)),
-                distinct=True,
-            ),
-            on_time_count=Count(
-                "patients",
-                filter=Q(patients__in=patients.filter(is_overdue=False)),
-                distinct=True,
-            ),
-            aggressive_late_count=Count(
-                "patients",
-                filter=Q(patients__in=patients.filter(is_aggressive=True, is_overdue=True)),
-                distinct=True,
-            ),
-            aggressive_on_time_count=Count(
-                "patients",
-                filter=Q(patients__in=patients.filter(is_aggressive=True, is_overdue=False)),
-                distinct=True,
-            ),
-        ).order_by(ordering)
-
-        totals = defaultdict(int)
-        for row in qs:
-            totals["total_patients"] += row.total_patients
-            totals["total_aggressive_patients"] += row.total_aggressive_patients
-            totals["total_convicted_patients"] += row.total_convicted_patients
-            totals["total_abroad_long_term_patients"] += row.total_abroad_long_term_patients
-            totals["on_time_count"] += row.on_time_count
-            totals["late_count"] += row.late_count
-            totals["aggressive_on_time_count"] += row.aggressive_on_time_count
-            totals["aggressive_late_count"] += row.aggressive_late_count
+        qs = annotate_monitoring(Neighborhood.objects.filter(filter_q), "patients__", today).order_by(ordering)
+        rows = list(qs)
+        totals = get_grand_totals(rows, PATIENT_COUNTERS)
 
         if "export" in request.GET:
-            resp = self.detail_export_as_excel(obj.name, qs, totals)
+            resp = self.detail_export_as_excel(obj.name, rows, totals)
             return resp
 
         context = {
@@ -326,134 +222,32 @@ class DistrictMonitoringAdmin(admin.ModelAdmin):
         if extra_context:
             context.update(extra_context)
 
-        context["neighborhoods"] = qs
-        context["totals"] = dict(totals)
+        context["neighborhoods"] = rows
+        context["totals"] = totals
         return TemplateResponse(request, "admin/district_monitoring_change_table.html", context)
 
+    def get_scope_queryset(self, request):
+        return super().get_queryset(request).filter(request.principal.district_q())
+
+    def get_object(self, request, object_id, from_field=None):
+        # change_view'ga tumanning o'zi kerak, monitoring ustunlari uchun bemorlar qayta skan qilinmaydi
+        try:
+            return self.get_scope_queryset(request).get(pk=self.opts.pk.to_python(object_id))
+        except (self.model.DoesNotExist, ValidationError, ValueError):
+            return None
+
     def get_queryset(self, request):
         today = timezone.now().date()
-        user = request.user
-        filter_q = Q(id__gt=0)
-        if hasattr(user, "district"):
-            filter_q = Q(id=user.district.district_id)
-        elif hasattr(user, "region"):
-            filter_q = Q(region_id=user.region.region_id)
-
-
-        patients = Patient.objects.annotate(
-            last_date=Case(
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=False,
-                    last_hospitalization_from__gt=F("last_hospitalization_to"),
-                    then=Value(today)
-                ),
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=True,
-                    then=Value(today)
-                ),
-                When(
-                    last_hospitalization_from__isnull=True,
-                    last_hospitalization_to__isnull=False,
-                    then=Greatest(
-                        "last_hospitalization_to",
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                When(
-                    last_hospitalization_from__isnull=False,
-                    last_hospitalization_to__isnull=False,
-                    last_hospitalization_from__lte=F("last_hospitalization_to"),
-                    then=Greatest(
-                        "last_hospitalization_to",
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                When(
-                    last_hospitalization_from__isnull=True,
-                    last_hospitalization_to__isnull=True,
-                    then=Greatest(
-                        "last_psychiatric_appointment_date",
-                        "last_home_visit_by_doctor_date",
-                    )
-                ),
-                default=None,
-                output_field=DateField()
-            )
-        ).annotate(
-            interval=ExpressionWrapper(
-                F("max_examination_interval") * Value(timedelta(days=1)),
-                output_field=DurationField()
-            ),
-            deadline=ExpressionWrapper(
-                F("last_date") + F("interval"),
-                output_field=DateField()
-            ),
-            # deadline o‘tib ketganmi
-            is_overdue=Case(
-                When(last_date__isnull=True, then=Value(True)),
-                When(deadline__lt=Value(today, output_field=DateField()), then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField()
-            )
+        return annotate_monitoring(
+            self.get_scope_queryset(request), "patients__", today,
+            total_neighborhood=count_subquery(Neighborhood.objects, "district"),
         )
 
-        qs = super().get_queryset(request).filter(filter_q).annotate(
-            total_neighborhood=Count("neighborhoods", distinct=True),
-            total_patients=Count("neighborhoods__patients", distinct=True),
-            total_aggressive_patients=Count(
-                "neighborhoods__patients",
-                filter=Q(neighborhoods__patients__in=patients.filter(is_aggressive=True)),
-                distinct=True
-            ),
-            total_convicted_patients=Count(
-                "neighborhoods__patients",
-                filter=Q(neighborhoods__patients__in=patients.filter(is_convicted=True)),
-                distinct=True
-            ),
-            total_abroad_long_term_patients=Count(
-                "neighborhoods__patients",
-                filter=Q(neighborhoods__patients__in=patients.filter(is_abroad_long_term=True)),
-                distinct=True
-            ),
-            late_count=Count(
-                "neighborhoods__patients",
-                filter=Q(neighborhoods__patients__in=patients.filter(is_overdue=True)),
-                distinct=True,
-            ),
-            on_time_count=Count(
-                "neighborhoods__patients",
-                filter=Q(neighborhoods__patients__in=patients.filter(is_overdue=False)),
-                distinct=True,
-            ),
-            aggressive_late_count=Count(
-                "neighborhoods__patients",
-                filter=Q(neighborhoods__patients__in=patients.filter(is_aggressive=True, is_overdue=True)),
-                distinct=True,
-            ),
-            aggressive_on_time_count=Count(
-                "neighborhoods__patients",
-                filter=Q(neighborhoods__patients__in=patients.filter(is_aggressive=True, is_overdue=False)),
-                distinct=True,
-            ),
-        )
-        totals = defaultdict(int)
-        for row in qs:
-            totals["total_neighborhood"] += row.total_neighborhood
-            totals["total_patients"] += row.total_patients
-            totals["total_aggressive_patients"] += row.total_aggressive_patients
-            totals["total_convicted_patients"] += row.total_convicted_patients
-            totals["total_abroad_long_term_patients"] += row.total_abroad_long_term_patients
-            totals["on_time_count"] += row.on_time_count
-            totals["late_count"] += row.late_count
-            totals["aggressive_on_time_count"] += row.aggressive_on_time_count
-            totals["aggressive_late_count"] += row.aggressive_late_count
-
-        self.totals = dict(totals)
-        return qs
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        paginator = super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+        # sahifalash uchun bemorlar jadvalini qayta skan qilmasdan, faqat tumanlar sanaladi
+        paginator.count = self.get_scope_queryset(request).count()
+        return paginator
 
     def has_add_permission(self, request):
         return False
@@ -508,13 +302,17 @@ class DistrictMonitoringAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def export_as_excel(self, request):
-        qs = self.get_changelist_instance(request).get_queryset(request)
+        enqueue_export(request, ExportKind.MONITORING)
+        messages.success(request, _("The export has been queued. The file will be available on the \"My exports\" page."))
+        return redirect("admin:utils_exportjob_changelist")
+
+    def detail_export_as_excel(self, obj_name, qs, totals):
 
         wb = openpyxl.Workbook()
         ws = wb.active
-        ws.title = "tuman"
+        ws.title = "mahalla"
 
-        ws.append(["№", "Ҳудуд", "Жами маҳаллалар сони", "Жами руҳий касаллар сони",
+        ws.append(["№", "Маҳалла", "Жами руҳий касаллар сони",
                    "Жами тажовузкор руҳий касаллар сони",
                    "Жами муқаддам судланган руҳий касаллар сони",
                    "Жами узоқ муддатга кетган руҳий касаллар сони",
@@ -527,7 +325,6 @@ class DistrictMonitoringAdmin(admin.ModelAdmin):
             ws.append([
                 index,
                 obj.name,
-                obj.total_neighborhood,
                 obj.total_patients,
                 obj.total_aggressive_patients,
                 obj.total_convicted_patients,
@@ -537,15 +334,9 @@ class DistrictMonitoringAdmin(admin.ModelAdmin):
                 obj.aggressive_late_count,
                 obj.aggressive_on_time_count,
             ])
-        ws.append(["", "Жами", qs.aggregate(total_neighborhoods=Sum("total_neighborhood"))["total_neighborhoods"] or 0,
-                qs.aggregate(total_patient=Sum("total_patients"))["total_patient"] or 0,
-                qs.aggregate(total_aggressive_patient=Sum("total_aggressive_patients"))["total_aggressive_patient"] or 0,
-                qs.aggregate(total_convicted_patient=Sum("total_convicted_patients"))["total_convicted_patient"] or 0,
-                qs.aggregate(total_abroad_long_term_patient=Sum("total_abroad_long_term_patients"))["total_abroad_long_term_patients"] or 0,
-                qs.aggregate(total_late_count=Sum("late_count"))["total_late_count"] or 0,
-                qs.aggregate(total_on_time_count=Sum("on_time_count"))["total_on_time_count"] or 0,
-                qs.aggregate(total_aggressive_late_count=Sum("aggressive_late_count"))["total_aggressive_late_count"] or 0,
-                qs.aggregate(total_aggressive_on_time_count=Sum("aggressive_on_time_count"))["total_aggressive_on_time_count"] or 0
+        ws.append(["", "Жами", totals["total_patients"], totals["total_aggressive_patients"],
+                   totals["total_convicted_patients"], totals["total_abroad_long_term_patients"], totals["late_count"],
+                   totals["on_time_count"], totals["aggressive_late_count"], totals["aggressive_on_time_count"]
                 ])
 
         uniform_width = 20
@@ -563,62 +354,66 @@ class DistrictMonitoringAdmin(admin.ModelAdmin):
         output.seek(0)
 
         response = HttpResponse(
-            output,
+            output.getvalue(),
             content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
         response["Content-Disposition"] = f'attachment; filename={filename}'
         return response
 
-    def detail_export_as_excel(self, obj_name, qs, totals):
 
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "mahalla"
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    change_list_template = "admin/export_jobs.html"
+    list_display = ("created_at", "kind", "status", "progress", "download_link")
+    list_display_links = None
+    list_filter = ("kind", "status")
 
-        ws.append(["№", "Маҳалла", "Жами руҳий касаллар сони",
-                   "Жами тажовузкор руҳий касаллар сони",
-                   "Жами муқаддам судланган руҳий касаллар сони",
-                   "Жами узоқ муддатга кетган руҳий касаллар сони",
-                   "Кейинги текширувни ўтказиб юборган руҳий касаллар сони",
-                   "Кейинги текширувни ўтказиб юбормаган руҳий касаллар сони",
-                   "Кейинги текширувни ўтказиб юборган тажовузкор руҳий касаллар сони",
-                   "Кейинги текширувни ўтказиб юбормаган тажовузкор руҳий касаллар сони"])
+    def get_queryset(self, request):
+        return super().get_queryset(request).filter(user=request.user)
 
-        for index, obj in enumerate(qs, start=1):
-            ws.append([
-                index,
-                obj.name,
-                obj.total_patients,
-                obj.total_aggressive_patients,
-                obj.total_convicted_patients,
-                obj.total_abroad_long_term_patients,
-                obj.late_count,
-                obj.on_time_count,
-                obj.aggressive_late_count,
-                obj.aggressive_on_time_count,
-            ])
-        ws.append(["", "Жами", totals["total_patients"], totals["total_aggressive_patients"],
-                   totals["total_convicted_patients"], totals["total_abroad_long_term_patients"], totals["late_count"],
-                   totals["on_time_count"], totals["aggressive_late_count"], totals["aggressive_on_time_count"]
-                ])
+    def has_module_permission(self, request):
+        return request.user.is_active and request.user.is_staff
 
-        uniform_width = 20
-        for col in ws.columns:
-            col_letter = get_column_letter(col[0].column)
-            ws.column_dimensions[col_letter].width = uniform_width
-            for cell in col:
-                cell.alignment = Alignment(wrap_text=True)
+    def has_view_permission(self, request, obj=None):
+        return self.has_module_permission(request) and (obj is None or obj.user_id == request.user.pk)
 
-        today_str = datetime.date.today().strftime("%Y-%m-%d")
-        filename = f"monitoring-{today_str}.xlsx"
+    def has_add_permission(self, request):
+        return False
 
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+    def has_change_permission(self, request, obj=None):
+        return False
 
-        response = HttpResponse(
-            output.getvalue(),
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        response["Content-Disposition"] = f'attachment; filename={filename}'
-        return response
\ No newline at end of file
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context["has_unfinished"] = self.get_queryset(request).filter(
+            status__in=[ExportStatus.PENDING, ExportStatus.RUNNING]
+        ).exists()
+        return super().changelist_view(request, extra_context)
+
+    @admin.display(description=_("progress"))
+    def progress(self, obj):
+        if not obj.total:
+            return "—"
+        return f"{obj.written} / {obj.total} ({obj.written * 100 // obj.total}%)"
+
+    @admin.display(description=_("file"))
+    def download_link(self, obj):
+        if obj.status != ExportStatus.DONE or not obj.file:
+            return "—"
+        return format_html('<a href="{}"><i class="fa fa-download"></i> {}</a>',
+                           reverse("admin:utils_exportjob_download", args=[obj.pk]), _("Download"))
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path("<int:pk>/download/", self.admin_site.admin_view(self.download), name="utils_exportjob_download"),
+        ]
+        return custom_urls + urls
+
+    def download(self, request, pk):
+        job = get_object_or_404(self.get_queryset(request), pk=pk, status=ExportStatus.DONE)
+        return FileResponse(job.file.open("rb"), as_attachment=True, filename=job.download_name,
+                            content_type=XLSX_CONTENT_TYPE)
@@ -0,0 +1,103 @@
+import datetime
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.dateparse import parse_duration
+
+from utils.models import SettingsKey, SettingsOverride
+
+VERSION_CACHE_KEY = "settings_key:version"
+
+LIMIT_KEYS = ("last_psychiatric_appointment_days", "last_home_visit_by_doctor_days", "last_hospitalization_to_days")
+
+DEFAULTS = {
+    "last_psychiatric_appointment_days": 30,
+    "last_home_visit_by_doctor_days": 30,
+    "last_hospitalization_to_days": 180,
+    # shundan ko'p qatorli ro'yxatlarda soni taxminiy ko'rsatiladi
+    "estimated_count_threshold": 50000,
+    # xatolarga chidamli qidiruvda ko'rsatiladigan eng yaqin yozuvlar soni
+    "fuzzy_search_limit": 100,
+}
+
+_state = {"version": None, "values": {}, "overrides": {}}
+_lock = threading.Lock()
+
+
+def parse_bool(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "on", "ha")
+
+
+def parse_timedelta(value):
+    value = str(value).strip()
+    if value.lstrip("-").isdigit():
+        return datetime.timedelta(days=int(value))
+    duration = parse_duration(value)
+    if duration is None:
+        raise ValueError(value)
+    return duration
+
+
+PARSERS = {
+    bool: parse_bool,
+    int: lambda value: int(str(value).strip()),
+    datetime.timedelta: parse_timedelta,
+}
+
+
+def get_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def bump_version():
+    # yangi qiymat tranzaksiya yakunlangandan keyin ko'rinadi, shunda boshqa worker eski qiymatni qayta o'qimaydi
+    transaction.on_commit(lambda: cache.set(VERSION_CACHE_KEY, time.time_ns(), None))
+
+
+def load():
+    """
+    Barcha SettingsKey va tuman bo'yicha qiymatlarni jarayon xotirasida saqlaydi.
+    Umumiy keshdagi versiya o'zgarsa qayta o'qiladi, shuning uchun kesh barcha worker'lar uchun umumiy
+    bo'lishi kerak (settings.CACHES, utils.E002 tekshiruvi).
+    """
+    version = get_version()
+    if _state["version"] == version and version is not None:
+        return _state
+    with _lock:
+        if _state["version"] != version or version is None:
+            _state["values"] = dict(SettingsKey.objects.values_list("key", "value"))
+            _state["overrides"] = {
+                (district_id, key): value
+                for district_id, key, value in SettingsOverride.objects.values_list("district_id", "setting__key", "value")
+            }
+            _state["version"] = version
+    return _state
+
+
+def get_setting(key, default=None, cast=None, district=None):
+    if default is None:
+        default = DEFAULTS.get(key)
+    state = load()
+    value = None
+    if district is not None:
+        value = state["overrides"].get((getattr(district, "pk", district), key))
+    if value is None:
+        value = state["values"].get(key)
+    if value is None:
+        return default
+
+    cast = cast or (type(default) if default is not None else str)
+    try:
+        return PARSERS.get(cast, cast)(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def get_limits(district=None):
+    return {key: get_setting(key, district=district) for key in LIMIT_KEYS}
@@ -1,5 +1,5 @@
-from django.apps import AppConfig
-from django.db.models.signals import post_migrate
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_save
 from django.utils.translation import gettext_lazy as _
 
 
@@ -9,5 +9,28 @@ class UtilsConfig(AppConfig):
     verbose_name = _("Utils")
 
     def ready(self):
-        from .signals import create_virtual_permissions
-        post_migrate.connect(create_virtual_permissions, sender=self)
\ No newline at end of file
+        from . import checks  # noqa: F401
+        from .models import SettingsKey, SettingsOverride
+        from .signals import create_virtual_permissions, create_default_settings, bump_settings_version, \
+            filter_lookups_changed
+        post_migrate.connect(create_virtual_permissions, sender=self)
+        post_migrate.connect(create_default_settings, sender=self)
+        for model in (SettingsKey, SettingsOverride):
+            post_save.connect(bump_settings_version, sender=model)
+            post_delete.connect(bump_settings_version, sender=model)
+        # yon panel filtrlaridagi nomlar va biriktirishlar
+        for model in ("utils.District", "utils.Neighborhood", "utils.Inspector", "psytracks.Psychiatrist",
+                      "psytracks.Doctor"):
+            post_save.connect(filter_lookups_changed, sender=apps.get_model(model))
+            post_delete.connect(filter_lookups_changed, sender=apps.get_model(model))
+        post_delete.connect(filter_lookups_changed, sender=apps.get_model("psytracks.Patient"))
+        from .search import set_search_key, fuzzy_index_changed
+        post_save.connect(fuzzy_index_changed, sender=apps.get_model("psytracks.Patient"))
+        post_delete.connect(fuzzy_index_changed, sender=apps.get_model("psytracks.Patient"))
+        for model in ("psytracks.Patient", "psytracks.Doctor", "psytracks.Psychiatrist", "utils.Inspector"):
+            pre_save.connect(set_search_key, sender=apps.get_model(model))
+        from .hierarchy import DISTRICT_MODELS, set_instance_hierarchy, neighborhood_moved, district_moved
+        for model in DISTRICT_MODELS:
+            pre_save.connect(set_instance_hierarchy, sender=apps.get_model(model))
+        post_save.connect(neighborhood_moved, sender=apps.get_model("utils.Neighborhood"))
+        post_save.connect(district_moved, sender=apps.get_model("utils.District"))
@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.security)
+def check_export_storage(app_configs, **kwargs):
+    """
+    Eksport fayllari /media/ orqali ochiq berilmasligi kerak.
+    """
+    location = Path(settings.STORAGES["exports"]["OPTIONS"]["location"]).resolve()
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    if location == media_root or media_root in location.parents:
+        return [Error(
+            "EXPORT_ROOT must not be inside MEDIA_ROOT: exports contain personal data and would be served at MEDIA_URL.",
+            id="utils.E001",
+        )]
+    return []
+
+
+# har bir jarayonning o'z xotirasidagi kesh: versiya kaliti boshqa worker'larga yetib bormaydi
+PROCESS_LOCAL_CACHES = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+@register(Tags.caches, Tags.security)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Principal (users.principal) va boshqa keshlar versiya kaliti bilan eskiradi; jarayonga xos keshda rol
+    bekor qilinishi boshqa worker'larda CACHE_TIMEOUT davomida sezilmaydi.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"The default cache ({backend}) is local to each process: revoked roles and changed settings would stay "
+        "cached in the other workers.",
+        hint="Use a shared backend (FileBasedCache on a single server, RedisCache otherwise) or run with DEBUG.",
+        id="utils.E002",
+    )]
@@ -0,0 +1,98 @@
+"""
+Baza ulanishlari: o'qish/yozish aliaslari (DATABASE_READ_ALIAS, DATABASE_WRITE_ALIAS) va PostgreSQL'da
+sahifa bo'yicha statement_timeout (STATEMENT_TIMEOUTS).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# joriy so'rovda yozish bo'lgan bo'lsa, keyingi o'qishlar ham asosiy bazadan (replika kechikishi)
+_primary_pinned = ContextVar("primary_pinned", default=False)
+
+
+class PrimaryReplicaRouter:
+    """
+    O'qish - DATABASE_READ_ALIAS, yozish va migratsiyalar - DATABASE_WRITE_ALIAS.
+    Tranzaksiya ichida yoki shu so'rovda yozilgandan keyin o'qish ham asosiy bazadan bo'ladi.
+    """
+
+    def db_for_read(self, model, **hints):
+        write_alias = settings.DATABASE_WRITE_ALIAS
+        if _primary_pinned.get() or connections[write_alias].in_atomic_block:
+            return write_alias
+        return settings.DATABASE_READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _primary_pinned.set(True)
+        return settings.DATABASE_WRITE_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replika asosiy bazaning nusxasi
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == settings.DATABASE_WRITE_ALIAS
+
+
+def get_postgresql_aliases():
+    return [alias for alias in connections if connections[alias].vendor == "postgresql"]
+
+
+def set_statement_timeout(timeout, aliases=None):
+    """
+    timeout - millisekund, 0 - cheklanmagan. Faqat PostgreSQL'da, sessiya darajasida.
+    """
+    for alias in get_postgresql_aliases() if aliases is None else aliases:
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, false)", [str(int(timeout))])
+
+
+def reset_statement_timeout(aliases=None):
+    """
+    Ulanish sozlamalaridagi (DB_STATEMENT_TIMEOUT) qiymatga qaytaradi; ulanish pulga qaytishidan oldin chaqiriladi.
+    """
+    for alias in get_postgresql_aliases() if aliases is None else aliases:
+        connection = connections[alias]
+        # yopilgan yoki xato bilan tugagan tranzaksiyadagi ulanishda SET rollback bilan bekor bo'ladi
+        if connection.connection is None or connection.needs_rollback:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute("RESET statement_timeout")
+
+
+@contextmanager
+def statement_timeout(timeout, aliases=None):
+    aliases = get_postgresql_aliases() if aliases is None else aliases
+    set_statement_timeout(timeout, aliases)
+    try:
+        yield
+    finally:
+        reset_statement_timeout(aliases)
+
+
+class DatabaseMiddleware:
+    """
+    Har bir so'rov boshida replika o'qishlari qayta yoqiladi, STATEMENT_TIMEOUTS dagi sahifalar uchun
+    statement_timeout o'rnatiladi va javobdan keyin qaytariladi.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _primary_pinned.set(False)
+        request.statement_timeout = None
+        try:
+            return self.get_response(request)
+        finally:
+            if request.statement_timeout is not None:
+                reset_statement_timeout()
+            _primary_pinned.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timeout = settings.STATEMENT_TIMEOUTS.get(request.resolver_match.view_name)
+        if timeout is not None and get_postgresql_aliases():
+            set_statement_timeout(timeout)
+            request.statement_timeout = timeout
@@ -0,0 +1,87 @@
+import csv
+import tempfile
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, NamedStyle
+from openpyxl.utils import get_column_letter
+
+from utils.stats import get_grand_totals
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+EXPORT_CHUNK_SIZE = 2000
+COLUMN_WIDTH = 20
+
+MONITORING_EXPORT_HEADERS = ["№", "Ҳудуд", "Жами маҳаллалар сони", "Жами руҳий касаллар сони",
+                             "Жами тажовузкор руҳий касаллар сони",
+                             "Жами муқаддам судланган руҳий касаллар сони",
+                             "Жами узоқ муддатга кетган руҳий касаллар сони",
+                             "Кейинги текширувни ўтказиб юборган руҳий касаллар сони",
+                             "Кейинги текширувни ўтказиб юбормаган руҳий касаллар сони",
+                             "Кейинги текширувни ўтказиб юборган тажовузкор руҳий касаллар сони",
+                             "Кейинги текширувни ўтказиб юбормаган тажовузкор руҳий касаллар сони"]
+
+MONITORING_EXPORT_FIELDS = ("total_neighborhood", "total_patients", "total_aggressive_patients",
+                            "total_convicted_patients", "total_abroad_long_term_patients", "late_count",
+                            "on_time_count", "aggressive_late_count", "aggressive_on_time_count")
+
+
+def write_xlsx(title, headers, rows, file, progress=None):
+    """
+    Write-only rejimida yozadi: qatorlar xotirada to'planmaydi, uslub esa oldindan tayyorlangan NamedStyle.
+    progress(yozilgan_qatorlar) har EXPORT_CHUNK_SIZE qatorda chaqiriladi.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    wrap = NamedStyle(name="wrap", alignment=Alignment(wrap_text=True))
+    wb.add_named_style(wrap)
+    ws = wb.create_sheet(title)
+    for index in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(index)].width = COLUMN_WIDTH
+
+    def styled(values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = "wrap"
+            cells.append(cell)
+        return cells
+
+    ws.append(styled(headers))
+    for written, row in enumerate(rows, start=1):
+        ws.append(styled(row))
+        if progress and written % EXPORT_CHUNK_SIZE == 0:
+            progress(written)
+    wb.save(file)
+
+
+class EchoBuffer:
+    def write(self, value):
+        return value
+
+
+def iter_csv(headers, rows):
+    """
+    CSV'ni qatorma-qator qaytaradi (StreamingHttpResponse uchun).
+    """
+    writer = csv.writer(EchoBuffer())
+    # Excel kirill harflarini to'g'ri ochishi uchun BOM
+    yield "\ufeff"
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def make_export_file():
+    return tempfile.TemporaryFile(suffix=".xlsx")
+
+
+def export_monitoring_xlsx(queryset, file, progress=None):
+    districts = list(queryset)
+    totals = get_grand_totals(districts, MONITORING_EXPORT_FIELDS)
+    rows = [
+        [index, obj.name, *(getattr(obj, field) for field in MONITORING_EXPORT_FIELDS)]
+        for index, obj in enumerate(districts, start=1)
+    ]
+    rows.append(["", "Жами", *(totals[field] for field in MONITORING_EXPORT_FIELDS)])
+    write_xlsx("tuman", MONITORING_EXPORT_HEADERS, rows, file, progress)
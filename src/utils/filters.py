@@ -0,0 +1,131 @@
+import time
+
+from django.contrib.admin import SimpleListFilter, BooleanFieldListFilter, FieldListFilter
+from django.contrib.admin.utils import build_q_object_from_lookup_parameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Q, Value, When
+from django.db.models.functions import Cast
+
+VERSION_CACHE_KEY = "filter_lookups:version"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_version():
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def invalidate_lookups():
+    # bemor/inspektor/psixiatr biriktirishlari yoki nomlar o'zgarganda barcha filtrlar qayta hisoblanadi
+    transaction.on_commit(lambda: cache.set(VERSION_CACHE_KEY, time.time_ns(), None))
+
+
+class CachedLookupsFilter(SimpleListFilter):
+    """
+    Yon paneldagi variantlar foydalanuvchi roli va ko'rish doirasi bo'yicha keshlanadi,
+    shuning uchun sahifalash va saralashda ular uchun so'rov yuborilmaydi.
+    Vorislar lookups() o'rniga get_lookups() ni yozadi.
+    """
+
+    def get_lookups(self, request, model_admin):
+        raise NotImplementedError
+
+    def lookups(self, request, model_admin):
+        key = (f"filter_lookups:{get_version()}:{model_admin.opts.label_lower}:{self.parameter_name}:"
+               f"{request.principal.scope_key}")
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.get_lookups(request, model_admin))
+            cache.set(key, choices, CACHE_TIMEOUT)
+        return choices
+
+
+class FacetedFilterMixin:
+    """
+    SimpleListFilter sharti Q sifatida (get_q), variantlar soni esa FacetedChangeList umumiy so'rovidan olinadi.
+    field - variant qiymati saqlanadigan ustun.
+    """
+    field = None
+
+    def get_q(self, value):
+        return Q(**{self.field: value})
+
+    def get_active_q(self):
+        return self.get_q(self.value()) if self.value() else Q()
+
+    def get_facet_expression(self):
+        return Cast(self.field, CharField())
+
+    def queryset(self, request, queryset):
+        if self.value():
+            queryset = queryset.filter(self.get_q(self.value()))
+        return queryset
+
+    def get_facet_queryset(self, changelist):
+        counts = changelist.get_facets(self)
+        return {f"{i}__c": counts.get(str(lookup), 0) for i, (lookup, title) in enumerate(self.lookup_choices)}
+
+
+class FacetedBooleanFieldListFilter(BooleanFieldListFilter):
+    def get_active_q(self):
+        return build_q_object_from_lookup_parameters(self.used_parameters)
+
+    def get_facet_expression(self):
+        return Case(
+            When(**{self.field_path: True}, then=Value("true")),
+            When(**{self.field_path: False}, then=Value("false")),
+            default=Value("null"),
+        )
+
+    def get_facet_queryset(self, changelist):
+        counts = changelist.get_facets(self)
+        return {f"{key}__c": counts.get(key, 0) for key in ("true", "false", "null")}
+
+
+class FacetedChangeList(ChangeList):
+    """
+    Yon paneldagi barcha filtrlar variantlari soni bitta so'rovda (har filtr uchun GROUP BY, UNION ALL) hisoblanadi.
+    Har bir filtr sanog'i qolgan faol filtrlarni hisobga oladi, o'zinikini esa yo'q.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.request = request
+        self._facets = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_active_q(self, spec, queryset):
+        if hasattr(spec, "get_active_q"):
+            return spec.get_active_q()
+        if isinstance(spec, FieldListFilter):
+            return build_q_object_from_lookup_parameters(spec.used_parameters)
+        if spec.value() is None:
+            return Q()
+        return Q(pk__in=spec.queryset(self.request, queryset).values("pk"))
+
+    def get_facets(self, spec):
+        if self._facets is None:
+            specs = self.filter_specs
+            # asos - filtrsiz (faqat ko'rish doirasi va qidiruv) queryset; get_queryset(exclude_parameters=...)
+            # faqat bitta filtrni chiqarib tashlay oladi, bu yerda esa barcha filtrlar Q sifatida qo'shiladi
+            queryset = self.root_queryset
+            if self.query:
+                queryset = self.model_admin.get_search_results(self.request, queryset, self.query)[0]
+            queryset = queryset.order_by()
+
+            active = [self.get_active_q(item, queryset) for item in specs]
+            groups = [
+                queryset.filter(*(q for j, q in enumerate(active) if j != i))
+                .annotate(facet=Value(i), value=item.get_facet_expression())
+                .values("facet", "value").annotate(count=Count("pk")).order_by()
+                for i, item in enumerate(specs) if hasattr(item, "get_facet_expression")
+            ]
+            self._facets = {}
+            if groups:
+                for row in groups[0].union(*groups[1:], all=True):
+                    self._facets.setdefault(row["facet"], {})[row["value"]] = row["count"]
+        return self._facets.get(self.filter_specs.index(spec), {})
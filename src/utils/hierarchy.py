@@ -0,0 +1,113 @@
+"""
+Patient, Doctor, Inspector (mahalladan) va Psychiatrist (tumandan) dagi district/region nusxalari.
+Saqlashda pre_save signalida, mahalla yoki tuman boshqa joyga ko'chirilganda post_save signalida,
+mavjud yozuvlar uchun esa fill_hierarchy (backfill_hierarchy buyrug'i) bilan to'ldiriladi.
+"""
+from django.apps import apps
+
+# tuman va viloyat mahalladan olinadi; Psychiatrist'da faqat viloyat, tumandan
+NEIGHBORHOOD_MODELS = ("psytracks.Patient", "psytracks.Doctor", "utils.Inspector")
+DISTRICT_MODELS = NEIGHBORHOOD_MODELS + ("psytracks.Psychiatrist",)
+
+
+def get_neighborhood_map(neighborhood_model, ids=None):
+    """
+    {neighborhood_id: (district_id, region_id)}
+    """
+    queryset = neighborhood_model.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return {pk: (district_id, region_id)
+            for pk, district_id, region_id in queryset.values_list("pk", "district_id", "district__region_id")}
+
+
+def get_district_map(district_model, ids=None):
+    """
+    {district_id: (district_id, region_id)}
+    """
+    queryset = district_model.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return {pk: (pk, region_id) for pk, region_id in queryset.values_list("pk", "region_id")}
+
+
+def get_source_field(model):
+    return "neighborhood" if model._meta.label in NEIGHBORHOOD_MODELS else "district"
+
+
+def set_hierarchy(objs, hierarchy_map):
+    """
+    objs ning district/region maydonlarini hierarchy_map bo'yicha to'ldiradi, o'zgarganlarini qaytaradi.
+    """
+    changed = []
+    for obj in objs:
+        source = get_source_field(type(obj))
+        district_id, region_id = hierarchy_map.get(getattr(obj, f"{source}_id"), (None, None))
+        if source == "district":
+            district_id = obj.district_id
+        if (obj.district_id, obj.region_id) != (district_id, region_id):
+            obj.district_id, obj.region_id = district_id, region_id
+            changed.append(obj)
+    return changed
+
+
+def get_hierarchy_map(model, objs):
+    source = get_source_field(model)
+    ids = {getattr(obj, f"{source}_id") for obj in objs}
+    if source == "neighborhood":
+        return get_neighborhood_map(apps.get_model("utils.Neighborhood"), ids)
+    return get_district_map(apps.get_model("utils.District"), ids)
+
+
+def hierarchy_fields(model):
+    return ["district", "region"] if get_source_field(model) == "neighborhood" else ["region"]
+
+
+def fill_hierarchy(model, hierarchy_map, batch_size=1000):
+    """
+    Mavjud yozuvlarni pk bo'yicha bo'laklab to'ldiradi, faqat o'zgarganlarini yozadi.
+    hierarchy_map - get_neighborhood_map() yoki get_district_map().
+    """
+    source = get_source_field(model)
+    fields = hierarchy_fields(model)
+    queryset = model.objects.only("pk", f"{source}_id", *fields).order_by("pk")
+    updated = 0
+    last_pk = None
+    while True:
+        batch = queryset.filter(pk__gt=last_pk) if last_pk is not None else queryset
+        objs = list(batch[:batch_size])
+        if not objs:
+            return updated
+        last_pk = objs[-1].pk
+        changed = set_hierarchy(objs, hierarchy_map)
+        if changed:
+            updated += model.objects.bulk_update(changed, fields)
+
+
+def set_instance_hierarchy(sender, instance, **kwargs):
+    set_hierarchy([instance], get_hierarchy_map(sender, [instance]))
+
+
+def neighborhood_moved(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Mahalla boshqa tumanga o'tkazilganda uning bemorlari, shifokorlari va inspektori ham ko'chadi.
+    """
+    if created or raw:
+        return
+    district_id, region_id = get_neighborhood_map(sender, [instance.pk]).get(instance.pk, (None, None))
+    for label in NEIGHBORHOOD_MODELS:
+        apps.get_model(label).objects.filter(neighborhood_id=instance.pk).exclude(
+            district_id=district_id, region_id=region_id
+        ).update(district_id=district_id, region_id=region_id)
+
+
+def district_moved(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Tuman boshqa viloyatga o'tkazilganda unga bog'langan yozuvlarning region_id si yangilanadi.
+    """
+    if created or raw:
+        return
+    for label in DISTRICT_MODELS:
+        apps.get_model(label).objects.filter(district_id=instance.pk).exclude(
+            region_id=instance.region_id
+        ).update(region_id=instance.region_id)
@@ -0,0 +1,89 @@
+import traceback
+
+from django.contrib import admin
+from django.core.files import File
+from django.db.models import Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+from psytracks.exports import export_patients_xlsx
+from users.principal import get_principal
+from psytracks.models import Patient
+from utils.exports import export_monitoring_xlsx, make_export_file
+from utils.models import ExportJob, ExportKind, ExportStatus, DistrictMonitoring
+
+EXPORTERS = {
+    ExportKind.PATIENTS: (Patient, export_patients_xlsx),
+    ExportKind.MONITORING: (DistrictMonitoring, export_monitoring_xlsx),
+}
+
+
+def enqueue_export(request, kind, params=None, columns=None):
+    params = request.GET if params is None else params
+    return ExportJob.objects.create(user=request.user, kind=kind, params=params.urlencode(), columns=columns or [])
+
+
+def get_job_queryset(job):
+    """
+    Eksport so'rovi yuborilgan paytdagi changelist filtrlari va foydalanuvchi doirasini qayta tiklaydi.
+    """
+    model = EXPORTERS[job.kind][0]
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = "/"
+    request.GET = QueryDict(job.params)
+    request.user = job.user
+    request.principal = get_principal(job.user)
+    return admin.site._registry[model].get_changelist_instance(request).queryset
+
+
+def claim_next_job():
+    for job in ExportJob.objects.filter(status=ExportStatus.PENDING).order_by("created_at"):
+        # boshqa worker olib ulgurgan bo'lsa, update 0 qaytaradi
+        now = timezone.now()
+        if ExportJob.objects.filter(pk=job.pk, status=ExportStatus.PENDING).update(
+            status=ExportStatus.RUNNING, heartbeat_at=now
+        ):
+            job.status, job.heartbeat_at = ExportStatus.RUNNING, now
+            return job
+    return None
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Worker'i to'xtab qolgan (heartbeat_at stale_after'dan eski) ishlarni qayta navbatga qo'yadi;
+    boshqa worker hozir bajarayotgan ishlarga tegilmaydi.
+    """
+    stale = Q(heartbeat_at__lt=timezone.now() - stale_after) | Q(heartbeat_at__isnull=True)
+    return ExportJob.objects.filter(stale, status=ExportStatus.RUNNING).update(
+        status=ExportStatus.PENDING, written=0, heartbeat_at=None
+    )
+
+
+def run_export_job(job):
+    export = EXPORTERS[job.kind][1]
+
+    def progress(written):
+        ExportJob.objects.filter(pk=job.pk).update(written=written, heartbeat_at=timezone.now())
+
+    try:
+        queryset = get_job_queryset(job)
+        job.total = queryset.count()
+        job.written = 0
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=["total", "written", "heartbeat_at"])
+
+        with make_export_file() as output:
+            options = {"columns": job.columns} if job.columns else {}
+            export(queryset, output, progress, **options)
+            output.seek(0)
+            job.file.save(job.download_name, File(output), save=False)
+    except Exception:
+        job.status = ExportStatus.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = ExportStatus.DONE
+        job.written = job.total
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "written", "file", "error", "finished_at"])
+    return job
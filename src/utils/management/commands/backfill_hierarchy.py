@@ -0,0 +1,21 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from utils.hierarchy import DISTRICT_MODELS, NEIGHBORHOOD_MODELS, fill_hierarchy, get_district_map, get_neighborhood_map
+from utils.models import District, Neighborhood
+
+
+class Command(BaseCommand):
+    help = "Recalculate the denormalized district/region columns of patients, doctors, inspectors and psychiatrists"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        neighborhoods = get_neighborhood_map(Neighborhood)
+        districts = get_district_map(District)
+        for label in DISTRICT_MODELS:
+            model = apps.get_model(label)
+            hierarchy_map = neighborhoods if label in NEIGHBORHOOD_MODELS else districts
+            updated = fill_hierarchy(model, hierarchy_map, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.verbose_name_plural}: {updated} updated"))
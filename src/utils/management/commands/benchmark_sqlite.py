@@ -0,0 +1,130 @@
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_SQL = ("SELECT id, full_name, deadline FROM psytracks_patient WHERE district_id = ? "
+            "ORDER BY deadline, id LIMIT 100")
+COUNT_SQL = "SELECT COUNT(*) FROM psytracks_patient WHERE district_id = ?"
+SELECT_SQL = "SELECT id, last_home_visit_by_doctor_date FROM psytracks_patient WHERE id = ?"
+UPDATE_SQL = "UPDATE psytracks_patient SET last_home_visit_by_doctor_date = ? WHERE id = ?"
+
+
+def get_profiles(database):
+    """
+    {nom: (pragmalar, busy timeout soniya, tranzaksiya rejimi)}: Django standart sozlamalari va settings'dagi profil.
+    """
+    options = database.get("OPTIONS", {})
+    return {
+        "default": ({"journal_mode": "DELETE", "synchronous": "FULL"}, 5, "DEFERRED"),
+        "tuned": (settings.SQLITE_PRAGMAS, options.get("timeout", 5), options.get("transaction_mode", "DEFERRED")),
+    }
+
+
+def connect(path, pragmas, timeout):
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, profile, deadline, operation, params):
+        super().__init__(daemon=True)
+        self.path, self.profile, self.deadline = path, profile, deadline
+        self.operation, self.params = operation, params
+        self.latencies, self.errors = [], 0
+
+    def run(self):
+        pragmas, timeout, mode = self.profile
+        conn = connect(self.path, pragmas, timeout)
+        rng = random.Random(self.ident)
+        while time.monotonic() < self.deadline:
+            start = time.monotonic()
+            try:
+                self.operation(conn, mode, rng.choice(self.params))
+            except sqlite3.OperationalError:
+                # "database is locked": busy timeout tugadi yoki DEFERRED tranzaksiya yozishga o'ta olmadi
+                self.errors += 1
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            else:
+                self.latencies.append(time.monotonic() - start)
+        conn.close()
+
+
+def read(conn, mode, district_id):
+    conn.execute(READ_SQL, [district_id]).fetchall()
+    conn.execute(COUNT_SQL, [district_id]).fetchone()
+
+
+def write(conn, mode, patient_id):
+    # admin o'zgartirish formasi kabi: tranzaksiya ichida o'qish, keyin yozish
+    conn.execute(f"BEGIN {mode}")
+    conn.execute(SELECT_SQL, [patient_id]).fetchone()
+    conn.execute(UPDATE_SQL, [datetime.date.today().isoformat(), patient_id])
+    conn.execute("COMMIT")
+
+
+def summarize(workers, seconds):
+    latencies = sorted(value for worker in workers for value in worker.latencies)
+    errors = sum(worker.errors for worker in workers)
+    if not latencies:
+        return f"{0:>9.1f} {'-':>9} {'-':>9} {errors:>7}"
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return (f"{len(latencies) / seconds:>9.1f} {statistics.median(latencies) * 1000:>9.2f} "
+            f"{p95 * 1000:>9.2f} {errors:>7}")
+
+
+class Command(BaseCommand):
+    help = ("Compare concurrent read/write throughput of a copy of the SQLite database with Django's default "
+            "settings and with the tuned profile from settings (WAL, busy timeout, IMMEDIATE transactions). "
+            "Readers load a district patient page, writers edit single patients inside a transaction.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            raise CommandError("The benchmark runs against SQLite databases only")
+        seconds = options["seconds"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmark.sqlite3")
+            with closing(sqlite3.connect(str(connection.settings_dict["NAME"]))) as source, \
+                    closing(sqlite3.connect(path)) as target:
+                source.backup(target)
+            with closing(sqlite3.connect(path)) as conn:
+                district_ids = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT district_id FROM psytracks_patient WHERE district_id IS NOT NULL")]
+                patient_ids = [row[0] for row in conn.execute("SELECT id FROM psytracks_patient")]
+            if not district_ids or not patient_ids:
+                raise CommandError("The database has no patients to benchmark with")
+
+            self.stdout.write(f"{options['readers']} readers, {options['writers']} writers, {seconds:g}s per profile")
+            self.stdout.write(f"{'':<16} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+            for name, profile in get_profiles(connection.settings_dict).items():
+                # journal_mode fayl darajasida saqlanadi, shuning uchun har profil o'zinikini o'rnatadi
+                connect(path, profile[0], profile[1]).close()
+                deadline = time.monotonic() + seconds
+                readers = [Worker(path, profile, deadline, read, district_ids) for _ in range(options["readers"])]
+                writers = [Worker(path, profile, deadline, write, patient_ids) for _ in range(options["writers"])]
+                for worker in readers + writers:
+                    worker.start()
+                for worker in readers + writers:
+                    worker.join()
+                self.stdout.write(f"{name + ' reads':<16} {summarize(readers, seconds)}")
+                self.stdout.write(f"{name + ' writes':<16} {summarize(writers, seconds)}")
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from psytracks.models import Patient, overdue_q
+from utils.models import District
+from utils.stats import patient_counters
+
+PAGE = 100
+
+
+def get_queries(district, today):
+    """
+    Admin ro'yxati, dashboard va monitoring sahifalaridagi Patient so'rovlari shakli (nom, queryset).
+    """
+    scoped = Patient.objects.filter(district=district)
+    sample = scoped.values("inspector_id", "psychiatrist_id").first()
+    queries = [
+        ("district list", scoped.order_by("-pk")[:PAGE]),
+        ("district list by deadline", scoped.order_by("deadline", "pk")[:PAGE]),
+        ("district overdue", scoped.filter(overdue_q(today)).order_by("-pk")[:PAGE]),
+        ("district aggressive overdue", scoped.filter(overdue_q(today), is_aggressive=True).order_by("-pk")[:PAGE]),
+        ("district convicted", scoped.filter(is_convicted=True).order_by("-pk")[:PAGE]),
+        ("district abroad", scoped.filter(is_abroad_long_term=True).order_by("-pk")[:PAGE]),
+        ("region stats by district",
+         Patient.objects.filter(region_id=district.region_id).order_by()
+         .values("district_id").annotate(**patient_counters(today))),
+        ("district stats by neighborhood",
+         scoped.order_by().values("neighborhood_id").annotate(**patient_counters(today))),
+        ("order by last appointment", Patient.objects.order_by("last_psychiatric_appointment_date", "pk")[:PAGE]),
+        ("order by last home visit", Patient.objects.order_by("-last_home_visit_by_doctor_date", "-pk")[:PAGE]),
+        ("order by hospitalization from", Patient.objects.order_by("last_hospitalization_from", "pk")[:PAGE]),
+        ("order by hospitalization to", Patient.objects.order_by("last_hospitalization_to", "pk")[:PAGE]),
+        ("keyset by full name", Patient.objects.filter(full_name__gt="M").order_by("full_name", "pk")[:PAGE]),
+    ]
+    if sample:
+        queries += [
+            ("inspector list by deadline",
+             Patient.objects.filter(inspector_id=sample["inspector_id"]).order_by("deadline", "pk")[:PAGE]),
+            ("psychiatrist list by deadline",
+             Patient.objects.filter(psychiatrist_id=sample["psychiatrist_id"]).order_by("deadline", "pk")[:PAGE]),
+        ]
+    return queries
+
+
+def get_index_names(cursor):
+    """
+    Patient jadvalining barcha ikkilamchi indekslari: Meta.indexes, db_index=True va tashqi kalit ustunlari,
+    migratsiyada qo'shilganlari ham. Birlamchi kalit va unique cheklovlar kirmaydi.
+    """
+    constraints = connection.introspection.get_constraints(cursor, Patient._meta.db_table)
+    return sorted(
+        name for name, info in constraints.items()
+        if info["index"] and not info["primary_key"] and not info["unique"] and not name.startswith("sqlite_autoindex")
+    )
+
+
+class Command(BaseCommand):
+    help = ("Print EXPLAIN for the Patient queries used by the admin, dashboards and monitoring. "
+            "With --compare all secondary Patient indexes (Meta indexes, db_index columns and foreign keys) are "
+            "dropped inside a rolled back transaction first, so the plans are shown without and with them "
+            "(this locks the table for the duration).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--district", type=int, help="District id used for the scoped queries")
+        parser.add_argument("--analyze", action="store_true", help="Run the queries (PostgreSQL EXPLAIN ANALYZE)")
+        parser.add_argument("--compare", action="store_true", help="Also show the plans without any secondary Patient index")
+
+    def handle(self, *args, **options):
+        districts = District.objects.order_by("pk")
+        district = districts.filter(pk=options["district"]).first() if options["district"] else districts.first()
+        if district is None:
+            raise CommandError("District not found")
+        explain_options = {"analyze": True} if options["analyze"] and connection.vendor == "postgresql" else {}
+        today = timezone.now().date()
+
+        if options["compare"]:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for name in get_index_names(cursor):
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+                self.explain("without indexes", district, today, explain_options)
+                transaction.set_rollback(True)
+        self.explain("with indexes" if options["compare"] else "", district, today, explain_options)
+
+    def explain(self, title, district, today, explain_options):
+        for name, queryset in get_queries(district, today):
+            heading = f"{name} ({title})" if title else name
+            self.stdout.write(self.style.MIGRATE_HEADING(heading))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write("")
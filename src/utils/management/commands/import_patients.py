@@ -0,0 +1,280 @@
+import csv
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from openpyxl import load_workbook
+
+from psytracks.models import Patient, Psychiatrist, ReasonForSpecialConsideration, ReceivingSupportiveTherapyChoices, \
+    SocialDomesticEnvironment, AlcoholAndDrugUse, WhereIsNow
+from utils.models import Neighborhood, District
+
+# Jadval ustunlari (0 dan boshlab)
+FULL_NAME, PINFL, BIRTH_DATE, DISTRICT, NEIGHBORHOOD, ADDRESS, REASON_FOR_SPECIAL_CONSIDERATION, \
+    LAST_PSYCHIATRIC_APPOINTMENT, LAST_HOME_VISIT, REASON, RECEIVING_SUPPORTIVE_THERAPY, SOCIAL_DOMESTIC_ENVIRONMENT, \
+    ALCOHOL_AND_DRUG_USE, HOSPITALIZATION_FROM, HOSPITALIZATION_TO, WHERE_IS_NOW, DESCRIPTION_WHERE_IS_NOW, \
+    PSYCHIATRIST = range(1, 19)
+
+IMPORT_FIELDS = ("full_name", "birth_date", "address", "last_psychiatric_appointment_date",
+                 "last_home_visit_by_doctor_date", "last_hospitalization_from", "last_hospitalization_to", "reason",
+                 "description_where_is_now", "reason_for_special_consideration_id", "social_domestic_environment_id",
+                 "receiving_supportive_therapy", "alcohol_and_drug_use", "where_is_now", "neighborhood_id",
+                 "psychiatrist_id", "inspector_id")
+
+
+def clean_text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def parse_date(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.datetime.strptime(str(value).strip(), "%d.%m.%Y").date()
+    except ValueError:
+        raise ValueError(f"noto'g'ri sana: {value}")
+
+
+def get_receiving_supportive_therapy(value):
+    if value is None:
+        return ""
+    if value == "Мунтазам олаяпти" or value == "Мунтазам оляпти":
+        return ReceivingSupportiveTherapyChoices.REGULARLY_RECEIVING
+    elif value == "Камдан кам олаяпти":
+        return ReceivingSupportiveTherapyChoices.RERALY_RECEIVING
+    elif value == "Олмаяпти":
+        return ReceivingSupportiveTherapyChoices.NOT_RECEIVING
+    else:
+        return ReceivingSupportiveTherapyChoices.QUICKLY_RECEIVING
+
+
+def get_alcohol_and_drug_use(value):
+    if value is None:
+        return ""
+    if value == "Истеъмол қилмайди":
+        return AlcoholAndDrugUse.NOT_CONSUME
+    else:
+        return AlcoholAndDrugUse.AlCOHOL
+
+
+def get_where_is_now(value):
+    if value is None:
+        return ""
+    if value == "Уйда":
+        return WhereIsNow.AT_HOME
+    elif value == "Шифохонада":
+        return WhereIsNow.IN_HOSPITAL
+    elif value == "Ҳудудидан чиқиб кетган":
+        return WhereIsNow.OUT_OF_THE_AREA
+    else:
+        return WhereIsNow.ADDRESS_UNKNOWN
+
+
+class Lookups:
+    """
+    Import davomida kerak bo'ladigan ma'lumotnomalar bir marta o'qilib, xotirada saqlanadi.
+    """
+
+    def __init__(self, region=None):
+        districts = District.objects.all()
+        if region:
+            districts = districts.filter(region_id=region)
+        self.districts = {}
+        for pk, name in districts.values_list("id", "name"):
+            self.districts.setdefault(name.strip(), []).append(pk)
+
+        self.neighborhoods = {
+            (district_id, name.strip()): (pk, inspector_id)
+            for pk, district_id, name, inspector_id in Neighborhood.objects.filter(
+                district__in=districts
+            ).values_list("id", "district_id", "name", "inspector")
+        }
+        self.psychiatrists = {
+            (district_id, full_name.strip()): pk
+            for pk, district_id, full_name in Psychiatrist.objects.filter(
+                district__in=districts
+            ).values_list("id", "district_id", "full_name")
+        }
+        self.reasons = {name.strip(): pk for name, pk in ReasonForSpecialConsideration.objects.values_list("name", "id")}
+        self.environments = {name.strip(): pk for name, pk in SocialDomesticEnvironment.objects.values_list("name", "id")}
+
+    def get_district(self, name):
+        ids = self.districts.get(name, [])
+        if not ids:
+            raise ValueError(f"tuman topilmadi: {name}")
+        if len(ids) > 1:
+            raise ValueError(f"tuman nomi bir nechta viloyatda bor, --region ni ko'rsating: {name}")
+        return ids[0]
+
+    def add_missing(self, model, names, dry_run):
+        cache = self.reasons if model is ReasonForSpecialConsideration else self.environments
+        missing = sorted(set(names) - cache.keys())
+        if missing and not dry_run:
+            model.objects.bulk_create([model(name=name) for name in missing])
+            cache.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+        return missing
+
+
+class Command(BaseCommand):
+    help = "Import patients from an XLSX sheet, updating existing ones by PINFL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="ruhiy-kasallar.xlsx")
+        parser.add_argument("--start-row", type=int, default=4, help="First data row of the sheet")
+        parser.add_argument("--region", type=int, default=None, help="Match district names only inside this region id")
+        parser.add_argument("--aggressive", action="store_true",
+                            help="Mark every imported patient as aggressive. The old create_patients command always "
+                                 "did this; now patients keep their current flag unless this option is given")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Validate the sheet and report errors without saving")
+        parser.add_argument("--report", default=None, help="Write the error report to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            wb = load_workbook(options["path"], read_only=True, data_only=True)
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {options['path']}")
+        dry_run = options["dry_run"]
+
+        lookups = Lookups(options["region"])
+        rows, errors = self.read_rows(wb.active, options["start_row"], lookups)
+        wb.close()
+
+        for model, key in ((ReasonForSpecialConsideration, "reason_for_special_consideration"),
+                           (SocialDomesticEnvironment, "social_domestic_environment")):
+            missing = lookups.add_missing(model, {row[key] for _, row in rows if row[key]}, dry_run)
+            if missing:
+                self.stdout.write(f"{model._meta.verbose_name}: {len(missing)} new")
+
+        created = updated = unchanged = 0
+        batch_size = options["batch_size"]
+        for start in range(0, len(rows), batch_size):
+            with transaction.atomic():
+                c, u, n = self.save_batch(rows[start:start + batch_size], lookups, options["aggressive"], dry_run)
+            created += c
+            updated += u
+            unchanged += n
+
+        self.write_report(errors, options["report"])
+        prefix = "Dry run: " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{created} created, {updated} updated, {unchanged} unchanged, {len(errors)} rows with errors"
+        ))
+
+    def read_rows(self, ws, start_row, lookups):
+        rows, errors = [], []
+        seen = {}
+        for number, row in enumerate(ws.iter_rows(min_row=start_row, values_only=True), start=start_row):
+            row = tuple(row) + (None,) * (PSYCHIATRIST + 1 - len(row))
+            if row[FULL_NAME] is None:
+                break
+            pinfl = clean_text(row[PINFL])
+            try:
+                if not pinfl:
+                    raise ValueError("PINFL ko'rsatilmagan")
+                if pinfl in seen:
+                    raise ValueError(f"PINFL {seen[pinfl]}-qatorda takrorlangan")
+                seen[pinfl] = number
+                rows.append((number, self.parse_row(row, pinfl, lookups)))
+            except ValueError as e:
+                errors.append((number, pinfl, str(e)))
+        return rows, errors
+
+    def parse_row(self, row, pinfl, lookups):
+        district_id = lookups.get_district(clean_text(row[DISTRICT]))
+        neighborhood_name = clean_text(row[NEIGHBORHOOD])
+        neighborhood = lookups.neighborhoods.get((district_id, neighborhood_name))
+        if neighborhood is None:
+            raise ValueError(f"mahalla topilmadi: {neighborhood_name}")
+        neighborhood_id, inspector_id = neighborhood
+        if inspector_id is None:
+            raise ValueError(f"mahallaga inspektor biriktirilmagan: {neighborhood_name}")
+        psychiatrist_name = clean_text(row[PSYCHIATRIST])
+        psychiatrist_id = lookups.psychiatrists.get((district_id, psychiatrist_name))
+        if psychiatrist_name and psychiatrist_id is None:
+            raise ValueError(f"psixiatr topilmadi: {psychiatrist_name}")
+
+        return {
+            "pinfl": pinfl,
+            "full_name": clean_text(row[FULL_NAME]),
+            "birth_date": parse_date(row[BIRTH_DATE]),
+            "address": clean_text(row[ADDRESS]),
+            "last_psychiatric_appointment_date": parse_date(row[LAST_PSYCHIATRIC_APPOINTMENT]),
+            "last_home_visit_by_doctor_date": parse_date(row[LAST_HOME_VISIT]),
+            "last_hospitalization_from": parse_date(row[HOSPITALIZATION_FROM]),
+            "last_hospitalization_to": parse_date(row[HOSPITALIZATION_TO]),
+            "reason": clean_text(row[REASON]),
+            "description_where_is_now": clean_text(row[DESCRIPTION_WHERE_IS_NOW]),
+            "reason_for_special_consideration": clean_text(row[REASON_FOR_SPECIAL_CONSIDERATION]),
+            "social_domestic_environment": clean_text(row[SOCIAL_DOMESTIC_ENVIRONMENT]),
+            "receiving_supportive_therapy": get_receiving_supportive_therapy(clean_text(row[RECEIVING_SUPPORTIVE_THERAPY])),
+            "alcohol_and_drug_use": get_alcohol_and_drug_use(clean_text(row[ALCOHOL_AND_DRUG_USE])),
+            "where_is_now": get_where_is_now(clean_text(row[WHERE_IS_NOW])),
+            "neighborhood_id": neighborhood_id,
+            "psychiatrist_id": psychiatrist_id,
+            "inspector_id": inspector_id,
+        }
+
+    def save_batch(self, rows, lookups, aggressive, dry_run):
+        existing = {}
+        for patient in Patient.objects.filter(pinfl__in=[row["pinfl"] for _, row in rows]).order_by("-pk"):
+            existing[patient.pinfl] = patient
+
+        to_create, to_update = [], []
+        fields = list(IMPORT_FIELDS)
+        if aggressive:
+            fields += ["is_aggressive", "max_examination_interval"]
+
+        for _, row in rows:
+            values = dict(row)
+            reason = values.pop("reason_for_special_consideration")
+            environment = values.pop("social_domestic_environment")
+            values["reason_for_special_consideration_id"] = lookups.reasons.get(reason) if reason else None
+            values["social_domestic_environment_id"] = lookups.environments.get(environment) if environment else None
+
+            patient = existing.get(values["pinfl"])
+            is_new = patient is None
+            if is_new:
+                patient = Patient(pinfl=values["pinfl"])
+            old = {field: getattr(patient, field) for field in fields}
+            for field in IMPORT_FIELDS:
+                setattr(patient, field, values[field])
+            if aggressive:
+                patient.is_aggressive = True
+                # Patient.save() dagi qoida: tajovuzkor bemor kamida 30 kunda bir ko'rilishi kerak
+                if not (patient.max_examination_interval and patient.max_examination_interval <= 30):
+                    patient.max_examination_interval = 30
+
+            if is_new:
+                to_create.append(patient)
+            elif old != {field: getattr(patient, field) for field in fields}:
+                to_update.append(patient)
+
+        if not dry_run:
+            Patient.objects.bulk_create(to_create)
+            Patient.objects.bulk_update(to_update, fields)
+        return len(to_create), len(to_update), len(rows) - len(to_create) - len(to_update)
+
+    def write_report(self, errors, path):
+        if not errors:
+            return
+        if path:
+            with open(path, "w", newline="", encoding="utf-8-sig") as f:
+                self.write_errors(csv.writer(f), errors)
+            self.stdout.write(f"Error report saved to {path}")
+        else:
+            self.write_errors(csv.writer(sys.stderr), errors)
+
+    def write_errors(self, writer, errors):
+        writer.writerow(["row", "pinfl", "error"])
+        writer.writerows(errors)
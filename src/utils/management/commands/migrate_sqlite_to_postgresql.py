@@ -0,0 +1,195 @@
+import hashlib
+import io
+import json
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.migrations.recorder import MigrationRecorder
+
+SOURCE_ALIAS = "sqlite_source"
+PROGRESS_TABLE = "sqlite_migration_progress"
+
+
+def add_source_database(path):
+    """
+    SQLite fayli uchun vaqtinchalik alias: o'qish ORM konvertorlari bilan (tekshiruv) va faqat o'qish rejimida.
+    """
+    database = {"ENGINE": "django.db.backends.sqlite3", "NAME": path, "OPTIONS": {"init_command": "PRAGMA query_only=1"}}
+    connections.settings[SOURCE_ALIAS] = connections.configure_settings({DEFAULT_DB_ALIAS: database})[DEFAULT_DB_ALIAS]
+    return connections[SOURCE_ALIAS]
+
+
+def get_models():
+    """
+    Ko'chiriladigan modellar (M2M oraliq jadvallari bilan) tashqi kalitlar bo'yicha tartibda: avval bog'lanilgan jadval.
+    Aylanma bog'lanishlar oxirida qo'shiladi.
+    """
+    candidates, tables = {}, set()
+    for model in sorted(apps.get_models(include_auto_created=True), key=lambda m: m._meta.label):
+        if model._meta.proxy or not model._meta.managed or model._meta.db_table in tables:
+            continue
+        tables.add(model._meta.db_table)
+        candidates[model] = {
+            field.related_model._meta.concrete_model for field in model._meta.concrete_fields
+            if field.is_relation and field.related_model._meta.concrete_model is not model
+        }
+
+    ordered = []
+    while candidates:
+        ready = [model for model, parents in candidates.items() if not parents & candidates.keys()]
+        for model in ready or list(candidates):
+            ordered.append(model)
+            del candidates[model]
+    return ordered
+
+
+def copy_value(value, field):
+    """
+    SQLite qiymatini COPY matn formatiga o'tkazadi.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(field, models.BooleanField):
+        return "t" if value else "f"
+    if isinstance(field, models.DurationField):
+        # SQLite'da mikrosekundlarda saqlanadi
+        return f"{value} microseconds"
+    if isinstance(value, bytes):
+        return "\\\\x" + value.hex()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def table_checksum(model, alias, batch_size):
+    """
+    (qatorlar soni, tartibga bog'liq bo'lmagan checksum). Qiymatlar ORM orqali o'qiladi, shuning uchun
+    SQLite va PostgreSQL'dagi bir xil ma'lumot bir xil Python qiymatlarini beradi.
+    """
+    fields = [field.attname for field in model._meta.concrete_fields]
+    count = total = 0
+    rows = model._base_manager.using(alias).order_by().values_list(*fields).iterator(chunk_size=batch_size)
+    for row in rows:
+        digest = hashlib.md5(json.dumps(row, sort_keys=True, default=str).encode()).digest()
+        total = (total + int.from_bytes(digest, "big")) % 2 ** 128
+        count += 1
+    return count, f"{total:032x}"
+
+
+class Command(BaseCommand):
+    help = ("Copy an SQLite database into the PostgreSQL database configured in settings. Tables are streamed in "
+            "foreign key order in primary key batches and loaded with COPY; each batch is committed together with "
+            "its progress, so an interrupted run continues where it stopped and a later run also picks up rows "
+            "added since. Stop writes to the SQLite database before the final run: updated or deleted rows are "
+            "only detected by the verification. Run 'migrate' on both databases first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default=str(settings.BASE_DIR / "db.sqlite3"), help="SQLite database file")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Target PostgreSQL database alias")
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--restart", action="store_true", help="Forget the progress and copy everything again")
+        parser.add_argument("--verify-only", action="store_true", help="Only compare row counts and checksums")
+
+    def handle(self, *args, **options):
+        target = connections[options["database"]]
+        if target.vendor != "postgresql":
+            raise CommandError(f"Database '{options['database']}' is not PostgreSQL")
+        if not Path(options["source"]).is_file():
+            raise CommandError(f"SQLite database {options['source']} not found")
+        source = add_source_database(options["source"])
+        self.check_migrations(source, target)
+        model_list = get_models()
+
+        if not options["verify_only"]:
+            self.prepare(target, model_list, options["restart"])
+            for model in model_list:
+                self.copy_table(model, source, target, options["batch_size"])
+            with target.cursor() as cursor:
+                for sql in target.ops.sequence_reset_sql(no_style(), model_list):
+                    cursor.execute(sql)
+            self.stdout.write("Sequences reset")
+
+        failed = []
+        for model in model_list:
+            expected = table_checksum(model, SOURCE_ALIAS, options["batch_size"])
+            actual = table_checksum(model, options["database"], options["batch_size"])
+            line = f"{model._meta.db_table}: {expected[0]} rows"
+            if expected == actual:
+                self.stdout.write(f"{line}, checksum OK")
+            else:
+                failed.append(model._meta.db_table)
+                self.stderr.write(f"{line} in SQLite, {actual[0]} in PostgreSQL, checksum mismatch")
+        if failed:
+            raise CommandError(f"Verification failed for: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(model_list)} tables verified"))
+
+    def check_migrations(self, source, target):
+        source_applied = set(MigrationRecorder(source).applied_migrations())
+        target_applied = set(MigrationRecorder(target).applied_migrations())
+        if source_applied != target_applied:
+            missing = sorted(source_applied ^ target_applied)[:5]
+            raise CommandError(f"Both databases must be migrated to the same state, differences: {missing}")
+
+    def prepare(self, target, model_list, restart):
+        quote = target.ops.quote_name
+        with transaction.atomic(using=target.alias), target.cursor() as cursor:
+            if restart:
+                cursor.execute(f"DROP TABLE IF EXISTS {quote(PROGRESS_TABLE)}")
+            if PROGRESS_TABLE in target.introspection.table_names(cursor):
+                return
+            cursor.execute(f"CREATE TABLE {quote(PROGRESS_TABLE)} "
+                           "(table_name text PRIMARY KEY, last_pk text NOT NULL, copied bigint NOT NULL)")
+            # migrate yaratgan contenttypes, ruxsatlar va boshqa boshlang'ich yozuvlar SQLite'dagilar bilan almashtiriladi
+            tables = [model._meta.db_table for model in model_list]
+            for sql in target.ops.sql_flush(no_style(), tables):
+                cursor.execute(sql)
+
+    def copy_table(self, model, source, target, batch_size):
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        opts = model._meta
+        fields = opts.concrete_fields
+        quote = target.ops.quote_name
+        columns = ", ".join(quote(field.column) for field in fields)
+        pk_column = quote(opts.pk.column)
+        select = f"SELECT {columns} FROM {quote(opts.db_table)} %s ORDER BY {pk_column} LIMIT %%s"
+        copy_sql = f"COPY {quote(opts.db_table)} ({columns}) FROM STDIN"
+        pk_index = fields.index(opts.pk)
+
+        with target.cursor() as cursor:
+            cursor.execute(f"SELECT last_pk, copied FROM {quote(PROGRESS_TABLE)} WHERE table_name = %s",
+                           [opts.db_table])
+            row = cursor.fetchone()
+        last_pk, copied = (json.loads(row[0]), row[1]) if row else (None, 0)
+        start = copied
+
+        while True:
+            with source.cursor() as cursor:
+                if last_pk is None:
+                    cursor.execute(select % "", [batch_size])
+                else:
+                    cursor.execute(select % f"WHERE {pk_column} > %s", [last_pk, batch_size])
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            data = "".join(
+                "\t".join(copy_value(value, field) for value, field in zip(row, fields)) + "\n" for row in rows
+            )
+            last_pk = rows[-1][pk_index]
+            copied += len(rows)
+            with transaction.atomic(using=target.alias), target.cursor() as cursor:
+                if is_psycopg3:
+                    with cursor.copy(copy_sql) as copy:
+                        copy.write(data)
+                else:
+                    cursor.copy_expert(copy_sql, io.StringIO(data))
+                cursor.execute(
+                    f"INSERT INTO {quote(PROGRESS_TABLE)} (table_name, last_pk, copied) VALUES (%s, %s, %s) "
+                    "ON CONFLICT (table_name) DO UPDATE SET last_pk = EXCLUDED.last_pk, copied = EXCLUDED.copied",
+                    [opts.db_table, json.dumps(last_pk), copied],
+                )
+            self.stdout.write(f"{opts.db_table}: {copied} rows", ending="\r")
+            self.stdout.flush()
+        self.stdout.write(f"{opts.db_table}: {copied - start} rows copied, {copied} total")
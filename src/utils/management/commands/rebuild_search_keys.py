@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from psytracks.models import Doctor, Patient, Psychiatrist
+from utils.models import Inspector
+from utils.search import rebuild_search_keys
+
+
+class Command(BaseCommand):
+    help = "Recalculate normalized search keys of patients, doctors, psychiatrists and inspectors"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model in (Patient, Doctor, Psychiatrist, Inspector):
+            updated = rebuild_search_keys(model, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.verbose_name_plural}: {updated} updated"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from psytracks.models import Patient
+
+
+class Command(BaseCommand):
+    help = "Recalculate stored last_date/deadline columns of patients"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = Patient.objects.refresh_compliance(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{updated} patients updated"))
@@ -0,0 +1,42 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.db import statement_timeout
+from utils.jobs import claim_next_job, requeue_stale_jobs, run_export_job
+from utils.models import ExportStatus
+
+
+class Command(BaseCommand):
+    help = "Process queued admin exports (keep one instance running next to the web server)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process the queue once and exit")
+        parser.add_argument("--sleep", type=float, default=3, help="Seconds to wait when the queue is empty")
+        parser.add_argument("--stale-after", type=int, default=1800,
+                            help="Requeue running exports whose worker has not reported progress for this many "
+                                 "seconds (must be longer than the slowest query of an export)")
+
+    def handle(self, *args, **options):
+        stale_after = datetime.timedelta(seconds=options["stale_after"])
+        while True:
+            # to'xtab qolgan worker'larning eksportlari; boshqa ishlayotgan worker'lar ishiga tegilmaydi
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                self.stdout.write(f"{requeued} stale exports requeued")
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+
+            # katta eksportlar sahifalar uchun belgilangan statement_timeout'ga sig'maydi
+            with statement_timeout(settings.EXPORT_STATEMENT_TIMEOUT):
+                job = run_export_job(job)
+            if job.status == ExportStatus.DONE:
+                self.stdout.write(self.style.SUCCESS(f"Export #{job.pk} done: {job.total} rows"))
+            else:
+                self.stderr.write(f"Export #{job.pk} failed:\n{job.error}")
@@ -1,18 +1,15 @@
-import json
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from utils.models import District, Neighborhood
 
-class Command(BaseCommand):
-    help = "Load district and neighborhood names from JSON file"
-
-    def handle(self, *args, **options):
 
-        with open("districts.json", encoding="utf-8") as f:
-            data = json.load(f)
+class Command(BaseCommand):
+    help = ("Load district and neighborhood names from districts.json ({district: [neighborhoods]}) into one "
+            "region. Kept for existing scripts; the work is done by sync_hierarchy, so running it again does not "
+            "duplicate rows.")
 
-        for name in data.keys():
-            district = District.objects.create(name=name, region_id=1)
-            for neighborhood in data[name]:
-                Neighborhood.objects.create(name=neighborhood, district=district)
+    def add_arguments(self, parser):
+        parser.add_argument("--region", default="1", help="Region name or id (default: 1)")
 
-        self.stdout.write(self.style.SUCCESS("District and neighborhood data loaded successfully!"))
+    def handle(self, *args, **options):
+        call_command("sync_hierarchy", "districts.json", region=options["region"], verbosity=options["verbosity"],
+                     stdout=self.stdout, stderr=self.stderr)
@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STEPS = ("checkpoint", "analyze", "vacuum")
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class Command(BaseCommand):
+    help = ("SQLite maintenance: checkpoint and truncate the WAL file, refresh planner statistics (ANALYZE) "
+            "and rebuild the database file (VACUUM). Without options all steps run; schedule e.g. "
+            "--checkpoint hourly and the full run nightly. VACUUM blocks writers while it runs.")
+
+    def add_arguments(self, parser):
+        for step in STEPS:
+            parser.add_argument(f"--{step}", action="store_true", help=f"Run only the selected steps ({step})")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            raise CommandError("Only SQLite databases need this command (PostgreSQL uses autovacuum)")
+        steps = [step for step in STEPS if options[step]] or STEPS
+        path = str(connection.settings_dict["NAME"])
+        wal = f"{path}-wal"
+        self.stdout.write(f"Before: database {file_size(path)} bytes, WAL {file_size(wal)} bytes")
+
+        with connection.cursor() as cursor:
+            if "checkpoint" in steps:
+                # TRUNCATE: WAL to'liq bazaga yoziladi va fayl nolga qisqartiriladi
+                busy, log_frames, checkpointed = cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+                if busy:
+                    self.stderr.write("Checkpoint could not finish: the database is busy, retry later")
+                else:
+                    self.stdout.write(f"Checkpoint: {checkpointed} of {log_frames} WAL frames written")
+            if "analyze" in steps:
+                cursor.execute("ANALYZE")
+                self.stdout.write("ANALYZE done")
+            if "vacuum" in steps:
+                cursor.execute("VACUUM")
+                cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self.stdout.write("VACUUM done")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"After: database {file_size(path)} bytes, WAL {file_size(wal)} bytes"
+        ))
@@ -0,0 +1,220 @@
+import json
+import re
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from openpyxl import load_workbook
+
+from users.principal import invalidate_principals
+from utils.filters import invalidate_lookups
+from utils.models import Region, District, Neighborhood
+
+APOSTROPHES = re.compile(r"[ʻʼ‘’`´]")
+
+
+def normalize_name(name):
+    """
+    Nomlarni solishtirish uchun: katta-kichik harf, ortiqcha bo'shliq va apostrof turlari farq qilmaydi.
+    """
+    return " ".join(APOSTROPHES.sub("'", name).split()).casefold()
+
+
+def diff(existing, names):
+    """
+    existing - {normalize_name: obj}, names - fayldagi nomlar.
+    (topilganlar {nom: obj}, yangi nomlar, nomi o'zgarganlar, yetim qolganlar) qaytaradi.
+    """
+    existing = dict(existing)
+    matched, added, renamed = {}, [], []
+    seen = set()
+    for name in names:
+        key = normalize_name(name)
+        if key in seen:
+            continue
+        seen.add(key)
+        obj = existing.pop(key, None)
+        if obj is None:
+            added.append(name)
+            continue
+        if obj.name != name:
+            renamed.append((obj.name, obj))
+            obj.name = name
+        matched[name] = obj
+    return matched, added, renamed, list(existing.values())
+
+
+def group_by_name(objs):
+    """
+    ({normalize_name: obj}, takrorlanganlar) qaytaradi. Takrorlangan yozuvlardan birinchisi (objs tartibida)
+    asosiy, qolganlari yetim deb hisobotga chiqariladi.
+    """
+    groups, duplicates = {}, []
+    for obj in objs:
+        key = normalize_name(obj.name)
+        if key in groups:
+            duplicates.append(obj)
+        else:
+            groups[key] = obj
+    return groups, duplicates
+
+
+def merge_names(tree):
+    """
+    Faylda faqat yozilishi bilan farq qiladigan viloyat va tumanlar birlashtiriladi, birinchi yozilishi qoladi.
+    """
+    merged, spelling = {}, {}
+    for region, districts in tree.items():
+        region = spelling.setdefault(normalize_name(region), region)
+        region_districts = merged.setdefault(region, {})
+        for district, names in districts.items():
+            district = spelling.setdefault((region, normalize_name(district)), district)
+            region_districts.setdefault(district, []).extend(names)
+    return merged
+
+
+def duplicate_label(obj, groups):
+    return f"{obj.name} (id={obj.pk}, duplicate of id={groups[normalize_name(obj.name)].pk})"
+
+
+class Command(BaseCommand):
+    help = "Sync regions, districts and neighborhoods from a JSON or XLSX file without creating duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="districts.json")
+        parser.add_argument("--region", default=None,
+                            help="Region name or id for a single-region JSON file ({district: [neighborhoods]})")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Show the changes and roll them back")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"File not found: {path}")
+        if path.suffix.lower() == ".xlsx":
+            tree = self.read_xlsx(path)
+        else:
+            tree = self.read_json(path, options["region"])
+
+        with transaction.atomic():
+            report = self.sync(tree, options["batch_size"])
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+            else:
+                # bulk amallar signal yubormaydi, foydalanuvchilar ko'rish doirasi qayta hisoblanishi kerak
+                invalidate_principals()
+                invalidate_lookups()
+
+        self.write_report(report, options["verbosity"])
+        prefix = "Dry run: " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            prefix + ", ".join(f"{len(items)} {key}" for key, items in report.items())
+        ))
+
+    def read_json(self, path, region):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if all(isinstance(value, list) for value in data.values()):
+            # eski format: bitta viloyat tumanlari
+            if not region:
+                raise CommandError("--region is required for a single-region file")
+            if region.isdigit():
+                name = Region.objects.filter(pk=region).values_list("name", flat=True).first()
+                if name is None:
+                    raise CommandError(f"Region not found: {region}")
+                region = name
+            data = {region: data}
+        return {
+            region.strip(): {
+                district.strip(): [name.strip() for name in neighborhoods if name and name.strip()]
+                for district, neighborhoods in districts.items()
+            }
+            for region, districts in data.items()
+        }
+
+    def read_xlsx(self, path):
+        """
+        Ustunlar: viloyat, tuman, mahalla; birinchi qator sarlavha.
+        Bo'sh viloyat/tuman kataklari yuqoridagi qatordan olinadi (birlashtirilgan kataklar uchun).
+        """
+        wb = load_workbook(path, read_only=True, data_only=True)
+        tree = {}
+        region = district = None
+        for row in wb.active.iter_rows(min_row=2, max_col=3, values_only=True):
+            row = tuple(str(value).strip() if value is not None else "" for value in row) + ("",) * (3 - len(row))
+            region, district = row[0] or region, row[1] or district
+            if region and district:
+                names = tree.setdefault(region, {}).setdefault(district, [])
+                if row[2]:
+                    names.append(row[2])
+        wb.close()
+        return tree
+
+    def sync(self, tree, batch_size):
+        """
+        Fayldagi nomlar bazadagi yozuvlarga diff() topgan obyektlar orqali bog'lanadi, yangilari bulk_create
+        qaytargan obyektlardan olinadi: takrorlangan nomlar bo'lsa ham har joyda bitta yozuv ishlatiladi.
+        """
+        report = {"added": [], "renamed": [], "orphaned": []}
+        tree = merge_names(tree)
+
+        groups, duplicates = group_by_name(Region.objects.order_by("pk"))
+        regions, added, renamed, _ = diff(groups, tree.keys())
+        created = Region.objects.bulk_create([Region(name=name) for name in added])
+        regions.update((region.name, region) for region in created)
+        Region.objects.bulk_update([obj for _, obj in renamed], ["name"])
+        report["added"] += [f"region: {name}" for name in added]
+        report["renamed"] += [f"region: {old} -> {obj.name}" for old, obj in renamed]
+        matched_regions = {region.pk for region in regions.values()}
+        report["orphaned"] += [f"region: {duplicate_label(obj, groups)}" for obj in duplicates
+                               if groups[normalize_name(obj.name)].pk in matched_regions]
+
+        existing = {}
+        for district in District.objects.filter(region__in=regions.values()).order_by("pk"):
+            existing.setdefault(district.region_id, []).append(district)
+        districts, new_districts, renamed_districts = {}, [], []
+        for region_name, district_names in tree.items():
+            region = regions[region_name]
+            groups, duplicates = group_by_name(existing.get(region.pk, []))
+            matched, added, renamed, orphaned = diff(groups, district_names.keys())
+            created = [District(name=name, region=region) for name in added]
+            districts[region_name] = {**matched, **{district.name: district for district in created}}
+            new_districts += created
+            renamed_districts += [obj for _, obj in renamed]
+            report["added"] += [f"district: {region_name} / {name}" for name in added]
+            report["renamed"] += [f"district: {region_name} / {old} -> {obj.name}" for old, obj in renamed]
+            report["orphaned"] += [f"district: {region_name} / {obj.name} (id={obj.pk})" for obj in orphaned]
+            report["orphaned"] += [f"district: {region_name} / {duplicate_label(obj, groups)}" for obj in duplicates]
+        # bulk_create obyektlarga pk yozadi (SQLite 3.35+, PostgreSQL), districts lug'ati shu obyektlarni ishlatadi
+        District.objects.bulk_create(new_districts, batch_size=batch_size)
+        District.objects.bulk_update(renamed_districts, ["name"], batch_size=batch_size)
+
+        existing = {}
+        neighborhoods = Neighborhood.objects.filter(district__region__in=regions.values()).order_by("pk")
+        for neighborhood in neighborhoods.only("id", "name", "district_id"):
+            existing.setdefault(neighborhood.district_id, []).append(neighborhood)
+        new_neighborhoods, renamed_neighborhoods = [], []
+        for region_name, district_names in tree.items():
+            for district_name, names in district_names.items():
+                district = districts[region_name][district_name]
+                groups, duplicates = group_by_name(existing.get(district.pk, []))
+                matched, added, renamed, orphaned = diff(groups, names)
+                label = f"{region_name} / {district_name}"
+                new_neighborhoods += [Neighborhood(name=name, district=district) for name in added]
+                renamed_neighborhoods += [obj for _, obj in renamed]
+                report["added"] += [f"neighborhood: {label} / {name}" for name in added]
+                report["renamed"] += [f"neighborhood: {label} / {old} -> {obj.name}" for old, obj in renamed]
+                report["orphaned"] += [f"neighborhood: {label} / {obj.name} (id={obj.pk})" for obj in orphaned]
+                report["orphaned"] += [f"neighborhood: {label} / {duplicate_label(obj, groups)}" for obj in duplicates]
+        Neighborhood.objects.bulk_create(new_neighborhoods, batch_size=batch_size)
+        Neighborhood.objects.bulk_update(renamed_neighborhoods, ["name"], batch_size=batch_size)
+        return report
+
+    def write_report(self, report, verbosity):
+        for key, items in report.items():
+            # yangi qo'shilganlar ko'p bo'lishi mumkin, ular faqat -v 2 da chiqariladi
+            if not items or (key == "added" and verbosity < 2):
+                continue
+            self.stdout.write(f"{key}:")
+            for item in items:
+                self.stdout.write(f"  {item}")
@@ -0,0 +1,17 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from utils.stats import take_compliance_snapshot
+
+
+class Command(BaseCommand):
+    help = "Save today's per-neighborhood compliance counts (run once a day, e.g. from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", type=datetime.date.fromisoformat, default=None,
+                            help="Snapshot date in YYYY-MM-DD format, today by default")
+
+    def handle(self, *args, **options):
+        rows = take_compliance_snapshot(options["date"])
+        self.stdout.write(self.style.SUCCESS(f"{rows} snapshot rows saved"))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0006_inspector_phone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplianceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('total_patients', models.PositiveIntegerField(default=0, verbose_name='Total patient count')),
+                ('total_aggressive_patients', models.PositiveIntegerField(default=0, verbose_name='Total aggressive patient count')),
+                ('total_convicted_patients', models.PositiveIntegerField(default=0, verbose_name='Total convicted patient count')),
+                ('total_abroad_long_term_patients', models.PositiveIntegerField(default=0, verbose_name='Total abroad long term patient count')),
+                ('late_count', models.PositiveIntegerField(default=0, verbose_name='Number of mentally ill people who missed their follow-up check-up')),
+                ('on_time_count', models.PositiveIntegerField(default=0, verbose_name='Number of mentally ill people who have not missed their follow-up check-up')),
+                ('aggressive_late_count', models.PositiveIntegerField(default=0, verbose_name='Number of aggressive mentally ill people who missed their follow-up check-up')),
+                ('aggressive_on_time_count', models.PositiveIntegerField(default=0, verbose_name='Number of aggressive mentally ill people who have not missed their follow-up check-up')),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='utils.district', verbose_name='district')),
+                ('neighborhood', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='utils.neighborhood', verbose_name='neighborhood')),
+            ],
+            options={
+                'verbose_name': 'Compliance snapshot',
+                'verbose_name_plural': 'Compliance snapshots',
+                'indexes': [models.Index(fields=['district', 'date'], name='utils_compl_distric_551ae5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'neighborhood'), name='unique_snapshot_date_neighborhood')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0007_compliancesnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('patients', 'Patients'), ('monitoring', 'Monitoring')], max_length=30, verbose_name='kind')),
+                ('params', models.TextField(blank=True, default='', verbose_name='filter parameters')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20, verbose_name='status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='total rows')),
+                ('written', models.PositiveIntegerField(default=0, verbose_name='rows written')),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/%Y/%m/', verbose_name='file')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+            options={
+                'verbose_name': 'My export',
+                'verbose_name_plural': 'My exports',
+                'ordering': ('-created_at',),
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0008_exportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='columns',
+            field=models.JSONField(blank=True, default=list, verbose_name='columns'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0009_exportjob_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettingsOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=255, verbose_name='value')),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settings_overrides', to='utils.district', verbose_name='district')),
+                ('setting', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overrides', to='utils.settingskey', verbose_name='settings key')),
+            ],
+            options={
+                'verbose_name': 'District override',
+                'verbose_name_plural': 'District overrides',
+                'constraints': [models.UniqueConstraint(fields=('setting', 'district'), name='unique_settings_override_district')],
+            },
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:40
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+KEY = "search_key"
+TRIGRAM_TABLES = ("utils_inspector",)
+
+# utils.search.normalize_search'ning shu migratsiya holatidagi nusxasi
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "ё": "yo", "ж": "j", "з": "z", "и": "i", "й": "y",
+    "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ь": "", "ы": "i", "э": "e",
+    "ю": "yu", "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+VOWELS = set("аеёиоуэюяўaeiou")
+NON_WORD = re.compile(r"[^\w\s]|_")
+# lotin yozuvidagi o‘/g‘ apostrofsiz yoziladi, kirill ў/ғ bilan bir xil bo'lishi uchun
+APOSTROPHE_AFTER = re.compile(r"([og])['ʻʼ‘’`´]")
+# х/ҳ (x/h) ko'pincha adashtiriladi, kalitda bitta harf
+FOLD = str.maketrans({"x": "h"})
+
+
+def transliterate(text):
+    """
+    O'zbek kirill yozuvini lotinga o'giradi. "е" so'z boshida va unlidan keyin "ye" bo'ladi (Ерматов -> Yermatov).
+    """
+    result = []
+    previous = ""
+    for char in text:
+        lower = char.lower()
+        if lower == "е":
+            value = "ye" if not previous.isalpha() or previous in VOWELS or previous in "ъь" else "e"
+        else:
+            value = CYRILLIC_TO_LATIN.get(lower, lower)
+        result.append(value)
+        previous = lower
+    return "".join(result)
+
+
+def normalize_search(text):
+    """
+    Qidiruv kaliti: lotin yozuvi, kichik harf, tinish belgilari va ortiqcha bo'shliqlarsiz.
+    "Жамил Ўғли" va "Jamil O‘g‘li" bir xil kalitga ega.
+    """
+    if not text:
+        return ""
+    text = APOSTROPHE_AFTER.sub(r"\1", text.casefold())
+    text = NON_WORD.sub(" ", transliterate(text).translate(FOLD))
+    return " ".join(text.split())
+
+
+def fill_keys(model, source, key):
+    """
+    key ustuni source'dan BATCH_SIZE tadan pk bo'yicha to'ldiriladi.
+    """
+    queryset = model.objects.only("pk", source, key).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        for obj in batch:
+            setattr(obj, key, normalize_search(getattr(obj, source)))
+        model.objects.bulk_update(batch, [key], batch_size=BATCH_SIZE)
+
+
+def add_trigram_indexes(apps, schema_editor):
+    # PostgreSQL'da pg_trgm GIN indeksi (LIKE '%...%' uchun), boshqa bazalarda hech narsa qilinmaydi
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in TRIGRAM_TABLES:
+            schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {table}_{KEY}_trgm ON {table} USING gin ({KEY} gin_trgm_ops)")
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for table in TRIGRAM_TABLES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {table}_{KEY}_trgm")
+
+
+def fill_search_keys(apps, schema_editor):
+    fill_keys(apps.get_model("utils", "Inspector"), "full_name", "search_key")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0010_settingsoverride'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inspector',
+            name='search_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='search key'),
+        ),
+        migrations.RunPython(fill_search_keys, migrations.RunPython.noop),
+        migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_hierarchy_columns(apps, schema_editor):
+    neighborhood = apps.get_model("utils", "Neighborhood").objects.filter(pk=OuterRef("neighborhood_id"))
+    apps.get_model("utils", "Inspector").objects.update(
+        district=Subquery(neighborhood.values("district_id")),
+        region=Subquery(neighborhood.values("district__region_id")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0011_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inspector',
+            name='district',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inspectors', to='utils.district', verbose_name='district'),
+        ),
+        migrations.AddField(
+            model_name='inspector',
+            name='region',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inspectors', to='utils.region', verbose_name='region'),
+        ),
+        migrations.RunPython(fill_hierarchy_columns, migrations.RunPython.noop),
+    ]
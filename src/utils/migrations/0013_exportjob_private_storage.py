@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:18
+
+import os
+import secrets
+
+import utils.models
+from django.core.files.storage import default_storage, storages
+from django.db import migrations, models
+
+
+def move_export_files(apps, schema_editor):
+    """
+    Oldin MEDIA_ROOT/exports ga yozilgan fayllar yopiq saqlashga tasodifiy nom bilan ko'chiriladi.
+    """
+    ExportJob = apps.get_model("utils", "ExportJob")
+    exports = storages["exports"]
+    for job in ExportJob.objects.exclude(file="").exclude(file__isnull=True).iterator():
+        old_name = job.file.name
+        if not default_storage.exists(old_name):
+            continue
+        directory = os.path.dirname(old_name).removeprefix("exports/")
+        with default_storage.open(old_name, "rb") as source:
+            new_name = exports.save(f"{directory}/{secrets.token_urlsafe(24)}{os.path.splitext(old_name)[1]}", source)
+        ExportJob.objects.filter(pk=job.pk).update(file=new_name)
+        default_storage.delete(old_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0012_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='heartbeat at'),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=utils.models.get_export_storage, upload_to=utils.models.export_upload_to, verbose_name='file'),
+        ),
+        migrations.RunPython(move_export_files, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,9 @@
+import os
+import secrets
+
+from django.core.files.storage import storages
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -40,8 +45,12 @@ class Neighborhood(models.Model):
 
 class Inspector(models.Model):
     full_name = models.CharField(_("full_name"), max_length=100)
+    search_key = models.CharField(_("search key"), max_length=255, default="", editable=False, db_index=True)
     phone = models.CharField(_("phone"), max_length=13, null=True, blank=True)
     neighborhood = models.OneToOneField(verbose_name=_("neighborhood"), to=Neighborhood, on_delete=models.CASCADE, related_name="inspector")
+    # mahalladan nusxa (utils.hierarchy), ko'rish doirasi JOIN'siz tekshiriladi
+    district = models.ForeignKey(verbose_name=_("district"), to=District, on_delete=models.SET_NULL, related_name="inspectors", null=True, editable=False)
+    region = models.ForeignKey(verbose_name=_("region"), to=Region, on_delete=models.SET_NULL, related_name="inspectors", null=True, editable=False)
     user = models.OneToOneField(verbose_name=_("user"), to="users.user", on_delete=models.CASCADE, related_name="inspector")
 
     class Meta:
@@ -65,6 +74,22 @@ class SettingsKey(models.Model):
         return self.name
 
 
+class SettingsOverride(models.Model):
+    setting = models.ForeignKey(verbose_name=_("settings key"), to=SettingsKey, on_delete=models.CASCADE, related_name="overrides")
+    district = models.ForeignKey(verbose_name=_("district"), to=District, on_delete=models.CASCADE, related_name="settings_overrides")
+    value = models.CharField(_("value"), max_length=255)
+
+    class Meta:
+        verbose_name = _("District override")
+        verbose_name_plural = _("District overrides")
+        constraints = [
+            models.UniqueConstraint(fields=["setting", "district"], name="unique_settings_override_district"),
+        ]
+
+    def __str__(self):
+        return f"{self.setting} ({self.district})"
+
+
 class DistrictMonitoring(District):
     class Meta:
         proxy = True
@@ -72,19 +97,81 @@ class DistrictMonitoring(District):
         verbose_name_plural = _("Monitoring")
 
 
-def get_limits():
-    defaults = {
-        "last_psychiatric_appointment_days": 30,
-        "last_home_visit_by_doctor_days": 30,
-        "last_hospitalization_to_days": 180,
-    }
+class ComplianceSnapshot(models.Model):
+    date = models.DateField(_("date"))
+    neighborhood = models.ForeignKey(verbose_name=_("neighborhood"), to=Neighborhood, on_delete=models.CASCADE, related_name="snapshots")
+    district = models.ForeignKey(verbose_name=_("district"), to=District, on_delete=models.CASCADE, related_name="snapshots")
+    total_patients = models.PositiveIntegerField(_("Total patient count"), default=0)
+    total_aggressive_patients = models.PositiveIntegerField(_("Total aggressive patient count"), default=0)
+    total_convicted_patients = models.PositiveIntegerField(_("Total convicted patient count"), default=0)
+    total_abroad_long_term_patients = models.PositiveIntegerField(_("Total abroad long term patient count"), default=0)
+    late_count = models.PositiveIntegerField(_("Number of mentally ill people who missed their follow-up check-up"), default=0)
+    on_time_count = models.PositiveIntegerField(_("Number of mentally ill people who have not missed their follow-up check-up"), default=0)
+    aggressive_late_count = models.PositiveIntegerField(_("Number of aggressive mentally ill people who missed their follow-up check-up"), default=0)
+    aggressive_on_time_count = models.PositiveIntegerField(_("Number of aggressive mentally ill people who have not missed their follow-up check-up"), default=0)
+
+    class Meta:
+        verbose_name = _("Compliance snapshot")
+        verbose_name_plural = _("Compliance snapshots")
+        constraints = [
+            models.UniqueConstraint(fields=["date", "neighborhood"], name="unique_snapshot_date_neighborhood"),
+        ]
+        indexes = [
+            models.Index(fields=["district", "date"]),
+        ]
+
+    def __str__(self):
+        return str(self.date)
+
 
-    limits = {}
+class ExportKind(models.TextChoices):
+    PATIENTS = ("patients", _("Patients"))
+    MONITORING = ("monitoring", _("Monitoring"))
+
+
+class ExportStatus(models.TextChoices):
+    PENDING = ("pending", _("Pending"))
+    RUNNING = ("running", _("Running"))
+    DONE = ("done", _("Done"))
+    FAILED = ("failed", _("Failed"))
+
+
+def get_export_storage():
+    """
+    Eksportlar MEDIA_ROOT'dan tashqarida (settings.STORAGES["exports"]) saqlanadi va faqat
+    ExportJobAdmin.download orqali beriladi.
+    """
+    return storages["exports"]
+
+
+def export_upload_to(instance, filename):
+    # fayl nomi taxmin qilinmasligi kerak; foydalanuvchiga ExportJob.download_name ko'rsatiladi
+    return f"{timezone.now():%Y/%m}/{secrets.token_urlsafe(24)}{os.path.splitext(filename)[1]}"
+
+
+class ExportJob(models.Model):
+    user = models.ForeignKey(verbose_name=_("user"), to="users.User", on_delete=models.CASCADE, related_name="export_jobs")
+    kind = models.CharField(_("kind"), max_length=30, choices=ExportKind.choices)
+    params = models.TextField(_("filter parameters"), blank=True, default="")
+    columns = models.JSONField(_("columns"), default=list, blank=True)
+    status = models.CharField(_("status"), max_length=20, choices=ExportStatus.choices, default=ExportStatus.PENDING, db_index=True)
+    total = models.PositiveIntegerField(_("total rows"), default=0)
+    written = models.PositiveIntegerField(_("rows written"), default=0)
+    file = models.FileField(_("file"), upload_to=export_upload_to, storage=get_export_storage, null=True, blank=True)
+    error = models.TextField(_("error"), blank=True, default="")
+    created_at = models.DateTimeField(_("created at"), auto_now_add=True)
+    # ishlayotgan worker har bir bo'lakdan keyin yangilaydi; eskirgan RUNNING ishlar qayta navbatga qo'yiladi
+    heartbeat_at = models.DateTimeField(_("heartbeat at"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("finished at"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("My export")
+        verbose_name_plural = _("My exports")
+        ordering = ("-created_at",)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.created_at:%d.%m.%Y %H:%M})"
 
-    for key, default_value in defaults.items():
-        obj, created = SettingsKey.objects.get_or_create(
-            key=key,
-            defaults={"value": str(default_value)}
-        )
-        limits[key] = int(obj.value)
-    return limits
\ No newline at end of file
+    @property
+    def download_name(self):
+        return f"{self.kind}-{timezone.localtime(self.created_at):%Y-%m-%d}-{self.pk}.xlsx"
@@ -0,0 +1,205 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+
+from utils.app_settings import get_setting
+
+CURSOR_VAR = "cursor"
+EXACT_COUNT_VAR = "exact_count"
+COUNT_CACHE_TIMEOUT = 60
+
+
+def estimate_count(queryset):
+    """
+    PostgreSQL rejalashtiruvchisining taxminiy qatorlar soni (so'rov bajarilmaydi).
+    """
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Katta ro'yxatlarda COUNT(*) o'rniga taxminiy son: PostgreSQL'da reja bahosi, boshqa bazalarda
+    qisqa muddat keshlangan aniq son. Chegara - estimated_count_threshold sozlamasi.
+    """
+
+    def __init__(self, *args, exact=False, **kwargs):
+        self.exact = exact
+        self.estimated = False
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if self.exact or not hasattr(queryset, "query"):
+            return super().count
+        threshold = get_setting("estimated_count_threshold")
+        if connections[queryset.db].vendor == "postgresql":
+            estimate = estimate_count(queryset)
+            if estimate < threshold:
+                return super().count
+            self.estimated = True
+            return estimate
+
+        key = "changelist_count:" + hashlib.md5(f"{queryset.db}:{queryset.query}".encode()).hexdigest()
+        count = cache.get(key)
+        if count is not None:
+            self.estimated = True
+            return count
+        count = super().count
+        if count >= threshold:
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class EstimatedCountMixin:
+    """
+    ChangeList uchun: ?exact_count= filtr sifatida emas, aniq sanash so'rovi sifatida qabul qilinadi.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(EXACT_COUNT_VAR, None)
+        return lookup_params
+
+    @property
+    def count_estimated(self):
+        return getattr(self.paginator, "estimated", False)
+
+    @property
+    def exact_count_url(self):
+        return self.get_query_string({EXACT_COUNT_VAR: 1})
+
+
+def encode_cursor(payload):
+    data = json.dumps(payload, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def seek_q(field, value, pk, forward):
+    """
+    (field, pk) tartibida (value, pk) qatoridan keyingi (forward) yoki oldingi qatorlar sharti.
+    NULL qiymatlar eng kichik hisoblanadi.
+    """
+    op = "gt" if forward else "lt"
+    if field == "id":
+        return Q(**{f"pk__{op}": pk})
+    if value is None:
+        q = Q(**{f"{field}__isnull": True, f"pk__{op}": pk})
+        return q | Q(**{f"{field}__isnull": False}) if forward else q
+    q = Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"pk__{op}": pk})
+    return q if forward else q | Q(**{f"{field}__isnull": True})
+
+
+def seek_ordering(field, descending):
+    if field == "id":
+        return ["-pk" if descending else "pk"]
+    if descending:
+        return [F(field).desc(nulls_last=True), "-pk"]
+    return [F(field).asc(nulls_first=True), "pk"]
+
+
+class KeysetPaginationMixin:
+    """
+    ChangeList uchun ixtiyoriy keyset (seek) sahifalash. ?cursor= bo'lsa OFFSET o'rniga sahifa chegarasidagi
+    qator qiymatlaridan keyingi/oldingi qatorlar olinadi, shuning uchun istalgan chuqurlikda tezlik bir xil
+    va yangi qo'shilgan qatorlar sahifalarni surmaydi.
+    Faqat keyset_fields dagi maydon bo'yicha tartiblashda ishlaydi (id qo'shimcha kalit), aks holda oddiy sahifalash.
+    """
+    keyset_fields = ("id",)
+
+    def __init__(self, request, *args, **kwargs):
+        self.keyset = CURSOR_VAR in request.GET
+        self.cursor = decode_cursor(request.GET.get(CURSOR_VAR, ""))
+        self.keyset_prev_url = self.keyset_next_url = None
+        super().__init__(request, *args, **kwargs)
+        self.keyset_start_url = self.get_query_string({CURSOR_VAR: ""})
+        self.keyset_exit_url = self.get_query_string(remove=[CURSOR_VAR])
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_keyset_key(self, request):
+        ordering = self.get_ordering(request, self.queryset)
+        if not ordering or not isinstance(ordering[0], str):
+            return None
+        field = ordering[0].lstrip("-")
+        field = "id" if field == "pk" else field
+        if field not in self.keyset_fields:
+            return None
+        return field, ordering[0].startswith("-")
+
+    def get_results(self, request):
+        key = self.get_keyset_key(request) if self.keyset else None
+        if key is None:
+            self.keyset = False
+            return super().get_results(request)
+
+        field, descending = key
+        cursor = self.cursor
+        if not cursor or cursor.get("f") != field or cursor.get("d") != descending:
+            # tartib o'zgargan yoki birinchi sahifa
+            cursor = None
+        forward = not cursor or cursor.get("p") != "prev"
+
+        queryset = self.queryset
+        if cursor:
+            try:
+                value = cursor.get("v")
+                if value is not None:
+                    value = self.opts.get_field(field).to_python(value)
+                pk = self.opts.pk.to_python(cursor.get("id"))
+            except ValidationError:
+                raise IncorrectLookupParameters
+            queryset = queryset.filter(seek_q(field, value, pk, forward != descending))
+        queryset = queryset.order_by(*seek_ordering(field, descending == forward))
+
+        rows = list(queryset[:self.list_per_page + 1])
+        has_more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if not forward:
+            rows.reverse()
+        has_prev = has_more if not forward else cursor is not None
+        has_next = has_more if forward else True
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = self.root_queryset.count() if self.show_full_result_count else None
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = has_prev or has_next
+        if rows and has_prev:
+            self.keyset_prev_url = self.get_query_string({CURSOR_VAR: self.make_cursor(rows[0], key, "prev")})
+        if rows and has_next:
+            self.keyset_next_url = self.get_query_string({CURSOR_VAR: self.make_cursor(rows[-1], key, "next")})
+
+    def make_cursor(self, obj, key, direction):
+        field, descending = key
+        return encode_cursor({"f": field, "d": descending, "v": getattr(obj, field), "id": obj.pk, "p": direction})
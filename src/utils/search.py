@@ -0,0 +1,285 @@
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+
+from django.contrib.admin.views.main import ORDER_VAR
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "ё": "yo", "ж": "j", "з": "z", "и": "i", "й": "y",
+    "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "x", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sh", "ъ": "", "ь": "", "ы": "i", "э": "e",
+    "ю": "yu", "я": "ya", "ў": "o", "қ": "q", "ғ": "g", "ҳ": "h",
+}
+VOWELS = set("аеёиоуэюяўaeiou")
+NON_WORD = re.compile(r"[^\w\s]|_")
+# lotin yozuvidagi o‘/g‘ apostrofsiz yoziladi, kirill ў/ғ bilan bir xil bo'lishi uchun
+APOSTROPHE_AFTER = re.compile(r"([og])['ʻʼ‘’`´]")
+# х/ҳ (x/h) ko'pincha adashtiriladi, kalitda bitta harf
+FOLD = str.maketrans({"x": "h"})
+# manba maydon -> normallashtirilgan kalit ustuni (modelda bor bo'lganlari to'ldiriladi)
+SEARCH_KEYS = {"full_name": "search_key", "address": "address_key"}
+
+FUZZY_VAR = "fuzzy"
+# pg_trgm.word_similarity_threshold standart qiymati
+FUZZY_THRESHOLD = 0.6
+FUZZY_VERSION_KEY = "fuzzy_index:version"
+# jarayon xotirasidagi indeks shundan tez-tez qayta qurilmaydi
+FUZZY_INDEX_MAX_AGE = 60
+
+
+def transliterate(text):
+    """
+    O'zbek kirill yozuvini lotinga o'giradi. "е" so'z boshida va unlidan keyin "ye" bo'ladi (Ерматов -> Yermatov).
+    """
+    result = []
+    previous = ""
+    for char in text:
+        lower = char.lower()
+        if lower == "е":
+            value = "ye" if not previous.isalpha() or previous in VOWELS or previous in "ъь" else "e"
+        else:
+            value = CYRILLIC_TO_LATIN.get(lower, lower)
+        result.append(value)
+        previous = lower
+    return "".join(result)
+
+
+def normalize_search(text):
+    """
+    Qidiruv kaliti: lotin yozuvi, kichik harf, tinish belgilari va ortiqcha bo'shliqlarsiz.
+    "Жамил Ўғли" va "Jamil O‘g‘li" bir xil kalitga ega.
+    """
+    if not text:
+        return ""
+    text = APOSTROPHE_AFTER.sub(r"\1", text.casefold())
+    text = NON_WORD.sub(" ", transliterate(text).translate(FOLD))
+    return " ".join(text.split())
+
+
+class SearchKeyAdminMixin:
+    """
+    Admin qidiruvi va autocomplete uchun: har bir so'z normallashtirilgan search_key ichidan qidiriladi
+    (PostgreSQL'da trigram indeksi ishlatiladi).
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        words = normalize_search(search_term).split()
+        for word in words:
+            queryset = queryset.filter(search_key__contains=word)
+        return queryset, False
+
+
+def get_search_keys(model):
+    names = {field.name for field in model._meta.get_fields()}
+    return {source: key for source, key in SEARCH_KEYS.items() if key in names}
+
+
+def set_search_keys(obj, sources=None):
+    """
+    obj ning kalit ustunlarini to'ldiradi va yangilangan ustunlar ro'yxatini qaytaradi.
+    """
+    keys = []
+    for source, key in get_search_keys(type(obj)).items():
+        if sources is None or source in sources:
+            setattr(obj, key, normalize_search(getattr(obj, source)))
+            keys.append(key)
+    return keys
+
+
+def set_search_key(sender, instance, **kwargs):
+    set_search_keys(instance)
+
+
+def rebuild_search_keys(model, batch_size=1000):
+    """
+    Kalit ustunlarini manba maydonlardan qayta hisoblaydi, faqat o'zgarganlarini yozadi.
+    """
+    search_keys = get_search_keys(model)
+    keys = list(search_keys.values())
+    updated = 0
+    changed = []
+    queryset = model.objects.only("pk", *search_keys, *keys).order_by("pk")
+    for obj in queryset.iterator(chunk_size=batch_size):
+        old = [getattr(obj, key) for key in keys]
+        set_search_keys(obj)
+        if old != [getattr(obj, key) for key in keys]:
+            changed.append(obj)
+        if len(changed) >= batch_size:
+            updated += model.objects.bulk_update(changed, keys)
+            changed = []
+    if changed:
+        updated += model.objects.bulk_update(changed, keys)
+    return updated
+
+
+def trigrams(text):
+    """
+    pg_trgm kabi: har bir so'z oldidan ikki, ortidan bitta bo'shliq qo'shilib uch harfli bo'laklarga ajratiladi.
+    """
+    result = set()
+    for word in text.split():
+        word = f"  {word} "
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+def get_fuzzy_version():
+    version = cache.get(FUZZY_VERSION_KEY)
+    if version is None:
+        cache.add(FUZZY_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(FUZZY_VERSION_KEY)
+    return version
+
+
+def invalidate_fuzzy_index():
+    transaction.on_commit(lambda: cache.set(FUZZY_VERSION_KEY, time.time_ns(), None))
+
+
+def fuzzy_index_changed(sender, **kwargs):
+    invalidate_fuzzy_index()
+
+
+class TrigramIndex:
+    """
+    pg_trgm bo'lmagan bazalar uchun jarayon xotirasidagi trigram indeksi: (ustun, trigram) -> qatorlar.
+    Baho - so'rov trigramlarining ustunda uchragan ulushi (word_similarity ga yaqin).
+    Yozuvlar o'zgarganda umumiy keshdagi versiya yangilanadi, indeks ko'pi bilan FUZZY_INDEX_MAX_AGE da qayta quriladi.
+    """
+    _indexes = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model, keys):
+        self.model = model
+        self.keys = keys
+        self.version = None
+        self.built = 0
+        self.pks = array("q")
+        self.postings = {}
+
+    @classmethod
+    def get(cls, model):
+        index = cls._indexes.get(model._meta.label)
+        if index is None:
+            index = cls._indexes.setdefault(model._meta.label, cls(model, list(get_search_keys(model).values())))
+        version = get_fuzzy_version()
+        if index.version is None or (index.version != version and time.monotonic() - index.built > FUZZY_INDEX_MAX_AGE):
+            with cls._lock:
+                if index.version is None or index.version != version:
+                    index.build(version)
+        return index
+
+    def build(self, version):
+        pks = array("q")
+        postings = {}
+        rows = self.model._base_manager.order_by().values_list("pk", *self.keys)
+        for row, (pk, *values) in enumerate(rows.iterator(chunk_size=5000)):
+            pks.append(pk)
+            for column, value in enumerate(values):
+                for trigram in trigrams(value or ""):
+                    posting = postings.get((column, trigram))
+                    if posting is None:
+                        posting = postings[(column, trigram)] = array("I")
+                    posting.append(row)
+        self.pks, self.postings = pks, postings
+        self.version, self.built = version, time.monotonic()
+
+    def search(self, query, threshold=FUZZY_THRESHOLD):
+        """
+        (pk, baho) ro'yxati, eng yaqini birinchi.
+        """
+        query = trigrams(query)
+        if not query:
+            return []
+        scores = {}
+        for column in range(len(self.keys)):
+            hits = Counter()
+            for trigram in query:
+                hits.update(self.postings.get((column, trigram), ()))
+            for row, count in hits.items():
+                score = count / len(query)
+                if score >= threshold and score > scores.get(row, 0):
+                    scores[row] = score
+        return sorted(((self.pks[row], score) for row, score in scores.items()), key=lambda item: (-item[1], item[0]))
+
+
+def fuzzy_rank(queryset, query, limit):
+    """
+    queryset ichidan query ga eng yaqin limit ta yozuv: [(pk, baho), ...].
+    PostgreSQL'da pg_trgm (word_similarity, GIN indeksi), boshqa bazalarda TrigramIndex.
+    """
+    query = normalize_search(query)
+    if not query:
+        return []
+    keys = list(get_search_keys(queryset.model).values())
+    if connections[queryset.db].vendor == "postgresql":
+        from django.contrib.postgres.lookups import TrigramWordSimilar
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        similar = Q()
+        for key in keys:
+            similar |= Q(TrigramWordSimilar(F(key), Value(query)))
+        scores = [TrigramWordSimilarity(Value(query), key) for key in keys]
+        score = Greatest(*scores) if len(scores) > 1 else scores[0]
+        return list(queryset.filter(similar).annotate(fuzzy_score=score)
+                    .order_by("-fuzzy_score", "pk").values_list("pk", "fuzzy_score")[:limit])
+
+    # ko'rish doirasi va filtrlar SQL'da qo'llanadi, eng yaqinlaridan boshlab bo'laklab
+    candidates = TrigramIndex.get(queryset.model).search(query)
+    result = []
+    chunk_size = max(limit, 500)
+    for start in range(0, len(candidates), chunk_size):
+        chunk = candidates[start:start + chunk_size]
+        visible = set(queryset.filter(pk__in=[pk for pk, score in chunk]).values_list("pk", flat=True))
+        result += [(pk, score) for pk, score in chunk if pk in visible]
+        if len(result) >= limit:
+            break
+    return result[:limit]
+
+
+def fuzzy_search(queryset, query, limit):
+    """
+    fuzzy_rank natijasi queryset sifatida, fuzzy_score annotatsiyasi bilan.
+    """
+    ranked = fuzzy_rank(queryset, query, limit)
+    if not ranked:
+        return queryset.none().annotate(fuzzy_score=Value(0.0, output_field=FloatField()))
+    score = Case(*(When(pk=pk, then=Value(float(score))) for pk, score in ranked), output_field=FloatField())
+    return queryset.filter(pk__in=[pk for pk, score in ranked]).annotate(fuzzy_score=score)
+
+
+class FuzzySearchMixin:
+    """
+    ChangeList uchun: ?fuzzy= bo'lsa qidiruv xatolarga chidamli (trigram) va natijalar yaqinligi bo'yicha tartiblanadi.
+    Admin'ning get_search_results i request.GET dagi FUZZY_VAR ni tekshiradi.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.fuzzy = FUZZY_VAR in request.GET
+        super().__init__(request, *args, **kwargs)
+        self.fuzzy_url = self.get_query_string({FUZZY_VAR: 1})
+        self.fuzzy_exit_url = self.get_query_string(remove=[FUZZY_VAR])
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(FUZZY_VAR, None)
+        return lookup_params
+
+    @property
+    def fuzzy_ordered(self):
+        return self.fuzzy and self.query and ORDER_VAR not in self.params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # tartib qidiruvdan oldin qo'llanadi, fuzzy_score esa qidiruvda paydo bo'ladi
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.fuzzy_ordered:
+            queryset = queryset.order_by("-fuzzy_score", "pk")
+        return queryset
+
+    def get_keyset_key(self, request):
+        return None if self.fuzzy_ordered else super().get_keyset_key(request)
@@ -11,3 +11,23 @@ def create_virtual_permissions(sender, **kwargs):
         name="Can view statistics page",
         content_type=content_type,
     )
+
+
+def create_default_settings(sender, **kwargs):
+    from utils.app_settings import DEFAULTS
+    from utils.models import SettingsKey
+
+    for key, value in DEFAULTS.items():
+        SettingsKey.objects.get_or_create(key=key, defaults={"name": key, "value": str(value)})
+
+
+def bump_settings_version(sender, **kwargs):
+    from utils.app_settings import bump_version
+
+    bump_version()
+
+
+def filter_lookups_changed(sender, **kwargs):
+    from utils.filters import invalidate_lookups
+
+    invalidate_lookups()
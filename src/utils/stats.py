@@ -0,0 +1,157 @@
+from django.db import connection, transaction
+from django.db.models import Count, Q, OuterRef, Subquery, IntegerField, Max, Sum, F, Func, Window
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from psytracks.models import Patient, Doctor, Psychiatrist, overdue_q, on_time_q
+from utils.models import Neighborhood, Inspector, ComplianceSnapshot
+
+PATIENT_COUNTERS = ("total_patients", "total_aggressive_patients", "total_convicted_patients",
+                    "total_abroad_long_term_patients", "late_count", "on_time_count", "aggressive_late_count",
+                    "aggressive_on_time_count")
+
+
+class WindowSum(Func):
+    """
+    SUM(agregat) OVER () - jami qatori alohida so'rovsiz, har bir qatorga qo'shiladi.
+    """
+    function = "SUM"
+    window_compatible = True
+    output_field = IntegerField()
+
+
+def patient_counters(today=None, prefix=""):
+    today = today or timezone.now().date()
+    aggressive = Q(**{f"{prefix}is_aggressive": True})
+    return {
+        "total_patients": Count(f"{prefix}id"),
+        "total_aggressive_patients": Count(f"{prefix}id", filter=aggressive),
+        "total_convicted_patients": Count(f"{prefix}id", filter=Q(**{f"{prefix}is_convicted": True})),
+        "total_abroad_long_term_patients": Count(f"{prefix}id", filter=Q(**{f"{prefix}is_abroad_long_term": True})),
+        "late_count": Count(f"{prefix}id", filter=overdue_q(today, prefix)),
+        "on_time_count": Count(f"{prefix}id", filter=on_time_q(today, prefix)),
+        "aggressive_late_count": Count(f"{prefix}id", filter=aggressive & overdue_q(today, prefix)),
+        "aggressive_on_time_count": Count(f"{prefix}id", filter=aggressive & on_time_q(today, prefix)),
+    }
+
+
+def annotate_monitoring(queryset, prefix, today=None, **extra):
+    """
+    Monitoring ustunlari va ularning umumiy yig'indisi (grand_<nomi>) bitta guruhlangan so'rovda.
+    prefix - queryset modelidan Patient'gacha bo'lgan yo'l, masalan "neighborhoods__patients__".
+    """
+    counters = {**extra, **patient_counters(today, prefix)}
+    return queryset.annotate(**counters).annotate(
+        **{f"grand_{name}": Window(WindowSum(F(name))) for name in counters}
+    )
+
+
+def get_grand_totals(rows, names):
+    first = rows[0] if rows else None
+    return {name: getattr(first, f"grand_{name}") if first else 0 for name in names}
+
+
+def get_patient_counts(patients, group_by, today=None):
+    """
+    Bemorlar bo'yicha barcha hisoblagichlar bitta GROUP BY so'rovda: {group_by qiymati: {counter: son}}
+    """
+    rows = patients.order_by().values(group_by).annotate(**patient_counters(today))
+    return {row.pop(group_by): row for row in rows}
+
+
+def count_subquery(queryset, field, outer_field="pk"):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer_field)}).order_by().values(field).annotate(c=Count("pk")).values("c"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def collect_stats(rows, counts, fields):
+    totals = dict.fromkeys(fields, 0)
+    for row in rows:
+        row.update(counts.get(row["id"]) or dict.fromkeys(PATIENT_COUNTERS, 0))
+        for field in fields:
+            totals[field] += row[field]
+    return rows, totals
+
+
+def get_district_stats(districts, today=None):
+    """
+    Tumanlar kesimida statistika: bitta District so'rovi va bitta guruhlangan Patient so'rovi.
+    (rows, totals) qaytaradi.
+    """
+    rows = list(districts.annotate(
+        total_neighborhood=count_subquery(Neighborhood.objects, "district"),
+        total_doctor=count_subquery(Doctor.objects, "district"),
+        total_psychiatrist=count_subquery(Psychiatrist.objects, "district"),
+        total_inspector=count_subquery(Inspector.objects, "district"),
+    ).values("id", "name", "total_neighborhood", "total_doctor", "total_psychiatrist", "total_inspector"))
+    counts = get_patient_counts(Patient.objects.filter(district__in=districts.values("pk")), "district_id", today)
+    return collect_stats(rows, counts, ("total_neighborhood", "total_doctor", "total_psychiatrist",
+                                        "total_inspector") + PATIENT_COUNTERS)
+
+
+def get_neighborhood_stats(neighborhoods, today=None):
+    """
+    Mahallalar kesimida statistika: bitta Neighborhood so'rovi va bitta guruhlangan Patient so'rovi.
+    (rows, totals) qaytaradi. district_psychiatrist - mahalla tumanidagi psixiatrlar soni; jami
+    total_psychiatrist faqat berilgan mahallalar tumanlari bo'yicha hisoblanadi.
+    """
+    rows = list(neighborhoods.annotate(
+        total_doctor=count_subquery(Doctor.objects, "neighborhood"),
+        total_inspector=count_subquery(Inspector.objects, "neighborhood"),
+        district_psychiatrist=count_subquery(Psychiatrist.objects, "district", "district_id"),
+    ).values("id", "name", "district_id", "total_doctor", "total_inspector", "district_psychiatrist"))
+    counts = get_patient_counts(
+        Patient.objects.filter(neighborhood__in=neighborhoods.values("pk")),
+        "neighborhood_id", today,
+    )
+    rows, totals = collect_stats(rows, counts, ("total_doctor", "total_inspector") + PATIENT_COUNTERS)
+    totals["total_neighborhood"] = len(rows)
+    totals["total_psychiatrist"] = sum({row["district_id"]: row["district_psychiatrist"] for row in rows}.values())
+    return rows, totals
+
+
+def take_compliance_snapshot(date=None):
+    """
+    Bugungi holatni ComplianceSnapshot jadvaliga bitta INSERT ... SELECT bilan yozadi.
+    Shu sana uchun oldingi yozuvlar almashtiriladi.
+    """
+    date = date or timezone.now().date()
+    patients = Patient.objects.order_by().values(
+        snapshot_neighborhood=F("neighborhood_id"), snapshot_district=F("neighborhood__district_id")
+    ).annotate(**patient_counters(date))
+    # {jadval ustuni: ichki so'rov aliasi} - ustunlar ichki SELECT tartibiga tayanmay, nomi bilan olinadi
+    selected = {"neighborhood_id": "snapshot_neighborhood", "district_id": "snapshot_district",
+                **{name: name for name in PATIENT_COUNTERS}}
+    select_sql, select_params = patients.query.sql_with_params()
+
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}, {}) SELECT %s, {} FROM ({}) s".format(
+        quote(ComplianceSnapshot._meta.db_table), quote("date"),
+        ", ".join(quote(column) for column in selected),
+        ", ".join(f"s.{quote(alias)}" for alias in selected.values()),
+        select_sql,
+    )
+    with transaction.atomic():
+        ComplianceSnapshot.objects.filter(date=date).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (connection.ops.adapt_datefield_value(date), *select_params))
+            return cursor.rowcount
+
+
+def get_compliance_trend(snapshots, period="week"):
+    """
+    Snapshot'lardan trend: har bir hafta/oy uchun shu davrdagi oxirgi kun holati.
+    """
+    trunc = TruncMonth if period == "month" else TruncWeek
+    dates = snapshots.order_by().annotate(period=trunc("date")).values("period").annotate(last_date=Max("date"))
+    rows = (
+        snapshots.filter(date__in=[row["last_date"] for row in dates])
+        .order_by("date").values("date")
+        .annotate(**{counter: Sum(counter) for counter in PATIENT_COUNTERS})
+    )
+    return list(rows)
@@ -1,3 +1,823 @@
-from django.test import TestCase
+import contextvars
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+from importlib import import_module
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+
+from psytracks.models import Doctor, Patient, Psychiatrist
+from users.tests import RoleDataMixin, DISTRICT, INSPECTOR, REGION, SUPERUSER, old_patient_counts, vary_patients
+from utils.app_settings import DEFAULTS, VERSION_CACHE_KEY, get_limits, get_setting
+from utils.checks import check_export_storage, check_shared_cache
+from utils.db import (DatabaseMiddleware, PrimaryReplicaRouter, get_postgresql_aliases, reset_statement_timeout,
+                      statement_timeout)
+from utils.exports import MONITORING_EXPORT_FIELDS, export_monitoring_xlsx
+from utils.jobs import get_job_queryset, requeue_stale_jobs, run_export_job
+from utils.stats import PATIENT_COUNTERS, get_grand_totals, get_patient_counts, take_compliance_snapshot
+from utils.management.commands import import_patients
+from utils.pagination import EXACT_COUNT_VAR, EstimatedCountPaginator, estimate_count
+from utils.management.commands import migrate_sqlite_to_postgresql
+from utils.management.commands.migrate_sqlite_to_postgresql import PROGRESS_TABLE, SOURCE_ALIAS, copy_value, get_models
+from utils.models import (ComplianceSnapshot, District, ExportJob, ExportKind, ExportStatus, Inspector, Neighborhood, Region,
+                          SettingsKey, SettingsOverride)
+
+
+class AdminQueryTests(RoleDataMixin, TestCase):
+    def test_hierarchy_changelists(self):
+        self.assertQueryBudget(reverse("admin:utils_district_changelist"), 10)
+        self.assertQueryBudget(reverse("admin:utils_neighborhood_changelist"), 19)
+
+    def test_inspector_pages(self):
+        inspector = self.neighborhoods[0].inspector
+        self.assertQueryBudget(reverse("admin:utils_inspector_changelist"), 19)
+        self.assertQueryBudget(reverse("admin:utils_inspector_change", args=[inspector.pk]), 11)
+
+    def test_district_monitoring(self):
+        self.assertQueryBudget(reverse("admin:utils_districtmonitoring_changelist"), 15)
+        self.assertQueryBudget(reverse("admin:utils_districtmonitoring_change", args=[self.districts[0].pk]), 15)
+
+
+# db.sqlite3 dagi "Туман админи" / "Вилоят админи" guruhlari ruxsatlari: hudud modellarini ko'rish ruxsati yo'q
+DISTRICT_ADMIN_PERMISSIONS = (
+    "add_doctor", "add_patient", "add_psychiatrist", "add_reasonforspecialconsideration", "add_socialdomesticenvironment",
+    "change_doctor", "change_patient", "change_psychiatrist", "delete_doctor", "delete_patient", "delete_psychiatrist",
+    "view_districtmonitoring", "view_doctor", "view_patient", "view_psychiatrist", "view_statistics",
+)
+
+
+class AutocompleteTests(RoleDataMixin, TestCase):
+    def autocomplete(self, role, model_name, field_name, app_label="psytracks", status_code=200):
+        self.client.force_login(self.users[role])
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": app_label, "model_name": model_name, "field_name": field_name,
+        })
+        self.assertEqual(response.status_code, status_code)
+        return {int(row["id"]) for row in response.json()["results"]} if status_code == 200 else None
+
+    def test_scoped(self):
+        district = self.districts[0]
+        self.assertEqual(self.autocomplete(DISTRICT, "patient", "neighborhood"),
+                         {n.pk for n in self.neighborhoods if n.district_id == district.pk})
+        self.assertEqual(self.autocomplete(DISTRICT, "psychiatrist", "district"), {district.pk})
+        self.assertEqual(self.autocomplete(REGION, "district", "region", app_label="utils"), {self.region.pk})
+        self.assertEqual(self.autocomplete(SUPERUSER, "doctor", "neighborhood"), {n.pk for n in self.neighborhoods})
+
+    def test_admin_group_permissions(self):
+        self.group.permissions.set(Permission.objects.filter(codename__in=DISTRICT_ADMIN_PERMISSIONS))
+        district = self.districts[0]
+        neighborhoods = {n.pk for n in self.neighborhoods if n.district_id == district.pk}
+        self.assertEqual(self.autocomplete(DISTRICT, "patient", "neighborhood"), neighborhoods)
+        self.assertEqual(self.autocomplete(DISTRICT, "doctor", "neighborhood"), neighborhoods)
+        self.assertEqual(self.autocomplete(DISTRICT, "psychiatrist", "district"), {district.pk})
+        self.assertEqual(self.autocomplete(REGION, "psychiatrist", "district"), {d.pk for d in self.districts})
+        # ruxsat faqat autocomplete uchun: hudud ro'yxatlari va boshqa rollar yopiq
+        self.assertEqual(self.client.get(reverse("admin:utils_neighborhood_changelist")).status_code, 403)
+        self.autocomplete(INSPECTOR, "patient", "neighborhood", status_code=403)
+
+    def test_change_forms_independent_of_hierarchy(self):
+        patient = Patient.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        doctor = Doctor.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        urls = [
+            reverse("admin:psytracks_patient_add"),
+            reverse("admin:psytracks_patient_change", args=[patient.pk]),
+            reverse("admin:psytracks_doctor_change", args=[doctor.pk]),
+            reverse("admin:psytracks_psychiatrist_change", args=[self.psychiatrists[0].pk]),
+        ]
+        # birinchi murojaat ContentType keshini to'ldiradi
+        [self.count_queries(SUPERUSER, url) for url in urls]
+        counts = [self.count_queries(SUPERUSER, url) for url in urls]
+        district = District.objects.create(name="Yangi tuman", region=self.region)
+        Neighborhood.objects.bulk_create([Neighborhood(name=f"Yangi mahalla {i}", district=district) for i in range(30)])
+        self.assertEqual([self.count_queries(SUPERUSER, url) for url in urls], counts)
+
+
+class MonitoringTests(RoleDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.today = timezone.now().date()
+        vary_patients(cls.today)
+
+    def get(self, role, url):
+        self.client.force_login(self.users[role])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, ctx.captured_queries
+
+    def assertSinglePatientScan(self, queries):
+        self.assertEqual(len([query for query in queries if "psytracks_patient" in query["sql"]]), 1)
+
+    def assertCounters(self, rows, expected):
+        self.assertEqual({row.pk: {name: getattr(row, name) for name in PATIENT_COUNTERS} for row in rows}, expected)
+        totals = get_grand_totals(rows, PATIENT_COUNTERS)
+        self.assertEqual(totals, {name: sum(counts[name] for counts in expected.values()) for name in PATIENT_COUNTERS})
+
+    def test_changelist(self):
+        response, queries = self.get(REGION, reverse("admin:utils_districtmonitoring_changelist"))
+        # sessiya, foydalanuvchi, ikkita ruxsatlar so'rovi, tumanlar soni va bitta guruhlangan so'rov
+        self.assertEqual(len(queries), 6)
+        self.assertSinglePatientScan(queries)
+        rows = list(response.context["cl"].result_list)
+        self.assertCounters(rows, old_patient_counts(Patient.objects.all(), "district_id", self.today))
+        self.assertEqual([row.total_neighborhood for row in rows], [self.neighborhoods_per_district] * 2)
+
+    def test_change_view(self):
+        district = self.districts[0]
+        url = reverse("admin:utils_districtmonitoring_change", args=[district.pk])
+        response, queries = self.get(DISTRICT, url)
+        # sessiya, foydalanuvchi, tuman, mahallalar kesimidagi guruhlangan so'rov va ikkita ruxsatlar so'rovi
+        self.assertEqual(len(queries), 6)
+        self.assertSinglePatientScan(queries)
+        expected = old_patient_counts(Patient.objects.filter(district=district), "neighborhood_id", self.today)
+        self.assertCounters(response.context["neighborhoods"], expected)
+        self.assertEqual(response.context["totals"], get_grand_totals(response.context["neighborhoods"], PATIENT_COUNTERS))
+
+        response, queries = self.get(DISTRICT, f"{url}?export=1")
+        self.assertSinglePatientScan(queries)
+        other = reverse("admin:utils_districtmonitoring_change", args=[self.districts[1].pk])
+        self.assertEqual(self.client.get(other).status_code, 302)
+
+    def test_export(self):
+        queryset = get_job_queryset(ExportJob(user=self.users[SUPERUSER], kind=ExportKind.MONITORING, params=""))
+        file = io.BytesIO()
+        with CaptureQueriesContext(connection) as ctx:
+            export_monitoring_xlsx(queryset, file)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        rows = list(load_workbook(file, read_only=True).active.iter_rows(min_row=2, values_only=True))
+        expected = old_patient_counts(Patient.objects.all(), "district_id", self.today)
+        names = {district.name: district.pk for district in self.districts}
+        exported = {names[row[1]]: dict(zip(MONITORING_EXPORT_FIELDS, row[2:])) for row in rows[:-1]}
+        self.assertEqual({pk: {name: row[name] for name in PATIENT_COUNTERS} for pk, row in exported.items()}, expected)
+        self.assertEqual(rows[-1][1:], ("Жами", len(self.neighborhoods),
+                                        *(sum(counts[name] for counts in expected.values())
+                                          for name in MONITORING_EXPORT_FIELDS[1:])))
+
+
+@mock.patch("utils.pagination.get_setting", return_value=10)
+class EstimatedCountTests(RoleDataMixin, TestCase):
+    def count(self, queryset, exact=False):
+        paginator = EstimatedCountPaginator(queryset, 5, exact=exact)
+        return paginator.count, paginator.estimated
+
+    def count_queries(self, queries):
+        return len([query for query in queries if '"__count"' in query["sql"]])
+
+    def test_cached_exact_count(self, get_setting):
+        if connection.vendor == "postgresql":
+            self.skipTest("PostgreSQL uses planner estimates")
+        total = Patient.objects.count()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(Patient.objects.all()), (total, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(Patient.objects.all()), (total, True))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(Patient.objects.all(), exact=True), (total, False))
+        # chegaradan kichik natijalar keshlanmaydi
+        small = Patient.objects.filter(neighborhood=self.neighborhoods[0])
+        self.count(small)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(small), (self.patients_per_neighborhood, False))
+
+    def test_changelist(self, get_setting):
+        url = reverse("admin:psytracks_patient_changelist")
+        self.client.force_login(self.users[SUPERUSER])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        cl = response.context_data["cl"]
+        # filtrsiz umumiy son uchun ikkinchi COUNT(*) yuborilmaydi
+        expected = 0 if connection.vendor == "sqlite" else 1
+        self.assertEqual(self.count_queries(ctx.captured_queries), expected)
+        self.assertEqual(len(ctx.captured_queries), 7 + expected)
+        self.assertTrue(cl.count_estimated)
+        self.assertContains(response, cl.exact_count_url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {EXACT_COUNT_VAR: 1})
+        self.assertEqual(self.count_queries(ctx.captured_queries), 1)
+        self.assertFalse(response.context_data["cl"].count_estimated)
+        self.assertEqual(response.context_data["cl"].result_count, Patient.objects.count())
+
+    def test_planner_estimate(self, get_setting):
+        if connection.vendor != "postgresql":
+            self.skipTest("EXPLAIN (FORMAT JSON) needs PostgreSQL")
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE psytracks_patient")
+        self.assertGreater(estimate_count(Patient.objects.all()), 0)
+        get_setting.return_value = 0
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(self.count(Patient.objects.all())[1])
+        self.assertEqual(self.count_queries(ctx.captured_queries), 0)
+
+
+class ExportJobTests(RoleDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = Path(directory.name)
+        patcher = mock.patch.object(ExportJob._meta.get_field("file"), "storage", FileSystemStorage(directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_private_file_and_download(self):
+        owner = self.users[SUPERUSER]
+        job = run_export_job(ExportJob.objects.create(user=owner, kind=ExportKind.MONITORING))
+        self.assertEqual(job.status, ExportStatus.DONE, job.error)
+        # saqlangan nom tasodifiy, foydalanuvchiga ko'rsatiladigan nomdan farq qiladi
+        self.assertNotIn(job.download_name, job.file.name)
+        self.assertNotIn(ExportKind.MONITORING, job.file.name)
+        self.assertGreaterEqual(len(Path(job.file.name).stem), 32)
+        self.assertTrue((self.location / job.file.name).is_file())
+
+        url = reverse("admin:utils_exportjob_download", args=[job.pk])
+        self.client.force_login(owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(job.download_name, response["Content-Disposition"])
+        self.client.force_login(self.users[DISTRICT])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_requeue_only_stale(self):
+        now = timezone.now()
+        jobs = {
+            name: ExportJob.objects.create(user=self.users[SUPERUSER], kind=ExportKind.PATIENTS,
+                                           status=ExportStatus.RUNNING, heartbeat_at=heartbeat, written=10)
+            for name, heartbeat in (("alive", now), ("stale", now - datetime.timedelta(hours=1)), ("unknown", None))
+        }
+        self.assertEqual(requeue_stale_jobs(datetime.timedelta(minutes=30)), 2)
+        statuses = {name: ExportJob.objects.get(pk=job.pk).status for name, job in jobs.items()}
+        self.assertEqual(statuses, {"alive": ExportStatus.RUNNING, "stale": ExportStatus.PENDING,
+                                    "unknown": ExportStatus.PENDING})
+
+    def test_export_root_outside_media(self):
+        self.assertEqual(check_export_storage(None), [])
+        storages = {**settings.STORAGES, "exports": {"BACKEND": "django.core.files.storage.FileSystemStorage",
+                                                     "OPTIONS": {"location": Path(settings.MEDIA_ROOT) / "exports"}}}
+        with override_settings(STORAGES=storages):
+            self.assertEqual([error.id for error in check_export_storage(None)], ["utils.E001"])
+
+
+class AppSettingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.district = District.objects.create(name="Tuman", region=Region.objects.create(name="Viloyat"))
+
+    def set_value(self, key, value):
+        with self.captureOnCommitCallbacks(execute=True):
+            SettingsKey.objects.update_or_create(key=key, defaults={"name": key, "value": value})
+
+    def test_defaults(self):
+        self.assertEqual(get_limits(), {key: DEFAULTS[key] for key in ("last_psychiatric_appointment_days",
+                                                                       "last_home_visit_by_doctor_days",
+                                                                       "last_hospitalization_to_days")})
+        with self.captureOnCommitCallbacks(execute=True):
+            SettingsKey.objects.filter(key="fuzzy_search_limit").delete()
+        self.assertEqual(get_setting("fuzzy_search_limit"), DEFAULTS["fuzzy_search_limit"])
+        self.assertEqual(get_setting("missing_key", default=7), 7)
+
+    def test_parsing(self):
+        cases = [
+            ("ha", bool, True), ("0", bool, False), (" 45 ", int, 45), ("abc", int, None),
+            ("3", datetime.timedelta, datetime.timedelta(days=3)),
+            ("01:30:00", datetime.timedelta, datetime.timedelta(hours=1, minutes=30)),
+            ("soon", datetime.timedelta, None),
+        ]
+        for value, cast, expected in cases:
+            self.set_value("test_value", value)
+            # noto'g'ri qiymatda default qaytadi
+            self.assertEqual(get_setting("test_value", cast=cast), expected, value)
+        self.set_value("last_psychiatric_appointment_days", "x")
+        self.assertEqual(get_setting("last_psychiatric_appointment_days"), DEFAULTS["last_psychiatric_appointment_days"])
+
+    def test_district_override(self):
+        self.set_value("last_home_visit_by_doctor_days", "20")
+        with self.captureOnCommitCallbacks(execute=True):
+            SettingsOverride.objects.create(setting=SettingsKey.objects.get(key="last_home_visit_by_doctor_days"),
+                                            district=self.district, value="10")
+        other = District.objects.create(name="Boshqa tuman", region=self.district.region)
+        self.assertEqual(get_limits(self.district)["last_home_visit_by_doctor_days"], 10)
+        self.assertEqual(get_limits(other.pk)["last_home_visit_by_doctor_days"], 20)
+        self.assertEqual(get_limits()["last_home_visit_by_doctor_days"], 20)
+
+    def test_reload_after_version_bump(self):
+        self.set_value("estimated_count_threshold", "100")
+        self.assertEqual(get_setting("estimated_count_threshold"), 100)
+        with self.assertNumQueries(0):
+            get_setting("estimated_count_threshold")
+        # boshqa worker yozgan: qator o'zgargan, lekin versiya hali eski
+        SettingsKey.objects.filter(key="estimated_count_threshold").update(value="200")
+        self.assertEqual(get_setting("estimated_count_threshold"), 100)
+        cache.set(VERSION_CACHE_KEY, cache.get(VERSION_CACHE_KEY) + 1, None)
+        with self.assertNumQueries(2):
+            self.assertEqual(get_setting("estimated_count_threshold"), 200)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    FILEBASED = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp/x"}}
+
+    def test_process_local_cache_rejected_outside_debug(self):
+        with override_settings(DEBUG=False, CACHES=self.LOCMEM):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ["utils.E002"])
+        with override_settings(DEBUG=True, CACHES=self.LOCMEM):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(DEBUG=False, CACHES=self.FILEBASED):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class ComplianceSnapshotTests(RoleDataMixin, TestCase):
+    def test_snapshot_matches_patient_counts(self):
+        today = timezone.now().date()
+        Patient.objects.filter(neighborhood__in=self.neighborhoods[::2]).update(is_aggressive=True)
+        Patient.objects.filter(neighborhood=self.neighborhoods[1]).update(
+            last_home_visit_by_doctor_date=today - datetime.timedelta(days=400))
+        self.assertEqual(take_compliance_snapshot(today), len(self.neighborhoods))
+        # qayta olinganda shu sana yozuvlari almashtiriladi
+        self.assertEqual(take_compliance_snapshot(today), len(self.neighborhoods))
+
+        snapshots = ComplianceSnapshot.objects.filter(date=today).values("neighborhood_id", "district_id",
+                                                                          *PATIENT_COUNTERS)
+        rows = {row.pop("neighborhood_id"): row for row in snapshots}
+        districts = {n.pk: n.district_id for n in self.neighborhoods}
+        self.assertEqual({pk: row.pop("district_id") for pk, row in rows.items()}, districts)
+        self.assertEqual(rows, get_patient_counts(Patient.objects.all(), "neighborhood_id", today))
+
+    def test_trend_requires_login(self):
+        take_compliance_snapshot()
+        url = reverse("compliance_trend")
+        for name in ("compliance_trend", "district_patient_stats"):
+            response = self.client.get(reverse(name))
+            self.assertRedirects(response, f"{reverse('admin:login')}?next={reverse(name)}", fetch_redirect_response=False)
+        self.client.force_login(self.users[DISTRICT])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], [self.patients_per_neighborhood * self.neighborhoods_per_district])
+
+
+class HierarchyTests(RoleDataMixin, TestCase):
+    def assertHierarchy(self, model, district, region, **filters):
+        rows = set(model.objects.filter(**filters).values_list("district_id", "region_id"))
+        self.assertEqual(rows, {(district.pk, region.pk)}, model.__name__)
+
+    def test_filled_on_save(self):
+        neighborhood = self.neighborhoods[0]
+        for model in (Patient, Doctor, Inspector):
+            self.assertHierarchy(model, neighborhood.district, self.region, neighborhood=neighborhood)
+        self.assertHierarchy(Psychiatrist, self.districts[0], self.region, district_id=self.districts[0].pk)
+
+    def test_neighborhood_moved(self):
+        neighborhood = self.neighborhoods[0]
+        neighborhood.district = self.districts[1]
+        neighborhood.save()
+        for model in (Patient, Doctor, Inspector):
+            self.assertHierarchy(model, self.districts[1], self.region, neighborhood=neighborhood)
+
+    def test_district_moved(self):
+        region = Region.objects.create(name="Boshqa viloyat")
+        district = self.districts[0]
+        district.region = region
+        district.save()
+        for model in (Patient, Doctor, Inspector, Psychiatrist):
+            self.assertHierarchy(model, district, region, district_id=district.pk)
+        self.assertEqual(Patient.objects.filter(region=self.region).count(),
+                         Patient.objects.filter(neighborhood__district=self.districts[1]).count())
+
+    def test_migration_backfill(self):
+        for model in (Patient, Doctor, Inspector):
+            model.objects.update(district=None, region=None)
+        Psychiatrist.objects.update(region=None)
+        with self.assertNumQueries(4):
+            import_module("utils.migrations.0012_hierarchy").fill_hierarchy_columns(apps, None)
+            import_module("psytracks.migrations.0020_hierarchy").fill_hierarchy_columns(apps, None)
+        for neighborhood in self.neighborhoods:
+            for model in (Patient, Doctor, Inspector):
+                self.assertHierarchy(model, neighborhood.district, self.region, neighborhood=neighborhood)
+        for district in self.districts:
+            self.assertHierarchy(Psychiatrist, district, self.region, district_id=district.pk)
+
+    def test_queryset_update(self):
+        patient = Patient.objects.filter(neighborhood=self.neighborhoods[0]).first()
+        target = next(n for n in self.neighborhoods if n.district_id == self.districts[1].pk)
+        Patient.objects.filter(pk=patient.pk).update(neighborhood=target)
+        self.assertHierarchy(Patient, self.districts[1], self.region, pk=patient.pk)
+
+
+class SyncHierarchyTests(RoleDataMixin, TestCase):
+    def sync(self, tree):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "districts.json"
+            path.write_text(json.dumps(tree), encoding="utf-8")
+            stdout = io.StringIO()
+            call_command("sync_hierarchy", str(path), verbosity=2, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_duplicates_reported_and_matched_once(self):
+        district = self.districts[0]
+        duplicate = District.objects.create(name=district.name, region=self.region)
+        extra = Neighborhood.objects.create(name=self.neighborhoods[0].name.upper(), district=district)
+        names = [n.name for n in self.neighborhoods if n.district_id == district.pk]
+        output = self.sync({self.region.name: {district.name: names + ["Yangi mahalla"]}})
+
+        self.assertEqual(Neighborhood.objects.get(name="Yangi mahalla").district, district)
+        self.assertFalse(duplicate.neighborhoods.exists())
+        self.assertIn(f"district: {self.region.name} / {district.name} (id={duplicate.pk}, "
+                      f"duplicate of id={district.pk})", output)
+        self.assertIn(f"(id={extra.pk}, duplicate of id={self.neighborhoods[0].pk})", output)
+
+    def test_spelling_variants_in_file_merged(self):
+        district = self.districts[1]
+        output = self.sync({
+            self.region.name: {district.name: ["Birinchi"]},
+            f" {self.region.name.upper()}": {f"{district.name.lower()} ": ["Ikkinchi"]},
+        })
+        self.assertEqual(District.objects.count(), len(self.districts))
+        self.assertEqual(set(Neighborhood.objects.filter(name__in=["Birinchi", "Ikkinchi"]).values_list(
+            "district", flat=True)), {district.pk})
+        self.assertNotIn("region:", output)
+
+
+    def test_set_district(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        (Path(directory.name) / "districts.json").write_text(json.dumps({"Yangi tuman": ["Birinchi", "Ikkinchi"]}))
+        cwd = os.getcwd()
+        os.chdir(directory.name)
+        self.addCleanup(os.chdir, cwd)
+
+        for _ in range(2):
+            call_command("set_district", region=str(self.region.pk), stdout=io.StringIO())
+        district = District.objects.get(name="Yangi tuman")
+        self.assertEqual(district.region, self.region)
+        self.assertEqual(sorted(district.neighborhoods.values_list("name", flat=True)), ["Birinchi", "Ikkinchi"])
+
+
+class ImportPatientsTests(RoleDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.neighborhood = self.neighborhoods[0]
+        self.existing = Patient.objects.filter(neighborhood=self.neighborhood).order_by("pk").first()
+
+    def row(self, pinfl, full_name, district=None, appointment="01.03.2026"):
+        row = [None] * (import_patients.PSYCHIATRIST + 1)
+        row[import_patients.FULL_NAME] = full_name
+        row[import_patients.PINFL] = pinfl
+        row[import_patients.BIRTH_DATE] = "15.04.1980"
+        row[import_patients.DISTRICT] = district or self.neighborhood.district.name
+        row[import_patients.NEIGHBORHOOD] = self.neighborhood.name
+        row[import_patients.LAST_PSYCHIATRIC_APPOINTMENT] = appointment
+        row[import_patients.PSYCHIATRIST] = self.psychiatrists[0].full_name
+        return row
+
+    def import_patients(self, rows, *args):
+        path = Path(self.directory.name) / "patients.xlsx"
+        wb = Workbook()
+        wb.active.append(["#", "F.I.Sh.", "PINFL"])
+        for row in rows:
+            wb.active.append(row)
+        wb.save(path)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch("sys.stderr", stderr):
+            call_command("import_patients", str(path), "--start-row", "2", *args, stdout=stdout)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_upsert_by_pinfl(self):
+        rows = [self.row(self.existing.pinfl, "Yangilangan bemor"), self.row("12345678901234", "Yangi bemor")]
+        output, _ = self.import_patients(rows)
+        self.assertIn("1 created, 1 updated, 0 unchanged, 0 rows with errors", output)
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.full_name, self.existing.last_date), ("Yangilangan bemor", datetime.date(2026, 3, 1)))
+        self.assertFalse(self.existing.is_aggressive)
+        created = Patient.objects.get(pinfl="12345678901234")
+        self.assertEqual((created.neighborhood, created.inspector_id, created.psychiatrist, created.district_id),
+                         (self.neighborhood, self.neighborhood.inspector.pk, self.psychiatrists[0],
+                          self.neighborhood.district_id))
+
+        count = Patient.objects.count()
+        output, _ = self.import_patients(rows)
+        self.assertIn("0 created, 0 updated, 2 unchanged", output)
+        self.assertEqual(Patient.objects.count(), count)
+
+        self.import_patients(rows, "--aggressive")
+        self.assertEqual(Patient.objects.filter(pinfl__in=[row[import_patients.PINFL] for row in rows],
+                                                is_aggressive=True).count(), 2)
+
+    def test_dry_run(self):
+        count = Patient.objects.count()
+        output, _ = self.import_patients(
+            [self.row(self.existing.pinfl, "Yangilangan bemor"), self.row("12345678901234", "Yangi bemor")], "--dry-run"
+        )
+        self.assertIn("Dry run: 1 created, 1 updated", output)
+        self.assertEqual(Patient.objects.count(), count)
+        self.assertEqual(Patient.objects.get(pk=self.existing.pk).full_name, self.existing.full_name)
+
+    def test_error_report(self):
+        report = Path(self.directory.name) / "errors.csv"
+        output, stderr = self.import_patients([
+            self.row("12345678901234", "Yangi bemor"),
+            self.row("12345678901234", "Takror"),
+            self.row("22345678901234", "Noma'lum tuman", district="Yo'q tuman"),
+            self.row("32345678901234", "Xato sana", appointment="32.13.2026"),
+        ], "--report", str(report))
+        self.assertIn("1 created, 0 updated, 0 unchanged, 3 rows with errors", output)
+        self.assertEqual(stderr, "")
+        with open(report, encoding="utf-8-sig") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["row", "pinfl", "error"])
+        self.assertEqual([row[:2] for row in rows[1:]],
+                         [["3", "12345678901234"], ["4", "22345678901234"], ["5", "32345678901234"]])
+        self.assertFalse(Patient.objects.filter(pinfl__in=["22345678901234", "32345678901234"]).exists())
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite profile")
+class SqliteTuningTests(SimpleTestCase):
+    alias = "sqlite_tuning"
+
+    @classmethod
+    def setUpClass(cls):
+        # profil default bazaning OPTIONS'idan olinadi, fayl har test uchun yangi. Alias test runner
+        # yaratadigan bazalarga kirmasligi uchun databases shu yerda beriladi
+        connections.settings[cls.alias] = {**connections[DEFAULT_DB_ALIAS].settings_dict, "NAME": ""}
+        cls.addClassCleanup(connections.settings.pop, cls.alias)
+        cls.addClassCleanup(connections.__delitem__, cls.alias)
+        cls.databases = {cls.alias}
+        super().setUpClass()
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections[self.alias].settings_dict["NAME"] = str(Path(directory.name) / "db.sqlite3")
+        self.addCleanup(connections[self.alias].close)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute("CREATE TABLE psytracks_patient (id integer PRIMARY KEY, full_name text, deadline date, "
+                           "district_id integer, last_home_visit_by_doctor_date date)")
+            cursor.executemany("INSERT INTO psytracks_patient (full_name, district_id) VALUES (%s, %s)",
+                               [(f"Bemor {i}", i % 3) for i in range(300)])
+
+    def pragma(self, name):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_profile_applied(self):
+        options = connections[self.alias].settings_dict["OPTIONS"]
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        # synchronous=NORMAL - 1, temp_store=MEMORY - 2
+        self.assertEqual((self.pragma("synchronous"), self.pragma("temp_store")), (1, 2))
+        self.assertEqual(self.pragma("cache_size"), settings.SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(self.pragma("mmap_size"), settings.SQLITE_PRAGMAS["mmap_size"])
+        self.assertEqual(self.pragma("busy_timeout"), options["timeout"] * 1000)
+        self.assertEqual(connections[self.alias].transaction_mode, "IMMEDIATE")
+
+    def test_maintenance(self):
+        stdout = io.StringIO()
+        call_command("sqlite_maintenance", database=self.alias, stdout=stdout)
+        output = stdout.getvalue()
+        for line in ("Checkpoint: ", "ANALYZE done", "VACUUM done", "WAL 0 bytes"):
+            self.assertIn(line, output)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute("SELECT tbl FROM sqlite_stat1")
+            self.assertEqual(cursor.fetchall(), [("psytracks_patient",)])
+
+    def test_benchmark(self):
+        stdout = io.StringIO()
+        call_command("benchmark_sqlite", database=self.alias, seconds=0.3, readers=2, writers=1, stdout=stdout)
+        rows = {line[:16].strip(): line[16:].split() for line in stdout.getvalue().splitlines()[2:]}
+        self.assertEqual(set(rows), {"default reads", "default writes", "tuned reads", "tuned writes"})
+        self.assertGreater(float(rows["tuned writes"][0]), 0)
+        self.assertEqual(rows["tuned writes"][-1], "0")
+
+
+@override_settings(DATABASE_READ_ALIAS="replica", DATABASE_WRITE_ALIAS="default")
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def route(self):
+        router = PrimaryReplicaRouter()
+        reads = [router.db_for_read(Patient)]
+        self.assertEqual(router.db_for_write(Patient), "default")
+        reads.append(router.db_for_read(Patient))
+        return reads
+
+    def test_reads_pinned_after_write(self):
+        self.assertEqual(contextvars.Context().run(self.route), ["replica", "default"])
+        # boshqa kontekst (so'rov) bog'lanishni ko'rmaydi
+        self.assertEqual(contextvars.Context().run(PrimaryReplicaRouter().db_for_read, Patient), "replica")
+
+    def test_reads_in_transaction_use_primary(self):
+        with mock.patch.object(connections["default"], "in_atomic_block", True):
+            self.assertEqual(contextvars.Context().run(PrimaryReplicaRouter().db_for_read, Patient), "default")
+
+    def test_migrations_only_on_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertIs(router.allow_migrate("default", "psytracks"), True)
+        self.assertIs(router.allow_migrate("replica", "psytracks"), False)
+
+    def test_middleware_unpins_each_request(self):
+        router = PrimaryReplicaRouter()
+        middleware = DatabaseMiddleware(lambda request: router.db_for_read(Patient))
+
+        def request():
+            router.db_for_write(Patient)
+            return middleware(RequestFactory().get("/")), router.db_for_read(Patient)
+
+        # so'rov ichida pin yo'q, tugagandan keyin oldingi holat tiklanadi
+        self.assertEqual(contextvars.Context().run(request), ("replica", "default"))
+
+
+class FakePostgresqlConnection:
+    vendor = "postgresql"
+
+    def __init__(self, connected=True, needs_rollback=False):
+        self.connection = object() if connected else None
+        self.needs_rollback = needs_rollback
+        self.cursor_mock = mock.MagicMock()
+
+    def cursor(self):
+        return self.cursor_mock
+
+
+class StatementTimeoutTests(SimpleTestCase):
+    def setUp(self):
+        self.fake_connections = {"default": FakePostgresqlConnection(), "replica": FakePostgresqlConnection()}
+        patcher = mock.patch("utils.db.connections", self.fake_connections)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def executed(self, alias):
+        cursor = self.fake_connections[alias].cursor_mock.__enter__.return_value
+        return [call.args for call in cursor.execute.call_args_list]
+
+    def test_set_and_reset(self):
+        with statement_timeout(60000):
+            for alias in self.fake_connections:
+                self.assertEqual(self.executed(alias),
+                                 [("SELECT set_config('statement_timeout', %s, false)", ["60000"])])
+        for alias in self.fake_connections:
+            self.assertEqual(self.executed(alias)[1:], [("RESET statement_timeout",)])
+
+    def test_reset_skips_closed_and_broken_connections(self):
+        self.fake_connections.update(closed=FakePostgresqlConnection(connected=False),
+                                     broken=FakePostgresqlConnection(needs_rollback=True))
+        reset_statement_timeout()
+        self.assertEqual(self.executed("default"), [("RESET statement_timeout",)])
+        self.assertEqual(self.executed("closed") + self.executed("broken"), [])
+
+    def call_view(self, view_name, response=None):
+        def get_response(request):
+            middleware.process_view(request, None, (), {})
+            if response is None:
+                raise ValueError
+            return response
+
+        middleware = DatabaseMiddleware(get_response)
+        request = RequestFactory().get("/")
+        request.resolver_match = mock.Mock(view_name=view_name)
+        with mock.patch("utils.db.set_statement_timeout") as set_timeout, \
+                mock.patch("utils.db.reset_statement_timeout") as reset_timeout:
+            try:
+                middleware(request)
+            except ValueError:
+                pass
+        return set_timeout.call_args_list, reset_timeout.call_count
+
+    def test_middleware(self):
+        self.assertEqual(self.call_view("admin:statistics", "ok"), ([mock.call(60000)], 1))
+        # view xato bilan tugasa ham qaytariladi
+        self.assertEqual(self.call_view("admin:statistics"), ([mock.call(60000)], 1))
+        self.assertEqual(self.call_view("admin:index", "ok"), ([], 0))
+
+    def test_middleware_skips_sqlite(self):
+        self.fake_connections.clear()
+        self.assertEqual(self.call_view("admin:statistics", "ok"), ([], 0))
+
+
+class PoolSettingsTests(SimpleTestCase):
+    @mock.patch.dict(os.environ, {"DB_NAME": "c_panel"})
+    def test_pool(self):
+        from core import settings as project_settings
+
+        with mock.patch.object(project_settings, "DB_POOL", True):
+            with mock.patch.object(project_settings, "find_spec", return_value=mock.Mock()):
+                database = project_settings.postgresql_database("db", "5432")
+            self.assertEqual(database["CONN_MAX_AGE"], 0)
+            self.assertEqual(set(database["OPTIONS"]["pool"]), {"min_size", "max_size", "timeout"})
+            with mock.patch.object(project_settings, "find_spec", return_value=None):
+                with self.assertRaisesMessage(ImproperlyConfigured, "psycopg[binary,pool]"):
+                    project_settings.postgresql_database("db", "5432")
+
+
+class SqliteToPostgresqlTests(SimpleTestCase):
+    def test_models_in_foreign_key_order(self):
+        models = get_models()
+        for model in models:
+            for field in model._meta.concrete_fields:
+                if field.is_relation and field.related_model is not model:
+                    self.assertLess(models.index(field.related_model), models.index(model), field)
+
+    def test_copy_value(self):
+        field = Patient._meta.get_field("full_name")
+        self.assertEqual(copy_value(None, field), "\\N")
+        self.assertEqual(copy_value("a\tb\nc\\", field), "a\\tb\\nc\\\\")
+        self.assertEqual(copy_value(1, Patient._meta.get_field("is_aggressive")), "t")
+
+
+POSTGRESQL_ALIAS = next(iter(get_postgresql_aliases()), None)
+
+
+@skipUnless(POSTGRESQL_ALIAS, "needs a PostgreSQL database (DB_ENGINE=postgresql)")
+class SqliteToPostgresqlCopyTests(TransactionTestCase):
+    databases = {POSTGRESQL_ALIAS or DEFAULT_DB_ALIAS}
+    fixture_alias = "sqlite_fixture"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # aliaslar test ichida qo'shiladi va teardown flush'idan oldin olib tashlanadi
+        cls.databases = {*cls.databases, cls.fixture_alias, SOURCE_ALIAS}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / "db.sqlite3")
+        for alias in (self.fixture_alias, SOURCE_ALIAS):
+            self.addCleanup(self.remove_alias, alias)
+        database = {"ENGINE": "django.db.backends.sqlite3", "NAME": self.path}
+        connections.settings[self.fixture_alias] = connections.configure_settings({DEFAULT_DB_ALIAS: database})[
+            DEFAULT_DB_ALIAS]
+        with self.on_source():
+            call_command("migrate", database=self.fixture_alias, verbosity=0)
+            region = Region.objects.create(name="Toshkent\tviloyati\n")
+            District.objects.bulk_create(District(name=f"Tuman {i}", region=region) for i in range(5))
+
+    def remove_alias(self, alias):
+        if alias in connections.settings:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    def on_source(self):
+        return override_settings(DATABASE_WRITE_ALIAS=self.fixture_alias, DATABASE_READ_ALIAS=self.fixture_alias)
+
+    def migrate(self):
+        stdout = io.StringIO()
+        call_command("migrate_sqlite_to_postgresql", source=self.path, database=POSTGRESQL_ALIAS, batch_size=2,
+                     stdout=stdout, stderr=io.StringIO())
+        return stdout.getvalue()
+
+    def test_copy_resume_and_sequences(self):
+        def stop_at(value, field):
+            if value == "Tuman 3":
+                raise RuntimeError("interrupted")
+            return copy_value(value, field)
+
+        # 2-partiyada to'xtaydi: birinchi partiya va uning progressi saqlangan
+        with mock.patch.object(migrate_sqlite_to_postgresql, "copy_value", stop_at):
+            with self.assertRaisesMessage(RuntimeError, "interrupted"):
+                self.migrate()
+        with connections[POSTGRESQL_ALIAS].cursor() as cursor:
+            cursor.execute(f"SELECT last_pk, copied FROM {PROGRESS_TABLE} WHERE table_name = %s",
+                           [District._meta.db_table])
+            self.assertEqual(cursor.fetchone(), ("2", 2))
+        self.assertEqual(District.objects.using(POSTGRESQL_ALIAS).count(), 2)
+
+        output = self.migrate()
+        self.assertIn("utils_district: 3 rows copied, 5 total", output)
+        self.assertIn("tables verified", output)
+
+        # keyingi ishga tushirish faqat yangi qatorlarni qo'shadi
+        with self.on_source():
+            District.objects.create(name="Tuman 5", region=Region.objects.get())
+        output = self.migrate()
+        self.assertIn("utils_district: 1 rows copied, 6 total", output)
+
+        region = Region.objects.using(POSTGRESQL_ALIAS).get()
+        self.assertEqual(region.name, "Toshkent\tviloyati\n")
+        self.assertEqual(list(District.objects.using(POSTGRESQL_ALIAS).order_by("pk").values_list("pk", "name")),
+                         [(i + 1, f"Tuman {i}") for i in range(6)])
+        # sequence'lar ko'chirilgan kalitlardan keyin davom etadi
+        district = District.objects.using(POSTGRESQL_ALIAS).create(name="Yangi", region=region)
+        self.assertEqual(district.pk, 7)
 
-# Create your tests here.
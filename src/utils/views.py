@@ -1,24 +1,18 @@
 from datetime import timedelta
 
-from django.db.models import Count, Q, Case, When, Value, F, DateField, ExpressionWrapper, DurationField, BooleanField
-from django.db.models.functions import Greatest
+from django.db.models import Q
 from django.http import JsonResponse
 from django.utils import timezone
 
-from psytracks.models import Patient, Doctor, Psychiatrist
-from utils.models import District, Neighborhood, Inspector
+from psytracks.models import Patient
+from utils.models import District, Neighborhood, ComplianceSnapshot
+from utils.stats import count_subquery, get_neighborhood_stats, get_compliance_trend
 
 
 def district_patient_stats(request):
-    user = request.user
-    filter_q = Q(id__gte=0)
-    if hasattr(user, "district"):
-        filter_q &= Q(id=user.district.district_id)
-    elif hasattr(user, "region"):
-        filter_q &= Q(region_id=user.region.region_id)
     stats = (
-        District.objects.filter(filter_q)
-        .annotate(total=Count("neighborhoods__patients", distinct=True))
+        District.objects.filter(request.principal.district_q())
+        .annotate(total=count_subquery(Patient.objects, "district"))
         .values("name", "id", "total")
     )
     return JsonResponse(list(stats), safe=False)
@@ -26,103 +20,22 @@ def district_patient_stats(request):
 
 def mahalla_patient_stats(request, district_id):
     today = timezone.now().date()
+    neighborhoods = Neighborhood.objects.filter(Q(district_id=district_id) & request.principal.district_q("district__"))
+    neighborhoods, totals = get_neighborhood_stats(neighborhoods, today)
 
-    patients = Patient.objects.annotate(
-        last_date=Case(
-            When(
-                last_hospitalization_from__isnull=False,
-                last_hospitalization_to__isnull=False,
-                last_hospitalization_from__gt=F("last_hospitalization_to"),
-                then=Value(today)
-            ),
-            When(
-                last_hospitalization_from__isnull=False,
-                last_hospitalization_to__isnull=True,
-                then=Value(today)
-            ),
-            When(
-                last_hospitalization_from__isnull=True,
-                last_hospitalization_to__isnull=False,
-                then=Greatest(
-                    "last_hospitalization_to",
-                    "last_psychiatric_appointment_date",
-                    "last_home_visit_by_doctor_date",
-                )
-            ),
-            When(
-                last_hospitalization_from__isnull=False,
-                last_hospitalization_to__isnull=False,
-                last_hospitalization_from__lte=F("last_hospitalization_to"),
-                then=Greatest(
-                    "last_hospitalization_to",
-                    "last_psychiatric_appointment_date",
-                    "last_home_visit_by_doctor_date",
-                )
-            ),
-            When(
-                last_hospitalization_from__isnull=True,
-                last_hospitalization_to__isnull=True,
-                then=Greatest(
-                    "last_psychiatric_appointment_date",
-                    "last_home_visit_by_doctor_date",
-                )
-            ),
-            default=None,
-            output_field=DateField()
-        )
-    ).annotate(
-        interval=ExpressionWrapper(
-            F("max_examination_interval") * Value(timedelta(days=1)),
-            output_field=DurationField()
-        ),
-        deadline=ExpressionWrapper(
-            F("last_date") + F("interval"),
-            output_field=DateField()
-        ),
-        # deadline o‘tib ketganmi
-            is_overdue=Case(
-                When(last_date__isnull=True, then=Value(True)),
-                When(deadline__lt=Value(today, output_field=DateField()), then=Value(True)),
-                default=Value(False),
-                output_field=BooleanField()
-            )
-    )
-
-    neighborhoods = Neighborhood.objects.filter(district_id=district_id).annotate(
-        late_count=Count(
-            "patients",
-            filter=Q(patients__in=patients.filter(is_overdue=True)),
-            distinct=True,
-        ),
-        on_time_count=Count(
-            "patients",
-            filter=Q(patients__in=patients.filter(is_overdue=False)),
-            distinct=True,
-        ),
-        aggressive_late_count=Count(
-            "patients",
-            filter=Q(patients__in=patients.filter(is_aggressive=True, is_overdue=True)),
-            distinct=True,
-        ),
-        aggressive_on_time_count=Count(
-            "patients",
-            filter=Q(patients__in=patients.filter(is_aggressive=True, is_overdue=False)),
-            distinct=True,
-        ),
-    )
     labels = []
     patients_list, aggressive_patients_list = [], []
     on_time, late = [], []
     aggressive_on_time, aggressive_late = [], []
 
     for d in neighborhoods:
-        labels.append(d.name)
-        on_time.append(d.on_time_count)
-        late.append(d.late_count)
-        aggressive_on_time.append(d.aggressive_on_time_count)
-        aggressive_late.append(d.aggressive_late_count)
-        patients_list.append(d.on_time_count + d.late_count)
-        aggressive_patients_list.append(d.aggressive_late_count + d.aggressive_on_time_count)
+        labels.append(d["name"])
+        on_time.append(d["on_time_count"])
+        late.append(d["late_count"])
+        aggressive_on_time.append(d["aggressive_on_time_count"])
+        aggressive_late.append(d["aggressive_late_count"])
+        patients_list.append(d["on_time_count"] + d["late_count"])
+        aggressive_patients_list.append(d["aggressive_late_count"] + d["aggressive_on_time_count"])
 
     data = {
         "labels": labels,
@@ -132,32 +45,36 @@ def mahalla_patient_stats(request, district_id):
         "aggressive_late": aggressive_late,
         "patients_list": patients_list,
         "aggressive_patients_list": aggressive_patients_list,
-        "total_patient": Patient.objects.filter(neighborhood__district_id=district_id).count(),
-        "total_neighborhood": neighborhoods.count(),
-        "total_doctor": Doctor.objects.filter(neighborhood__district_id=district_id).count(),
-        "total_psychiatrist": Psychiatrist.objects.filter(district_id=district_id).count(),
-        "total_inspector": Inspector.objects.filter(neighborhood__district_id=district_id).count(),
-        "total_aggressive_patient": Patient.objects.filter(
-            neighborhood__district_id=district_id,
-            is_aggressive=True,
-        ).count(),
-        "total_on_time_patient": patients.filter(
-            neighborhood__district_id=district_id,
-            is_overdue=False
-        ).count(),
-        "total_late_patient": patients.filter(
-            neighborhood__district_id=district_id,
-            is_overdue=True
-        ).count(),
-        "total_on_time_aggressive_patient": patients.filter(
-            neighborhood__district_id=district_id,
-            is_aggressive=True,
-            is_overdue=False
-        ).count(),
-        "total_late_aggressive_patient": patients.filter(
-            neighborhood__district_id=district_id,
-            is_aggressive=True,
-            is_overdue=True
-        ).count()
+        "total_patient": totals["total_patients"],
+        "total_neighborhood": totals["total_neighborhood"],
+        "total_doctor": totals["total_doctor"],
+        "total_psychiatrist": totals["total_psychiatrist"],
+        "total_inspector": totals["total_inspector"],
+        "total_aggressive_patient": totals["total_aggressive_patients"],
+        "total_on_time_patient": totals["on_time_count"],
+        "total_late_patient": totals["late_count"],
+        "total_on_time_aggressive_patient": totals["aggressive_on_time_count"],
+        "total_late_aggressive_patient": totals["aggressive_late_count"]
+    }
+    return JsonResponse(data)
+
+
+def compliance_trend(request):
+    period = "month" if request.GET.get("period") == "month" else "week"
+    since = timezone.now().date() - timedelta(days=365 if period == "month" else 7 * 12)
+
+    filter_q = Q(date__gte=since) & request.principal.district_q("district__")
+    district_id = request.GET.get("district", "")
+    if district_id.isdigit():
+        filter_q &= Q(district_id=district_id)
+
+    rows = get_compliance_trend(ComplianceSnapshot.objects.filter(filter_q), period)
+    data = {
+        "labels": [row["date"].strftime("%d.%m.%Y") for row in rows],
+        "total": [row["total_patients"] for row in rows],
+        "on_time": [row["on_time_count"] for row in rows],
+        "late": [row["late_count"] for row in rows],
+        "aggressive_on_time": [row["aggressive_on_time_count"] for row in rows],
+        "aggressive_late": [row["aggressive_late_count"] for row in rows],
     }
     return JsonResponse(data)